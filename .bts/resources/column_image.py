@@ -0,0 +1,60 @@
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+# Gray value ranges (upper, lower) of the particle shells in the particle image, from the outside in
+SHELL_RANGES = {0: (254, 159), 1: (159, 126), 2: (126, 100), 3: (100, 50)}
+
+
+def scale(arr, maximum=None, minimum=None):
+    if maximum is None:
+        maximum = arr.max()
+    if minimum is None:
+        minimum = arr.min()
+    arr[arr < 0] = 0
+    return (arr - minimum) / (maximum - minimum)
+
+
+def interpolate(input_array, fineness=800, kind="nearest"):
+    """ Upsample the column axis (axis 1) of a (time, ncol[, shell]) array to
+        fineness points, for all timepoints and shells at once. """
+    x_in = np.arange(0, input_array.shape[1])
+    x_out = np.linspace(0, input_array.shape[1] - 1, fineness)
+    if kind == "nearest":
+        # Like interp1d(kind="previous"), every output point takes the value of the last
+        # column at or before it, which is a single gather
+        indices = np.clip(np.searchsorted(x_in, x_out, side="right") - 1, 0, input_array.shape[1] - 1)
+        return np.take(input_array, indices, axis=1)
+    return PchipInterpolator(x_in, input_array, axis=1)(x_out)
+
+
+def to_rgb(colors):
+    """ Convert colors in [0, 1] to uint8, values outside are clipped. """
+    return np.rint(np.clip(colors, 0, 1) * 255).astype(np.uint8)
+
+
+def column_palette(bulk_colors, particle_colors, solid_colors):
+    """ Palette of every timepoint and position as uint8: the bulk color, then
+        the liquid and the solid color of each shell. The colors are
+        (time, position, rgb) for the bulk and (time, position, shell, rgb) for
+        the particles, constant colors can be broadcast views. """
+    n_time, n_position, n_shells, _ = particle_colors.shape
+    shell_colors = np.stack([particle_colors, solid_colors], axis=3).reshape(n_time, n_position, 2 * n_shells, 3)
+    return to_rgb(np.concatenate([bulk_colors[:, :, np.newaxis, :], shell_colors], axis=2))
+
+
+def pixel_sources(shells, liquid_color, solid_color, threshold_liquid, threshold_solid):
+    """ Index into the palette of a position for every pixel of the column, 0 is
+        the bulk. The images are (position, width) gray values of the particles. """
+    sources = np.zeros(shells.shape, dtype=np.intp)
+    for i, (upper, lower) in SHELL_RANGES.items():
+        liquid_mask = (lower <= shells) & (shells < upper) & (0 <= liquid_color) & (liquid_color < threshold_liquid)
+        solid_mask = (lower <= shells) & (shells < upper) & (0 <= solid_color) & (solid_color < threshold_solid)
+        sources[liquid_mask] = 1 + 2 * i
+        sources[solid_mask] = 2 + 2 * i
+    return sources
+
+
+def render_column(palette, sources):
+    """ Render the column at one timepoint, every pixel takes its color from the
+        palette entry of its position the particle mask selects for it. """
+    return palette[np.arange(sources.shape[0])[:, np.newaxis], sources]
@@ -13,12 +13,14 @@ from IPython.core.display_functions import display
 from ipywidgets import HBox, VBox
 from ipywidgets import Layout
 from matplotlib.gridspec import GridSpec
-from scipy.interpolate import PchipInterpolator, interp1d
 
+from .column_image import column_palette, interpolate, pixel_sources, render_column, scale
 from .langmuir import create_sim_langmuir
 from .lwe import create_sim_lwe
 from .non_pen_tracer import create_sim_non_pen
 from .pen_tracer import create_sim_pen
+from .runners import create_runner, snapshot
+from .simulations import SimulationCache, SimulationManager, simulation_key
 
 mpl.rcParams['image.interpolation'] = "none"
 mpl.rcParams["path.simplify"] = "True"
@@ -94,40 +96,6 @@ def debounce(wait):
 
 
 
-def scale(arr, maximum=None, minimum=None):
-    if maximum is None:
-        maximum = arr.max()
-    if minimum is None:
-        minimum = arr.min()
-    arr[arr < 0] = 0
-    return (arr - minimum) / (maximum - minimum)
-
-
-def interpolate(input_array, fineness=800, kind="nearest"):
-    interpolated_list = []
-    x_in = np.arange(0, input_array.shape[1])
-    x_out = np.linspace(0, input_array.shape[1] - 1, fineness)
-    if kind == "nearest":
-        for i in range(input_array.shape[0]):  # iterate over timepoints
-            if len(input_array[i, :].shape) > 1:
-                shell_interpolations = []
-                for j in range(input_array[i, :].shape[1]):  # iterate over particle shells
-                    sell_interpolated = interp1d(x_in, input_array[i, :, j], kind="previous")(x_out)
-                    shell_interpolations.append(sell_interpolated)
-                interpolated = np.stack(shell_interpolations).T
-            else:
-                interpolated = interp1d(x_in, input_array[i, :], kind="previous")(x_out)
-
-            interpolated_list.append(interpolated)
-    else:
-        for i in range(input_array.shape[0]):  # iterate over timepoints
-            interpolated = PchipInterpolator(x_in, input_array[i, :])(x_out)
-            interpolated_list.append(interpolated)
-
-    interpolated_array = np.stack(interpolated_list)
-    return interpolated_array
-
-
 def set_ax_ylims(axis, data, auto=False):
     min = data.flatten().min()
     max = data.flatten().max()
@@ -196,7 +164,7 @@ class TkLikeCheckbox(widgets.Checkbox):
 
 
 class Gui:
-    def __init__(self):
+    def __init__(self, runner=None):
         self.fig = None
         self.ax_inlet = None
         self.ax_inlet_twin = None
@@ -208,6 +176,10 @@ class Gui:
         self.axes = None
         self.reference_line = None
         self.previous_porosity = (0, 0)
+        self.simulation_cache = SimulationCache()
+        self.simulations = SimulationManager()
+        # Backend that runs the simulations, see runners.create_runner
+        self.runner = runner
 
         self.allow_simulations = False
 
@@ -283,13 +255,17 @@ class Gui:
     def draw_all(self):
         return
 
+    def column_frame(self, idx):
+        """ Render the column at one timepoint from its palette. """
+        return render_column(self.column_palette[idx], self.pixel_sources)
+
     def plot_column_initial(self):
-        bulk_image_slice = self.bulk_image[0, :, :]
+        bulk_image_slice = self.column_frame(0)
         image = self.ax_column.imshow(bulk_image_slice, aspect=1)
         return image
 
     def plot_column_update(self, idx_limit):
-        bulk_image_slice = self.bulk_image[idx_limit - 1, :, :]
+        bulk_image_slice = self.column_frame(idx_limit - 1)
         if self.column_image is None and self.has_prepared_image:
             image = self.ax_column.imshow(bulk_image_slice, aspect=1)
             self.column_image = image
@@ -462,12 +438,23 @@ class Gui:
             self.sim.root.input.model.unit_001.adsorption.sma_nu[1] = self.slider_nu.get()
             if hasattr(self, "slider_qmax"):
                 self.sim.root.input.model.unit_001.adsorption.sma_lambda = self.slider_qmax.get()
-        self.sim.save()
-        return_code = self.sim.run_load()
-        if len(return_code.stderr) != 0:
-            print(return_code.returncode, return_code.stderr)
 
-        self.load_sim_values()
+        key = self.simulation_key()
+        values = self.simulation_cache.get(key)
+        if values is None:
+            # The run gets its own copy of the inputs, the sliders keep changing self.sim
+            self.simulations.submit(self.simulate_in_background, snapshot(self.sim), key)
+        else:
+            self.simulations.cancel()
+            self.show_simulation(values)
+
+    async def simulate_in_background(self, sim, key):
+        values = await self.runner.run_async(sim)
+        self.simulation_cache.put(key, values)
+        self.show_simulation(values)
+
+    def show_simulation(self, values):
+        self.load_sim_values(values)
         if self.previous_porosity != (
                 self.sim.root.input.model.unit_001.col_porosity, self.sim.root.input.model.unit_001.par_porosity
         ):
@@ -482,6 +469,25 @@ class Gui:
         else:
             self.plot(offset=1)
             self.slider_inlet.set(1)
+        self.fig.canvas.draw_idle()
+
+    def simulation_key(self):
+        """ Identify a simulation by the experiment, the precision mode and the
+            values of the parameters the experiment uses. """
+        experiment_id = self.experiment_id.get()
+        parameters = [self.slider_col_porosity.get(), self.slider_col_dispersion.get()]
+        if experiment_id >= 1:
+            parameters += [self.slider_par_porosity.get(), self.slider_film_diffusion.get(),
+                           self.slider_par_diffusion.get()]
+        if experiment_id >= 2:
+            parameters.append(self.slider_keq.get())
+        if experiment_id == 3 or experiment_id == 4:
+            parameters.append(self.slider_nu.get())
+            if hasattr(self, "slider_qmax"):
+                parameters.append(self.slider_qmax.get())
+        if hasattr(self, "textbox_n_cols"):
+            parameters.append(int(self.textbox_n_cols.get()))
+        return simulation_key(experiment_id, self.checkbox_precision.get(), parameters)
 
     def add_slider(self, log=False, *args, **kwargs):
         style = {'description_width': '200px', "handle_color": "blue"}
@@ -495,6 +501,8 @@ class Gui:
         return slider
 
     def set_experiment(self, id=None):
+        # Results of the previous experiment must not be drawn any more
+        self.simulations.cancel()
         self.checkbox_reference.deselect()
 
         # To prevent running a simulation each time parameters are set, we freeze the model,
@@ -524,13 +532,16 @@ class Gui:
         if self.experiment_id.get() == 5:
             self.slider_keq.configure(from_=-5, to=0)
 
-        self.sim.filename = r'tmp\sim.h5'
         self.sim.cadet_path = r"C:/Users/ronal/mambaforge/envs/interactive/bin/cadet-cli.exe"
-        self.sim.save()
-        return_code = self.sim.run()
-        if len(return_code.stderr) != 0:
-            print(return_code.stderr, return_code.stdout)
-        self.sim.load()
+        if self.runner is None:
+            self.runner = create_runner(self.sim)
+
+        # The default parameters of every experiment are only simulated once
+        key = (self.experiment_id.get(), "initial")
+        values = self.simulation_cache.get(key)
+        if values is None:
+            values = self.runner.run(snapshot(self.sim))
+            self.simulation_cache.put(key, values)
 
         self.slider_col_dispersion.set(self.sim.root.input.model.unit_001.col_dispersion)
         self.slider_col_porosity.set(self.sim.root.input.model.unit_001.col_porosity)
@@ -572,17 +583,17 @@ class Gui:
 
         self.allow_simulations = True
 
-        self.load_sim_values()
+        self.load_sim_values(values)
         self.prepare_image()
         self.plot_all_initial()
 
-    def load_sim_values(self):
-        self.inlet = self.sim.root.output.solution.unit_001.solution_inlet
-        self.output = self.sim.root.output.solution.unit_001.solution_outlet
-        self.bulk = self.sim.root.output.solution.unit_001.solution_bulk
-        self.solid = self.sim.root.output.solution.unit_001.solution_solid
-        self.particle = self.sim.root.output.solution.unit_001.solution_particle
-        self.output_times = self.sim.root.output.solution.solution_times
+    def load_sim_values(self, values):
+        self.inlet = values["inlet"]
+        self.output = values["outlet"]
+        self.bulk = values["bulk"]
+        self.solid = values["solid"]
+        self.particle = values["particle"]
+        self.output_times = values["times"]
 
         self.bulk_scaled = ((self.bulk - self.bulk.min(axis=1).min(axis=0))
                             / (self.bulk.max(axis=1).max(axis=0) - self.bulk.min(axis=1).min(axis=0)))
@@ -694,65 +705,61 @@ class Gui:
             bulk_salt = scale(bulk_salt)
             bulk_protein = scale(bulk_protein)
 
-            self.bulk_image_bulk = (1
-                                    - np.stack([bulk_salt.T * x for x in [0, 0.4, 1]], axis=-1)
-                                    - np.stack([bulk_protein.T * x for x in [1, 1, 0]], axis=-1)
-                                    )
+            bulk_colors = (1
+                           - np.stack([bulk_salt * x for x in [0, 0.4, 1]], axis=-1)
+                           - np.stack([bulk_protein * x for x in [1, 1, 0]], axis=-1)
+                           )
         else:
             bulk_protein = interpolate(self.bulk[:, :, 0], fineness=400)
             bulk_protein = scale(bulk_protein)
 
-            self.bulk_image_bulk = (1
-                                    - np.stack([bulk_protein.T * x for x in minus_blue], axis=-1)
-                                    )
+            bulk_colors = (1
+                           - np.stack([bulk_protein * x for x in minus_blue], axis=-1)
+                           )
+
+        # Constant colors are broadcast over all timepoints, positions and shells instead of being copied
+        npar = self.sim.root.input.model.unit_001.discretization.npar
+        shell_shape = bulk_colors.shape[:2] + (npar, 3)
 
         # Bulk
         if self.experiment_id.get() == 0 or self.experiment_id.get() == 1:
-            self.bulk_image_solid = np.zeros_like(self.bulk_image_bulk)
-            npar = self.sim.root.input.model.unit_001.discretization.npar
-            self.bulk_image_solid = np.stack([self.bulk_image_solid, ] * npar, axis=0)
+            solid_colors = np.broadcast_to(np.zeros(3), shell_shape)
         else:
             if self.experiment_id.get() == 3 or self.experiment_id.get() == 4:
                 solid_protein = interpolate(self.solid[:, :, :, 1], fineness=400)
             else:
                 solid_protein = interpolate(self.solid[:, :, :, 0], fineness=400)
             solid_protein = scale(solid_protein, minimum=0)
-            self.bulk_image_solid = (0
-                                     + np.stack([np.power(solid_protein.T, 1 / 6) * x for x in [0, 1, 0]], axis=-1)
-                                     )
+            solid_colors = (0
+                            + np.stack([np.power(solid_protein, 1 / 6) * x for x in [0, 1, 0]], axis=-1)
+                            )
         # Particles
         if self.experiment_id.get() == 0:
-            self.image_particle = np.ones_like(self.bulk_image_bulk)
-            npar = self.sim.root.input.model.unit_001.discretization.npar
-            self.image_particle = np.stack([self.image_particle, ] * npar, axis=0)
+            particle_colors = np.broadcast_to(np.ones(3), shell_shape)
         elif self.experiment_id.get() == 1:
             particle_protein = interpolate(self.particle[:, :, :, 0], fineness=400)
             particle_protein = scale(particle_protein, maximum=max(self.bulk[:, :, protein_index].flatten()))
-            self.image_particle = (1
-                                   - np.stack([particle_protein.T * x for x in minus_blue], axis=-1)
-                                   )
+            particle_colors = (1
+                               - np.stack([particle_protein * x for x in minus_blue], axis=-1)
+                               )
         elif self.experiment_id.get() == 2:
             particle_protein = interpolate(self.particle[:, :, :, 1], fineness=400)
             particle_protein = scale(particle_protein, maximum=max(self.bulk[:, :, 1].flatten()))
-            self.image_particle = (1
-                                   - np.stack([particle_protein.T * x for x in minus_blue], axis=-1)
-                                   )
+            particle_colors = (1
+                               - np.stack([particle_protein * x for x in minus_blue], axis=-1)
+                               )
 
         elif self.experiment_id.get() >= 3:
             particle_salt = interpolate(self.particle[:, :, :, 0], fineness=400)
             particle_salt = scale(particle_salt)
             particle_protein = interpolate(self.particle[:, :, :, 1], fineness=400)
             particle_protein = scale(particle_protein, maximum=max(self.bulk[:, :, 1].flatten()))
-            self.image_particle = (1
-                                   - np.stack([particle_salt.T * x for x in [0, 0.4, 1]], axis=-1)
-                                   - np.stack([particle_protein.T * x for x in [1, 1, 0]], axis=-1)
-                                   )
-
-        self.bulk_image_solid = np.multiply.outer(self.bulk_image_solid, np.ones(80), ).transpose((2, 1, 4, 0, 3))
+            particle_colors = (1
+                               - np.stack([particle_salt * x for x in [0, 0.4, 1]], axis=-1)
+                               - np.stack([particle_protein * x for x in [1, 1, 0]], axis=-1)
+                               )
 
-        self.image_particle = np.multiply.outer(self.image_particle, np.ones(80), ).transpose((2, 1, 4, 0, 3))
-
-        self.bulk_image_bulk = np.multiply.outer(self.bulk_image_bulk, np.ones(80), ).transpose((1, 0, 3, 2))
+        self.column_palette = column_palette(bulk_colors, particle_colors, solid_colors)
 
         self.load_particle_stocks()
         self.load_particle_mask()
@@ -790,13 +797,4 @@ class Gui:
         threshold_liquid = (par_porosity - 0.1) / (0.8 - 0.1) * 233 + 20
         threshold_solid = 255 - threshold_liquid + 18
 
-        shell_ranges = {0: (254, 159), 1: (159, 126), 2: (126, 100), 3: (100, 50)}
-        self.bulk_image = self.bulk_image_bulk.copy()
-        for i, (upper, lower) in shell_ranges.items():
-            liquid_mask = (lower <= shells) & (shells < upper) & (0 <= liquid_color) & (liquid_color < threshold_liquid)
-            solid_mask = (lower <= shells) & (shells < upper) & (0 <= solid_color) & (solid_color < threshold_solid)
-            self.bulk_image[:, liquid_mask, :] = self.image_particle[:, liquid_mask, i, :]
-            self.bulk_image[:, solid_mask, :] = self.bulk_image_solid[:, solid_mask, i, :]
-
-        self.bulk_image[self.bulk_image < 0] = 0
-        self.bulk_image[self.bulk_image > 1] = 1
+        self.pixel_sources = pixel_sources(shells, liquid_color, solid_color, threshold_liquid, threshold_solid)
@@ -0,0 +1,165 @@
+import asyncio
+import copy
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import weakref
+
+import h5py
+
+# Results the views of the Gui show, as (unit, dataset) below output/solution
+OUTPUT_DATASETS = {
+    "inlet": ("unit_001", "solution_inlet"),
+    "outlet": ("unit_001", "solution_outlet"),
+    "bulk": ("unit_001", "solution_bulk"),
+    "solid": ("unit_001", "solution_solid"),
+    "particle": ("unit_001", "solution_particle"),
+    "times": (None, "solution_times"),
+}
+
+# Memory backed file system for the simulation files, where available
+TMPFS_DIR = "/dev/shm"
+
+
+class SimulationError(RuntimeError):
+    pass
+
+
+async def run_cadet(cadet_path, filename):
+    """ Run cadet-cli as async subprocess. If the awaiting task is
+        cancelled, the process is killed before the cancellation propagates. """
+    process = await asyncio.create_subprocess_exec(cadet_path, filename,
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    return subprocess.CompletedProcess([cadet_path, filename], process.returncode, stdout, stderr)
+
+
+def snapshot(sim):
+    """ Copy of a simulation with its own inputs, so a run in the background is
+        not affected by changes of sim while it runs. """
+    if not hasattr(sim, "install_path"):
+        # CADET-Python before 1.0 keeps no runner state in the simulation
+        return copy.deepcopy(sim)
+    # The copy gets its own runners, a library runner holds the state of its last run
+    return type(sim)(sim.install_path, sim.use_dll, {"input": sim.root.input})
+
+
+def read_output(sim):
+    """ Take the results the views need from a simulation with loaded output. """
+    solution = sim.root.output.solution
+    return {name: (solution[unit][dataset] if unit is not None else solution[dataset])
+            for name, (unit, dataset) in OUTPUT_DATASETS.items()}
+
+
+def _get_ignoring_case(group, name):
+    for key in group:
+        if key.lower() == name:
+            return group[key]
+    raise KeyError(f"{name} not found in {group.name}")
+
+
+def read_output_file(filename):
+    """ Read only the results the views need from a simulation file, instead
+        of loading the whole file including the input. """
+    with h5py.File(filename, "r") as h5file:
+        solution = _get_ignoring_case(_get_ignoring_case(h5file, "output"), "solution")
+        values = {}
+        for name, (unit, dataset) in OUTPUT_DATASETS.items():
+            group = _get_ignoring_case(solution, unit) if unit is not None else solution
+            values[name] = _get_ignoring_case(group, dataset)[()]
+    return values
+
+
+class LibraryRunner:
+    """ Runs simulations in-process through the CADET library interface of
+        CADET-Python 1.0 or later, no file is written or read.
+
+        A library call cannot be interrupted. A cancelled run finishes in its
+        thread and the next run waits for it. Runs change the simulation they
+        are given, pass a snapshot of a simulation that is still edited. """
+
+    def __init__(self):
+        # Library calls run one at a time, also if a synchronous run starts while
+        # a cancelled one is still finishing in its thread
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available(sim):
+        return hasattr(sim, "use_dll") and getattr(sim, "found_dll", False)
+
+    def run(self, sim):
+        with self._lock:
+            sim.use_dll = True
+            return_information = sim.run_load()
+            if return_information.return_code != 0:
+                raise SimulationError(return_information.error_message)
+            return read_output(sim)
+
+    async def run_async(self, sim):
+        future = asyncio.get_event_loop().run_in_executor(None, self.run, sim)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+
+class TmpfsRunner:
+    """ Runs simulations with cadet-cli on files in a directory of this session,
+        on tmpfs where available. Every run gets its own file, which is removed
+        once its results are read, so sessions and superseded runs never share
+        a file. Runs set the filename of the simulation they are given, pass a
+        snapshot of a simulation that is still edited. """
+
+    def __init__(self, directory=None):
+        if directory is None and os.path.isdir(TMPFS_DIR):
+            directory = TMPFS_DIR
+        self.directory = tempfile.mkdtemp(prefix="cadet-gui-", dir=directory)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+
+    def close(self):
+        self._finalizer()
+
+    def _save(self, sim):
+        file_descriptor, filename = tempfile.mkstemp(suffix=".h5", dir=self.directory)
+        os.close(file_descriptor)
+        sim.filename = filename
+        sim.save()
+        return filename
+
+    @staticmethod
+    def _check(return_code):
+        if return_code.returncode != 0:
+            raise SimulationError(return_code.stderr.decode(errors="replace"))
+        if len(return_code.stderr) != 0:
+            print(return_code.stderr.decode(errors="replace"))
+
+    def run(self, sim):
+        filename = self._save(sim)
+        try:
+            self._check(subprocess.run([str(sim.cadet_path), filename], capture_output=True))
+            return read_output_file(filename)
+        finally:
+            os.remove(filename)
+
+    async def run_async(self, sim):
+        filename = self._save(sim)
+        try:
+            self._check(await run_cadet(str(sim.cadet_path), filename))
+            return read_output_file(filename)
+        finally:
+            os.remove(filename)
+
+
+def create_runner(sim):
+    """ Use the library interface if CADET-Python found it, else cadet-cli. """
+    if LibraryRunner.available(sim):
+        return LibraryRunner()
+    return TmpfsRunner()
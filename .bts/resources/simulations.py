@@ -0,0 +1,99 @@
+import asyncio
+import traceback
+from collections import OrderedDict
+
+import numpy as np
+
+# Memory the cached simulation results of the Gui may use
+SIMULATION_CACHE_BYTES = 512 * 2 ** 20
+
+
+class SimulationManager:
+    """ Runs at most one simulation at a time in the background. Submitting a
+        simulation cancels the ones in flight, so the latest one wins. """
+
+    def __init__(self):
+        # Submitted tasks that have not finished, the latest one last
+        self._tasks = []
+
+    @property
+    def busy(self):
+        return any(not task.done() for task in self._tasks)
+
+    def submit(self, coroutine_function, *args):
+        self.cancel()
+        # A cancelled task that was still waiting ends at once, while the one it
+        # waited for may still be killing its process, so wait for all of them
+        previous = [task for task in self._tasks if not task.done()]
+        task = asyncio.ensure_future(self._run_after(previous, coroutine_function, *args))
+        self._tasks = previous + [task]
+        loop = asyncio.get_event_loop()
+        if not loop.is_running():
+            # Outside of a kernel, e.g. in a script
+            loop.run_until_complete(task)
+        return task
+
+    def cancel(self):
+        # Earlier tasks were cancelled when they were superseded, cancelling them
+        # again would interrupt them while they kill their processes
+        if self._tasks and not self._tasks[-1].done():
+            self._tasks[-1].cancel()
+
+    @staticmethod
+    async def _run_after(previous, coroutine_function, *args):
+        # Wait until the superseded simulations have killed their processes
+        if previous:
+            await asyncio.wait(previous)
+        try:
+            await coroutine_function(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            traceback.print_exc()
+
+
+def quantize(value, digits=6):
+    """ Round a parameter to significant digits, so slider positions that
+        only differ by floating point noise share a cache entry. """
+    return float(f"{value:.{digits}g}")
+
+
+def simulation_key(experiment_id, high_precision, parameters):
+    """ Identify a simulation by the experiment, the precision mode and the
+        quantized values of the parameters the experiment uses. """
+    return (experiment_id, high_precision) + tuple(quantize(value) for value in parameters)
+
+
+class SimulationCache:
+    """ Least recently used cache of simulation results, limited by the
+        memory of the cached arrays. """
+
+    def __init__(self, max_bytes=SIMULATION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, values):
+        n_bytes = sum(np.asarray(array).nbytes for array in values.values())
+        if n_bytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (values, n_bytes)
+        self.n_bytes += n_bytes
+        while self.n_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.n_bytes -= evicted_bytes
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
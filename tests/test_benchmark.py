@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.benchmark import compare_results, create_synthetic_workshop, run_benchmark
+
+
+class Test_Benchmark(unittest.TestCase):
+
+    def test_synthetic_workshop_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo = create_synthetic_workshop(Path(tmp_dir) / "workshop", n_notebooks=3, n_cells=6, tag_density=1.0)
+            result = run_benchmark(repo, "sequential", n_cores=1)
+
+            self.assertEqual(result["backend"], "sequential")
+            self.assertGreater(result["notebooks_per_second"], 0)
+            self.assertIn("convert", result["stages"])
+
+            solution = nbformat.reads(repo.git.show("solution:00 Chapter/001_notebook.ipynb"), as_version=4)
+            teaching = nbformat.reads(repo.git.show("teaching:00 Chapter/001_notebook.ipynb"), as_version=4)
+            code_cells = [(s, t) for s, t in zip(solution.cells, teaching.cells) if s.cell_type == "code"]
+            self.assertEqual(len(code_cells), 3)
+            for solution_cell, teaching_cell in code_cells:
+                self.assertNotEqual(solution_cell.source, "")
+                self.assertEqual(teaching_cell.source, "")
+            repo.close()
+
+    def test_compare_results(self):
+        config = {"notebooks": 3}
+        previous = [{"revision": "abc", "config": config, "backends": [{"backend": "thread", "wall_seconds": 1.0}]}]
+        result = {"revision": "def", "config": config, "backends": [{"backend": "thread", "wall_seconds": 1.5}]}
+        self.assertIn("REGRESSION", compare_results(result, previous)[0])
+        self.assertEqual(compare_results(result, [], threshold=2), ["No earlier result with the same configuration."])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from workshop_git_tools.build_cache import BuildCache
+
+
+class Test_Build_Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.config_path = self.root / ".nbtoolbelt.json"
+        self.config_path.write_text('{"nbpunch": {"tags": ["solution"]}}')
+        self.source_path = self.root / "notebook.md"
+        self.source_path.write_text("# Title\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_content_variant_and_config(self):
+        cache = BuildCache(self.root / "cache", self.config_path)
+        key = cache.key(self.source_path, "teaching")
+
+        self.assertEqual(key, cache.key(self.source_path, "teaching"))
+        self.assertNotEqual(key, cache.key(self.source_path, "solution"))
+
+        self.source_path.write_text("# Other title\n")
+        self.assertNotEqual(key, cache.key(self.source_path, "teaching"))
+
+        self.source_path.write_text("# Title\n")
+        self.config_path.write_text('{"nbpunch": {"tags": ["hidden"]}}')
+        other_cache = BuildCache(self.root / "cache", self.config_path)
+        self.assertNotEqual(key, other_cache.key(self.source_path, "teaching"))
+
+    def test_store_and_fetch(self):
+        cache = BuildCache(self.root / "cache", self.config_path)
+        key = cache.key(self.source_path, "solution")
+        destination_path = self.root / "notebook.ipynb"
+
+        self.assertFalse(cache.fetch(key, destination_path))
+        self.assertFalse(destination_path.exists())
+
+        artifact_path = self.root / "artifact.ipynb"
+        artifact_path.write_text('{"cells": []}')
+        cache.store(key, artifact_path)
+
+        self.assertIn(key, cache)
+        self.assertTrue(cache.fetch(key, destination_path))
+        self.assertEqual(destination_path.read_text(), '{"cells": []}')
+
+        cache.clear()
+        self.assertNotIn(key, cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
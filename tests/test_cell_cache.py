@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.cell_cache import CellCache, cell_chain_keys
+
+
+class Test_Cell_Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_chain_keys_change_from_first_changed_cell(self):
+        notebook = nbformat.v4.new_notebook()
+        notebook.cells = [nbformat.v4.new_code_cell("x = 1"),
+                          nbformat.v4.new_markdown_cell("Text"),
+                          nbformat.v4.new_code_cell("y = x + 1"),
+                          nbformat.v4.new_code_cell("print(y)")]
+        keys = cell_chain_keys(notebook, "root")
+        self.assertEqual([index for index, _ in keys], [0, 2, 3])
+
+        notebook.cells[2].source = "y = x + 2"
+        changed_keys = cell_chain_keys(notebook, "root")
+        self.assertEqual(keys[0], changed_keys[0])
+        self.assertNotEqual(keys[1], changed_keys[1])
+        self.assertNotEqual(keys[2], changed_keys[2])
+
+        self.assertNotEqual(keys, cell_chain_keys(notebook, "other root"))
+
+    def test_outputs_and_snapshot_pruning(self):
+        cache = CellCache(self.root / "cache")
+        cell = nbformat.v4.new_code_cell("print(1)", execution_count=1,
+                                         outputs=[nbformat.v4.new_output("stream", text="1\n")])
+        self.assertIsNone(cache.load_outputs("ab01"))
+        cache.store_outputs("ab01", cell)
+        self.assertEqual(cache.load_outputs("ab01")["outputs"], cell.outputs)
+
+        cache.snapshot_path("ab01").write_bytes(b"old")
+        cache.prune_snapshots("notebook.ipynb", ["ab01"])
+        cache.snapshot_path("cd02").write_bytes(b"new")
+        cache.prune_snapshots("notebook.ipynb", ["cd02"])
+        self.assertFalse(cache.has_snapshot("ab01"))
+        self.assertTrue(cache.has_snapshot("cd02"))
+        self.assertIsNotNone(cache.load_outputs("ab01"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import importlib.util
+import unittest
+from pathlib import Path
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator, interp1d
+
+RESOURCES_DIR = Path(__file__).resolve().parents[1] / ".bts" / "resources"
+
+
+def load_resource(name):
+    """Load a module of the Gui resources without the package, which imports the widgets."""
+    spec = importlib.util.spec_from_file_location(name, RESOURCES_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+column_image = load_resource("column_image")
+
+
+def interpolate_per_timepoint(input_array, fineness, kind):
+    """The interpolation of the Gui before it was vectorized, one timepoint and shell at a time."""
+    interpolated_list = []
+    x_in = np.arange(0, input_array.shape[1])
+    x_out = np.linspace(0, input_array.shape[1] - 1, fineness)
+    for i in range(input_array.shape[0]):
+        if kind != "nearest":
+            interpolated = PchipInterpolator(x_in, input_array[i, :])(x_out)
+        elif input_array.ndim > 2:
+            interpolated = np.stack([interp1d(x_in, input_array[i, :, j], kind="previous")(x_out)
+                                     for j in range(input_array.shape[2])]).T
+        else:
+            interpolated = interp1d(x_in, input_array[i, :], kind="previous")(x_out)
+        interpolated_list.append(interpolated)
+    return np.stack(interpolated_list)
+
+
+def composite_with_mask_copies(bulk_colors, particle_colors, solid_colors, shells, liquid_color, solid_color,
+                               threshold_liquid, threshold_solid):
+    """The column images of the Gui before the palette, replicated over the width and copied per mask."""
+    width = shells.shape[1]
+    image = np.multiply.outer(bulk_colors, np.ones(width)).transpose((0, 1, 3, 2))
+    particle_image = np.multiply.outer(particle_colors, np.ones(width)).transpose((0, 1, 4, 2, 3))
+    solid_image = np.multiply.outer(solid_colors, np.ones(width)).transpose((0, 1, 4, 2, 3))
+    for i, (upper, lower) in column_image.SHELL_RANGES.items():
+        liquid_mask = (lower <= shells) & (shells < upper) & (0 <= liquid_color) & (liquid_color < threshold_liquid)
+        solid_mask = (lower <= shells) & (shells < upper) & (0 <= solid_color) & (solid_color < threshold_solid)
+        image[:, liquid_mask, :] = particle_image[:, liquid_mask, i, :]
+        image[:, solid_mask, :] = solid_image[:, solid_mask, i, :]
+    image[image < 0] = 0
+    image[image > 1] = 1
+    return column_image.to_rgb(image)
+
+
+class Test_Column_Image(unittest.TestCase):
+
+    def test_interpolate_matches_per_timepoint_loop(self):
+        rng = np.random.default_rng(0)
+        for shape in [(30, 20), (30, 20, 4), (5, 7), (3, 1000)]:
+            input_array = rng.random(shape)
+            with self.subTest(shape=shape):
+                expected = interpolate_per_timepoint(input_array, 400, "nearest")
+                np.testing.assert_array_equal(column_image.interpolate(input_array, 400), expected)
+
+                expected = interpolate_per_timepoint(input_array, 400, "pchip")
+                np.testing.assert_allclose(column_image.interpolate(input_array, 400, kind="pchip"), expected,
+                                           rtol=1e-12, atol=1e-12)
+
+    def test_interpolate_returns_new_array(self):
+        # scale() modifies its argument, the simulation results must stay untouched
+        input_array = np.arange(-3.0, 3.0).reshape(2, 3)
+        column_image.scale(column_image.interpolate(input_array, 10))
+        np.testing.assert_array_equal(input_array, np.arange(-3.0, 3.0).reshape(2, 3))
+
+    def test_palette_gather_matches_mask_copies(self):
+        rng = np.random.default_rng(0)
+        n_time, n_position, width, n_shells = 6, 40, 8, 4
+        shells, liquid_color, solid_color = rng.integers(0, 256, (3, n_position, width))
+        threshold_liquid = (0.5 - 0.1) / (0.8 - 0.1) * 233 + 20
+        threshold_solid = 255 - threshold_liquid + 18
+        sources = column_image.pixel_sources(shells, liquid_color, solid_color, threshold_liquid, threshold_solid)
+
+        # Colors outside of [0, 1] are clipped, constant colors are broadcast views
+        bulk_colors = rng.uniform(-0.2, 1.2, (n_time, n_position, 3))
+        shell_shape = (n_time, n_position, n_shells, 3)
+        for particle_colors, solid_colors in [
+                (rng.uniform(-0.2, 1.2, shell_shape), rng.uniform(-0.2, 1.2, shell_shape)),
+                (np.broadcast_to(np.ones(3), shell_shape), np.broadcast_to(np.zeros(3), shell_shape))]:
+            palette = column_image.column_palette(bulk_colors, particle_colors, solid_colors)
+            self.assertEqual((palette.shape, palette.dtype), ((n_time, n_position, 1 + 2 * n_shells, 3), np.uint8))
+
+            expected = composite_with_mask_copies(bulk_colors, particle_colors, solid_colors, shells, liquid_color,
+                                                  solid_color, threshold_liquid, threshold_solid)
+            images = np.stack([column_image.render_column(palette[t], sources) for t in range(n_time)])
+            np.testing.assert_array_equal(images, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
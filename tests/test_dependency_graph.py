@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.dependency_graph import DependencyGraph
+
+
+class Test_Dependency_Graph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+
+        (self.root / "chapter" / "data").mkdir(parents=True)
+        (self.root / "chapter" / "data" / "values.xlsx").write_bytes(b"xlsx")
+        (self.root / "chapter" / "resources").mkdir()
+        (self.root / "chapter" / "resources" / "__init__.py").write_text("from .gui import Gui\n")
+        (self.root / "chapter" / "resources" / "gui.py").write_text(
+            "from .model import create_model\nimage = imread('resources/image.png')\n")
+        (self.root / "chapter" / "resources" / "model.py").write_text("import numpy\n")
+        (self.root / "chapter" / "resources" / "image.png").write_bytes(b"png")
+        (self.root / "chapter" / "unused.py").write_text("")
+
+        self.write_notebook("chapter/reader.ipynb",
+                            ['%matplotlib inline\nimport pandas as pd\ndata = pd.read_excel("data/values.xlsx")',
+                             "print('no file')"])
+        self.write_notebook("chapter/gui.ipynb", ["from resources.gui import Gui\nGui()"])
+        self.write_notebook("intro.ipynb", ["import numpy as np\nx = np.ones(3)"])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_notebook(self, relative_path, sources):
+        notebook = nbformat.v4.new_notebook()
+        notebook.cells = [nbformat.v4.new_code_cell(source) for source in sources]
+        nbformat.write(notebook, self.root / relative_path)
+
+    def test_dependencies(self):
+        graph = DependencyGraph(self.root)
+        self.assertEqual(graph.dependencies(self.root / "chapter/reader.ipynb"), [Path("chapter/data/values.xlsx")])
+        self.assertEqual(graph.dependencies(self.root / "chapter/gui.ipynb"),
+                         [Path("chapter/resources/__init__.py"), Path("chapter/resources/gui.py"),
+                          Path("chapter/resources/image.png"), Path("chapter/resources/model.py")])
+        self.assertEqual(graph.dependencies(self.root / "intro.ipynb"), [])
+
+    def test_only_dependent_notebooks_are_affected(self):
+        notebooks = ["chapter/reader.ipynb", "chapter/gui.ipynb", "intro.ipynb"]
+        graph = DependencyGraph(self.root)
+        self.assertEqual(graph.affected_notebooks(notebooks, ["chapter/resources/model.py"]),
+                         [(self.root / "chapter/gui.ipynb").resolve()])
+
+        digests = {notebook: graph.inputs_digest(self.root / notebook) for notebook in notebooks}
+        (self.root / "chapter" / "resources" / "image.png").write_bytes(b"new png")
+        graph = DependencyGraph(self.root)
+        changed = [notebook for notebook in notebooks if graph.inputs_digest(self.root / notebook) != digests[notebook]]
+        self.assertEqual(changed, ["chapter/gui.ipynb"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from workshop_git_tools.executors import (
+    ExecutionError, JoblibBackend, PathosBackend, SequentialBackend, ThreadBackend, run_func_over_args_list
+)
+
+
+def square(x):
+    return x ** 2
+
+
+def fail_on_odd(x):
+    if x % 2:
+        raise ValueError(f"odd {x}")
+    return x
+
+
+class Flaky:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        if self.calls == 1:
+            raise OSError("busy")
+        return x
+
+
+class Test_Executors(unittest.TestCase):
+
+    def test_backends_return_ordered_results(self):
+        args_list = [(x,) for x in range(6)]
+        for backend in (SequentialBackend(), ThreadBackend(n_cores=3), JoblibBackend(n_cores=2),
+                        PathosBackend(n_cores=2)):
+            with self.subTest(backend=type(backend).__name__):
+                self.assertEqual(backend.run(square, args_list), [0, 1, 4, 9, 16, 25])
+
+    def test_run_func_over_args_list_uses_backend(self):
+        results = run_func_over_args_list(square, [1, 2, 3], backend=ThreadBackend(n_cores=2), n_cores=2)
+        self.assertEqual(results, [1, 4, 9])
+        self.assertEqual(run_func_over_args_list(square, []), [])
+
+    def test_failures_are_aggregated(self):
+        results = ThreadBackend(n_cores=2).map(fail_on_odd, [(x,) for x in range(4)], labels=list("abcd"))
+        self.assertEqual([result.ok for result in results], [True, False, True, False])
+        self.assertTrue(all(result.seconds >= 0 for result in results))
+
+        with self.assertRaises(ExecutionError) as context:
+            SequentialBackend().run(fail_on_odd, [(x,) for x in range(4)], labels=list("abcd"))
+        self.assertEqual([failure.label for failure in context.exception.failures], ["b", "d"])
+        self.assertIn("odd 3", str(context.exception))
+
+    def test_retry_on_transient_failure(self):
+        self.assertFalse(SequentialBackend().map(Flaky(), [(1,)])[0].ok)
+
+        result = SequentialBackend(retries=1).map(Flaky(), [(1,)])[0]
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 2)
+
+        result = SequentialBackend(retries=3).map(fail_on_odd, [(1,)])[0]
+        self.assertEqual(result.attempts, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path, PurePosixPath
+
+import git
+
+from workshop_git_tools.file_index import MAX_SHARED_INDEXES, FileIndex
+from workshop_git_tools.process_repo import collect_notebook_sources
+
+
+class Test_File_Index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.repo = git.Repo.init(self.root, initial_branch="dev")
+        with self.repo.config_writer() as config:
+            config.set_value("user", "name", "test")
+            config.set_value("user", "email", "test@example.com")
+
+        (self.root / "chapter" / ".ipynb_checkpoints").mkdir(parents=True)
+        (self.root / "README.md").write_text("# Workshop\n")
+        (self.root / "chapter" / "lesson.md").write_text("# Lesson\n")
+        (self.root / "chapter" / "exercise.ipynb").write_text("{}")
+        (self.root / "chapter" / ".ipynb_checkpoints" / "lesson-checkpoint.ipynb").write_text("{}")
+        self.repo.git.add(".")
+        self.repo.git.commit("-m", "Initial commit")
+
+        (self.root / "chapter" / "staged.md").write_text("# Staged\n")
+        self.repo.git.add("chapter/staged.md")
+        (self.root / "chapter" / "scratch.md").write_text("# Untracked\n")
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmp_dir.cleanup()
+
+    def test_index_lists_tracked_and_staged_files(self):
+        paths = FileIndex(self.repo).paths()
+        self.assertEqual(paths, [PurePosixPath(path) for path in
+                                 ["README.md", "chapter/exercise.ipynb", "chapter/lesson.md", "chapter/staged.md"]])
+
+    def test_treeish_lists_committed_files(self):
+        files = FileIndex(self.repo, "dev").files((".md",), root=self.root)
+        self.assertEqual(files, [self.root / "README.md", self.root / "chapter" / "lesson.md"])
+
+    def test_for_repo_is_shared_until_the_index_changes(self):
+        index = FileIndex.for_repo(self.repo)
+        self.assertIs(FileIndex.for_repo(self.repo), index)
+
+        self.repo.git.add("chapter/scratch.md")
+        changed_index = FileIndex.for_repo(self.repo)
+        self.assertIsNot(changed_index, index)
+        self.assertIn(PurePosixPath("chapter/scratch.md"), changed_index.paths())
+
+        # Only the latest index of a repository is kept
+        kept = [index for _, index in FileIndex._instances.values() if index.repo is self.repo]
+        self.assertEqual(kept, [changed_index])
+
+    def test_for_repo_keeps_a_bounded_number_of_indexes(self):
+        for i in range(MAX_SHARED_INDEXES + 5):
+            self.repo.git.tag(f"tag{i}")
+            FileIndex.for_repo(self.repo, f"tag{i}")
+        self.assertLessEqual(len(FileIndex._instances), MAX_SHARED_INDEXES)
+        latest = FileIndex.for_repo(self.repo, f"tag{MAX_SHARED_INDEXES + 4}")
+        self.assertIs(FileIndex.for_repo(self.repo, f"tag{MAX_SHARED_INDEXES + 4}"), latest)
+
+    def test_collect_notebook_sources(self):
+        notebook_sources = collect_notebook_sources(self.root, FileIndex(self.repo, "dev"))
+        chapter = self.root / "chapter"
+        self.assertEqual(notebook_sources, {chapter / "lesson.ipynb": chapter / "lesson.md",
+                                            chapter / "exercise.ipynb": chapter / "exercise.ipynb"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import base64
+import copy
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.image_store import extract_notebook_images, load_notebook
+
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\nnot really a png").decode("ascii")
+
+
+class Test_Image_Store(unittest.TestCase):
+
+    def test_extract_and_inline(self):
+        notebook = nbformat.v4.new_notebook()
+        notebook.cells = [
+            nbformat.v4.new_code_cell("plot()", outputs=[
+                nbformat.v4.new_output("display_data", {"image/png": PNG, "text/plain": "<Figure>"})]),
+            nbformat.v4.new_code_cell("plot()", outputs=[
+                nbformat.v4.new_output("display_data", {"image/png": PNG, "text/html": "<b>figure</b>"}),
+                nbformat.v4.new_output("stream", name="stdout", text="done\n")]),
+        ]
+        original = copy.deepcopy(notebook)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ipynb_path = Path(tmp_dir) / "chapter" / "plots.ipynb"
+            ipynb_path.parent.mkdir()
+            nbformat.write(notebook, ipynb_path)
+
+            assets = extract_notebook_images(ipynb_path, Path(tmp_dir) / "_output_images")
+            self.assertEqual(len(assets), 1)
+            asset = assets.pop()
+            self.assertEqual(asset.read_bytes(), base64.b64decode(PNG))
+
+            extracted = nbformat.read(ipynb_path, as_version=4)
+            first, second = (cell.outputs[0] for cell in extracted.cells)
+            self.assertNotIn("image/png", first.data)
+            self.assertEqual(first.data["text/html"], f'<img src="../_output_images/{asset.name}"/>')
+            self.assertEqual(second.data["text/html"], "<b>figure</b>")
+            self.assertNotIn(PNG, ipynb_path.read_text())
+
+            self.assertEqual(load_notebook(ipynb_path), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from workshop_git_tools.instrumentation import BuildReport, run_measured
+
+
+class Test_Instrumentation(unittest.TestCase):
+
+    def test_child_process_usage(self):
+        report = BuildReport()
+        busy_command = f'"{sys.executable}" -c "sum(range(3 * 10 ** 6)); x = bytearray(50 * 2 ** 20)"'
+        with report.stage("run", "busy.ipynb"):
+            run_measured(busy_command)
+        with self.assertRaises(subprocess.CalledProcessError):
+            with report.stage("run", "failing.ipynb"):
+                run_measured(f'"{sys.executable}" -c "raise SystemExit(3)"')
+
+        busy, failing = report.measurements
+        self.assertTrue(busy.ok)
+        self.assertFalse(failing.ok)
+        if sys.platform != "win32":
+            self.assertGreater(busy.cpu_seconds, 0)
+            self.assertGreater(busy.peak_rss, 50 * 2 ** 20)
+
+    def test_report(self):
+        report = BuildReport()
+        with report.stage("commit", "solution"):
+            with report.stage("run", "a.ipynb"):
+                pass
+
+        totals = report.totals()
+        self.assertEqual(totals["run"]["count"], 1)
+        self.assertIn("a.ipynb", report.summary())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = Path(tmp_dir) / "report.json"
+            report.write(report_path)
+            data = json.loads(report_path.read_text())
+        self.assertEqual([measurement["stage"] for measurement in data["measurements"]], ["run", "commit"])
+
+
+if __name__ == '__main__':
+    unittest.main()
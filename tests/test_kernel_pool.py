@@ -0,0 +1,165 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.cell_cache import CellCache
+from workshop_git_tools.kernel_pool import KernelPool
+from workshop_git_tools.limits import ResourceLimitExceeded
+
+
+def write_notebook(path, *sources):
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [nbformat.v4.new_markdown_cell("# Notebook")]
+    notebook.cells += [nbformat.v4.new_code_cell(source) for source in sources]
+    nbformat.write(notebook, path)
+    return path
+
+
+def read_result(path):
+    return nbformat.read(path.with_name(path.stem + "-run.ipynb"), as_version=4)
+
+
+def stream_text(cell):
+    return "".join(output.get("text", "") for output in cell.outputs)
+
+
+class Test_Kernel_Pool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.config_path = self.root / ".nbtoolbelt.json"
+        self.config_path.write_text("{}")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_kernel_is_reset_between_notebooks(self):
+        (self.root / "helpers.py").write_text("VALUE = 1\n")
+        first_path = write_notebook(self.root / "first.ipynb", "import helpers\nx = helpers.VALUE")
+        second_path = write_notebook(self.root / "second.ipynb",
+                                     "import os, sys\nprint('x' in dir(), 'helpers' in sys.modules, os.getcwd())")
+
+        with KernelPool(n_kernels=1, warmup_modules=()) as pool:
+            kernel_manager = pool._kernel_managers[0]
+            pool.run_notebook(first_path.as_posix(), self.config_path.as_posix())
+            pool.run_notebook(second_path.as_posix(), self.config_path.as_posix())
+            self.assertEqual(pool._kernel_managers, [kernel_manager])
+
+        cell = read_result(second_path).cells[1]
+        self.assertEqual(stream_text(cell), f"False False {self.root.resolve()}\n")
+        self.assertEqual(cell.execution_count, 1)
+
+    def test_kernel_killed_on_timeout(self):
+        slow_path = write_notebook(self.root / "slow.ipynb", "import time\ntime.sleep(60)")
+        fast_path = write_notebook(self.root / "fast.ipynb", "print(1)")
+
+        with KernelPool(n_kernels=1, warmup_modules=()) as pool:
+            kernel_manager = pool._kernel_managers[0]
+            with self.assertRaises(ResourceLimitExceeded):
+                pool.run_notebook(slow_path.as_posix(), self.config_path.as_posix(),
+                                  limits={"timeout": 2, "memory_mb": -1})
+            self.assertFalse(kernel_manager.is_alive())
+
+            # The next notebook gets a fresh kernel
+            pool.run_notebook(fast_path.as_posix(), self.config_path.as_posix())
+            self.assertNotIn(kernel_manager, pool._kernel_managers)
+
+        self.assertEqual(stream_text(read_result(fast_path).cells[1]), "1\n")
+
+    def test_resume_from_changed_cell(self):
+        log_path = self.root / "executed.txt"
+        sources = [
+            f"open({log_path.as_posix()!r}, 'a').write('0')\na = 1\nprint(a)",
+            f"open({log_path.as_posix()!r}, 'a').write('1')\nb = a + 1\nprint(b)",
+            f"open({log_path.as_posix()!r}, 'a').write('2')\nprint(b * 10)",
+        ]
+        notebook_path = write_notebook(self.root / "lesson.ipynb", *sources)
+
+        with KernelPool(n_kernels=1, warmup_modules=(), cell_cache=CellCache(self.root / "cache")) as pool:
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "012")
+            first_cells = read_result(notebook_path).cells
+
+            # Only the last cell changed, the earlier ones are restored from the cache, including the namespace
+            write_notebook(notebook_path, *sources[:2], sources[2].replace("b * 10", "b * 100"))
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "0122")
+
+        cells = read_result(notebook_path).cells
+        for index in (1, 2):
+            self.assertEqual(cells[index].outputs, first_cells[index].outputs)
+            self.assertEqual(cells[index].execution_count, first_cells[index].execution_count)
+        self.assertEqual(stream_text(cells[3]), "200\n")
+        self.assertEqual(cells[3].execution_count, 3)
+
+    def test_resume_before_unpicklable_cell(self):
+        log_path = self.root / "executed.txt"
+        sources = [
+            f"open({log_path.as_posix()!r}, 'a').write('0')\na = 1",
+            f"open({log_path.as_posix()!r}, 'a').write('1')\nnumbers = (i for i in range(3))",
+            f"open({log_path.as_posix()!r}, 'a').write('2')\nprint(a, list(numbers))",
+        ]
+        notebook_path = write_notebook(self.root / "lesson.ipynb", *sources)
+
+        with KernelPool(n_kernels=1, warmup_modules=(), cell_cache=CellCache(self.root / "cache")) as pool:
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            # A generator cannot be pickled, so the namespace after the second cell has no snapshot
+            # and the second cell is executed again, starting from the snapshot of the first one
+            write_notebook(notebook_path, *sources[:2], sources[2].replace("print(a, ", "print(a + 1, "))
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "01212")
+
+        self.assertEqual(stream_text(read_result(notebook_path).cells[3]), "2 [0, 1, 2]\n")
+
+    def test_snapshot_every_second_cell(self):
+        log_path = self.root / "executed.txt"
+        sources = [f"open({log_path.as_posix()!r}, 'a').write('{i}')\nx{i} = {i}" for i in range(3)]
+        notebook_path = write_notebook(self.root / "lesson.ipynb", *sources)
+        cache = CellCache(self.root / "cache", snapshot_every=2)
+
+        with KernelPool(n_kernels=1, warmup_modules=(), cell_cache=cache) as pool:
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(len(list(cache.cache_dir.rglob("*.pkl"))), 1)
+
+            # The second cell has a snapshot, so only the changed last cell is executed again
+            write_notebook(notebook_path, *sources[:2], sources[2] + "\nprint(x1 + 10)")
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "0122")
+
+            # The first cell has none, so everything is executed again
+            write_notebook(notebook_path, sources[0], sources[1] + "\nprint(x0)", sources[2])
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "0122012")
+
+        self.assertEqual(stream_text(read_result(notebook_path).cells[2]), "0\n")
+
+    def test_snapshot_size_limit(self):
+        log_path = self.root / "executed.txt"
+        sources = [
+            f"open({log_path.as_posix()!r}, 'a').write('0')\na = 1",
+            f"open({log_path.as_posix()!r}, 'a').write('1')\ndata = bytes(2 * 1024 ** 2)",
+            f"open({log_path.as_posix()!r}, 'a').write('2')\nprint(a, len(data))",
+        ]
+        notebook_path = write_notebook(self.root / "lesson.ipynb", *sources)
+        cache = CellCache(self.root / "cache", snapshot_max_mb=1)
+
+        with KernelPool(n_kernels=1, warmup_modules=(), cell_cache=cache) as pool:
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            # Only the namespace before the large variable is stored, the outputs of all cells are
+            snapshot_sizes = [path.stat().st_size for path in cache.cache_dir.rglob("*.pkl")]
+            self.assertEqual(len(snapshot_sizes), 1)
+            self.assertLess(snapshot_sizes[0], 1024 ** 2)
+            self.assertEqual(len(list(cache.cache_dir.glob("??/*.json"))), 3)
+
+            write_notebook(notebook_path, *sources[:2], sources[2].replace("print(a, ", "print(a + 1, "))
+            pool.run_notebook(notebook_path.as_posix(), self.config_path.as_posix(), notebook_key="lesson.ipynb")
+            self.assertEqual(log_path.read_text(), "01212")
+
+        self.assertEqual(stream_text(read_result(notebook_path).cells[3]), "2 2097152\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from workshop_git_tools.instrumentation import run_measured
+from workshop_git_tools.limits import ResourceLimitExceeded, load_limits, psutil
+
+
+class Test_Limits(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.config_path = self.root / ".nbtoolbelt.json"
+        self.config_path.write_text(json.dumps({
+            "limits": {
+                "timeout": 600,
+                "notebooks": {"04 Chromatography/*": {"timeout": 1800}},
+            },
+        }))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_limits(self):
+        limits = load_limits(str(self.config_path), self.root / "lesson.ipynb")
+        self.assertEqual(limits, {"timeout": 600, "memory_mb": -1})
+
+        notebook_path = self.root / "04 Chromatography" / "lesson.ipynb"
+        notebook_path.parent.mkdir()
+        limits = load_limits(str(self.config_path), notebook_path)
+        self.assertEqual(limits, {"timeout": 1800, "memory_mb": -1})
+
+        (notebook_path.parent / "lesson.limits.json").write_text('{"memory_mb": 2048}')
+        limits = load_limits(str(self.config_path), notebook_path)
+        self.assertEqual(limits, {"timeout": 1800, "memory_mb": 2048})
+
+    def test_load_limits_without_config(self):
+        limits = load_limits(str(self.root / "missing.json"), self.root / "lesson.ipynb")
+        self.assertEqual(limits, {"timeout": -1, "memory_mb": -1})
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(ResourceLimitExceeded) as context:
+            run_measured("sleep 30 & sleep 30; wait", {"timeout": 0.5})
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(context.exception.kind, "timeout")
+
+    @unittest.skipIf(psutil is None, "memory is only limited with psutil")
+    def test_memory_limit(self):
+        command = f"{sys.executable} -c \"import time; data = bytearray(400 * 2 ** 20); time.sleep(30)\""
+        with self.assertRaises(ResourceLimitExceeded) as context:
+            run_measured(command, {"memory_mb": 100})
+        self.assertEqual(context.exception.kind, "memory_mb")
+        self.assertGreater(context.exception.usage, 100)
+
+    def test_within_limits(self):
+        self.assertEqual(run_measured("true", {"timeout": 10, "memory_mb": -1}).returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
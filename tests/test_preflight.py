@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.preflight import PreflightError, check_notebook, check_notebooks
+
+
+def make_notebook(*sources, tags=()):
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells = [nbformat.v4.new_markdown_cell("# Notebook")]
+    notebook.cells += [nbformat.v4.new_code_cell(source, metadata={"tags": list(tags)}) for source in sources]
+    return notebook
+
+
+class Test_Preflight(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        (self.root / "experimental_data").mkdir()
+        (self.root / "experimental_data" / "gradient.xlsx").write_text("")
+        (self.root / "experiments" / "run_1").mkdir(parents=True)
+        (self.root / "experiments" / "run_1" / "uv.csv").write_text("")
+        (self.root / "helpers.py").write_text("")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_valid_notebook(self):
+        notebook = make_notebook(
+            "%matplotlib inline\nimport numpy as np\nimport helpers\nfrom os import path",
+            "import pandas as pd\ndata = pd.read_excel('experimental_data/gradient.xlsx', index_col=0)",
+            "import glob\nfiles = glob.glob('experiments/*/*.csv')",
+            "with open('results.txt', 'w') as f:\n    f.write('x')\nawait something()",
+            "try:\n    import not_installed_module\nexcept ImportError:\n    pass",
+            "%%bash\nls -l",
+        )
+        self.assertEqual(check_notebook(notebook, self.root), [])
+
+    def test_problems(self):
+        notebook = make_notebook(
+            "import numpy as np\nimport not_installed_module",
+            "data = np.loadtxt('experimental_data/missing.csv')",
+            "files = glob.glob('experiments/*/*.xlsx')",
+            "x = 1\nlength! = 10",
+            "import not_installed_module.sub",
+        )
+        problems = check_notebook(nbformat.writes(notebook), self.root)
+        self.assertEqual([(problem.kind, problem.cell, problem.line) for problem in problems],
+                         [("import", 1, 2), ("file", 2, 1), ("file", 3, 1), ("syntax", 4, 2)])
+        self.assertIn("not_installed_module", problems[0].message)
+
+    def test_skipped_cells(self):
+        self.assertEqual(check_notebook(make_notebook("length! = 10", tags=["raises-exception"]), self.root), [])
+        notebook = make_notebook("%pip install some-package", "import some_package")
+        self.assertEqual(check_notebook(notebook, self.root), [])
+
+    def test_check_notebooks(self):
+        notebooks = {
+            "good.ipynb": (self.root / "good.ipynb", nbformat.writes(make_notebook("x = 1"))),
+            "bad.ipynb": (self.root / "bad.ipynb", nbformat.writes(make_notebook("x = = 1"))),
+        }
+        check_notebooks({"good.ipynb": notebooks["good.ipynb"]})
+        with self.assertRaises(PreflightError) as context:
+            check_notebooks(notebooks)
+        self.assertEqual(list(context.exception.problems), ["bad.ipynb"])
+        self.assertIn("bad.ipynb:\n  - cell 1, line 1: syntax", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
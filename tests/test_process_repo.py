@@ -1,7 +1,13 @@
 from git import Repo
 import shutil
 import os
+import sys
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
+
+import nbformat
 
 from workshop_git_tools import process_repo, setup_repo
 from workshop_git_tools.process_repo import on_error
@@ -24,6 +30,115 @@ class Test_Workshop_Tools(unittest.TestCase):
         # ToDo: add actual test assertions.
         os.chdir("..")
 
+    def test_main_run(self):
+        argv = ["process_repo", "--run", "--warm_kernels", "2", "--shard", "1/2", "--no_preflight"]
+        with mock.patch.object(sys, "argv", argv), mock.patch.object(process_repo, "create_branches") as create:
+            process_repo.main()
+        args = create.call_args.args
+        self.assertEqual(args[0], ("solution", "teaching"))
+        # run, warm_kernels, shard and preflight
+        self.assertEqual((args[1], args[7], args[8], args[14]), (True, 2, "1/2", False))
+
+        with mock.patch.object(sys, "argv", ["process_repo"]), \
+                mock.patch.object(process_repo, "create_branches") as create:
+            process_repo.main()
+        self.assertFalse(create.call_args.args[1])
+
+    def test_convert_notebook_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ipynb_paths = []
+            for i in range(3):
+                notebook = nbformat.v4.new_notebook()
+                notebook.cells = [nbformat.v4.new_markdown_cell(f"# Notebook {i}"),
+                                  nbformat.v4.new_code_cell(f"x = {i}")]
+                ipynb_path = Path(tmp_dir) / f"notebook_{i}.ipynb"
+                nbformat.write(notebook, ipynb_path)
+                ipynb_paths.append(ipynb_path)
+
+            myst_paths = process_repo.convert_notebooks(ipynb_paths, to_format="md:myst")
+            self.assertEqual(len(myst_paths), 3)
+            for ipynb_path in ipynb_paths:
+                os.remove(ipynb_path)
+
+            process_repo.convert_notebook_batch(myst_paths, "ipynb")
+            for i, ipynb_path in enumerate(ipynb_paths):
+                notebook = nbformat.read(ipynb_path, as_version=4)
+                self.assertEqual([cell.source for cell in notebook.cells], [f"# Notebook {i}", f"x = {i}"])
+
+    def test_punch_notebook(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = Path(tmp_dir) / ".nbtoolbelt.json"
+            config_path.write_text('{"nbpunch": {"tags": ["solution"], "punch_punched_result_name": ""}}')
+
+            notebook = nbformat.v4.new_notebook()
+            solution_cell = nbformat.v4.new_code_cell("y = 2", metadata={"tags": ["solution"]})
+            solution_cell.outputs = [nbformat.v4.new_output("stream", text="2")]
+            solution_cell.execution_count = 2
+            notebook.cells = [nbformat.v4.new_code_cell("x = 1"), solution_cell]
+            ipynb_path = Path(tmp_dir) / "notebook.ipynb"
+            nbformat.write(notebook, ipynb_path)
+
+            process_repo.punch_notebook(ipynb_path.as_posix(), config_path.as_posix())
+
+            punched = nbformat.read(ipynb_path, as_version=4)
+            self.assertEqual(punched.cells[0].source, "x = 1")
+            self.assertEqual(punched.cells[1].source, "")
+            self.assertEqual(punched.cells[1].outputs, [])
+            self.assertIsNone(punched.cells[1].execution_count)
+
+    def test_delete_dir_contents(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_path = Path(tmp_dir) / "copy"
+            (dir_path / "folder").mkdir(parents=True)
+            (dir_path / "folder" / "file.txt").write_text("x")
+            (dir_path / "file.txt").write_text("x")
+
+            process_repo.delete_dir_contents(dir_path)
+            self.assertTrue(dir_path.is_dir())
+            self.assertEqual(list(dir_path.iterdir()), [])
+
+    def test_setup_teaching_copy(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            repo = Repo.init(Path(tmp_dir) / "workshop", initial_branch="dev")
+            with repo.config_writer() as config:
+                config.set_value("user", "name", "test")
+                config.set_value("user", "email", "test@example.com")
+            repo_root = Path(repo.working_tree_dir)
+            (repo_root / "lesson.ipynb").write_text("1")
+            repo.git.add(".")
+            repo.git.commit("-m", "Initial commit")
+            repo.git.branch("teaching")
+
+            try:
+                os.chdir(repo_root)
+                for worktree in (False, True):
+                    with self.subTest(worktree=worktree):
+                        copy_path = Path(tmp_dir) / f"teaching-{worktree}"
+                        copy_path.mkdir()
+                        (copy_path / "leftover.txt").write_text("x")
+
+                        copy = process_repo.setup_teaching_copy(copy_path.name, worktree=worktree)
+                        self.assertEqual((copy_path / "lesson.ipynb").read_text(),
+                                         repo.git.show("teaching:lesson.ipynb"))
+                        self.assertFalse((copy_path / "leftover.txt").exists())
+
+                        # Refreshing discards local changes and picks up new commits of teaching
+                        (copy_path / "lesson.ipynb").write_text("changed")
+                        (copy_path / "output.txt").write_text("x")
+                        repo.git.checkout("teaching")
+                        (repo_root / "lesson.ipynb").write_text(f"2 {worktree}")
+                        repo.git.commit("-am", "Update teaching")
+                        repo.git.checkout("dev")
+
+                        refreshed = process_repo.setup_teaching_copy(copy_path.name, worktree=worktree)
+                        self.assertEqual(refreshed.git_dir, copy.git_dir)
+                        self.assertEqual((copy_path / "lesson.ipynb").read_text(), f"2 {worktree}")
+                        self.assertFalse((copy_path / "output.txt").exists())
+                        self.assertEqual(os.getcwd(), str(repo_root))
+            finally:
+                os.chdir(cwd)
+
 
 if __name__ == '__main__':
     unittest.main()
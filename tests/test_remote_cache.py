@@ -0,0 +1,82 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from workshop_git_tools.build_cache import BuildCache
+from workshop_git_tools.remote_cache import DirectoryStore, HttpStore, create_remote_store, create_server
+
+
+class Test_Remote_Cache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.config_path = self.root / ".nbtoolbelt.json"
+        self.config_path.write_text('{"nbpunch": {"tags": ["solution"]}}')
+        self.environment_path = self.root / "environment.yml"
+        self.environment_path.write_text("dependencies:\n  - python=3.11\n")
+        self.source_path = self.root / "notebook.md"
+        self.source_path.write_text("# Title\n")
+        self.artifact_path = self.root / "artifact.ipynb"
+        self.artifact_path.write_text('{"cells": []}')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_cache(self, name, remote):
+        return BuildCache(self.root / name, self.config_path, self.environment_path, remote)
+
+    def share_artifact(self, remote):
+        """Store an artifact in one local cache and return it from another one with the same remote."""
+        cache = self.make_cache("first", remote)
+        key = cache.key(self.source_path, "solution-run", "inputs")
+        cache.store(key, self.artifact_path)
+
+        other_cache = self.make_cache("second", remote)
+        other_key = other_cache.key(self.source_path, "solution-run", "inputs")
+        self.assertEqual(key, other_key)
+        self.assertNotIn(other_key, other_cache)
+        self.assertEqual(other_cache.pull([other_key, "0" * 64]), 1)
+        self.assertIn(other_key, other_cache)
+        self.assertEqual(other_cache.pull([other_key]), 0)
+
+        destination_path = self.root / "notebook.ipynb"
+        self.assertTrue(other_cache.fetch(other_key, destination_path))
+        return destination_path.read_text()
+
+    def test_directory_store(self):
+        remote = create_remote_store(str(self.root / "shared"))
+        self.assertIsInstance(remote, DirectoryStore)
+        self.assertEqual(self.share_artifact(remote), '{"cells": []}')
+
+    def test_http_store(self):
+        server = create_server(self.root / "served")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            remote = create_remote_store(f"http://127.0.0.1:{server.server_port}")
+            self.assertIsInstance(remote, HttpStore)
+            self.assertEqual(self.share_artifact(remote), '{"cells": []}')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unreachable_remote(self):
+        cache = self.make_cache("local", HttpStore("http://127.0.0.1:1", timeout=1))
+        key = cache.key(self.source_path, "teaching")
+        self.assertEqual(cache.pull([key]), 0)
+        self.assertIsNone(cache.remote)
+
+        cache.store(key, self.artifact_path)
+        self.assertIn(key, cache)
+
+    def test_key_depends_on_environment(self):
+        cache = self.make_cache("local", None)
+        key = cache.key(self.source_path, "solution-run")
+        self.environment_path.write_text("dependencies:\n  - python=3.12\n")
+        self.assertNotEqual(key, self.make_cache("local", None).key(self.source_path, "solution-run"))
+
+
+if __name__ == '__main__':
+    unittest.main()
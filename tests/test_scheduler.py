@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from workshop_git_tools.scheduler import RuntimeHistory, balance, parse_shard, run_scheduled, shard_items
+
+
+class Test_Scheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.history_path = Path(self.tmp_dir.name) / "runtime_history.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_history_estimates(self):
+        history = RuntimeHistory(self.history_path)
+        self.assertEqual(history.estimate("run", "a.ipynb"), 0.0)
+
+        history.record("run", "a.ipynb", 10.0)
+        history.record("run", "b.ipynb", 2.0)
+        history.record("run", "b.ipynb", 4.0)
+        history.save()
+
+        history = RuntimeHistory(self.history_path)
+        self.assertEqual(history.estimate("run", "a.ipynb"), 10.0)
+        self.assertEqual(history.estimate("run", "b.ipynb"), 3.0)
+        self.assertEqual(history.estimate("run", "c.ipynb"), 6.5)
+        self.assertEqual(history.estimate("convert", "a.md"), 0.0)
+
+    def test_balanced_shards(self):
+        estimates = {"a": 8.0, "b": 5.0, "c": 4.0, "d": 3.0, "e": 1.0}
+        self.assertEqual(balance(estimates, estimates, 2), [["a", "d"], ["b", "c", "e"]])
+
+        shards = [shard_items(estimates, estimates, *parse_shard(f"{i}/3")) for i in range(1, 4)]
+        self.assertEqual(sorted(item for shard in shards for item in shard), sorted(estimates))
+
+        for shard in ("0/2", "3/2", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+    def test_run_scheduled_longest_first(self):
+        history = RuntimeHistory(self.history_path)
+        history.record("run", "short", 1.0)
+        history.record("run", "long", 9.0)
+
+        started = []
+        results = run_scheduled(func=lambda item: started.append(item) or item.upper(),
+                                args_list=[("short",), ("long",)], items=["short", "long"],
+                                kind="run", history=history, n_workers=1)
+
+        self.assertEqual(results, ["SHORT", "LONG"])
+        self.assertEqual(started, ["long", "short"])
+        self.assertLess(history.estimate("run", "long"), 9.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
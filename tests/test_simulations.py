@@ -0,0 +1,100 @@
+import asyncio
+import importlib.util
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+RESOURCES_DIR = Path(__file__).resolve().parents[1] / ".bts" / "resources"
+
+
+def load_resource(name):
+    """Load a module of the Gui resources without the package, which imports the widgets."""
+    spec = importlib.util.spec_from_file_location(name, RESOURCES_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+simulations = load_resource("simulations")
+
+
+def make_values(n_values):
+    return {"outlet": np.zeros(n_values), "times": np.zeros(1)}
+
+
+class Test_Simulations(unittest.TestCase):
+
+    def test_cache_evicts_least_recently_used(self):
+        # Every entry takes 10 * 8 + 8 bytes
+        cache = simulations.SimulationCache(max_bytes=3 * 88)
+        for key in "abc":
+            cache.put(key, make_values(10))
+        self.assertEqual((len(cache), cache.n_bytes), (3, 3 * 88))
+
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("d", make_values(10))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([key for key in "acd" if cache.get(key) is not None], ["a", "c", "d"])
+
+        # A larger entry evicts as many entries as needed
+        cache.put("e", make_values(20))
+        self.assertEqual([key for key in "acde" if cache.get(key) is not None], ["d", "e"])
+        self.assertEqual(cache.n_bytes, 88 + 168)
+
+    def test_cache_replaces_and_skips_oversize_entries(self):
+        cache = simulations.SimulationCache(max_bytes=200)
+        cache.put("a", make_values(10))
+        cache.put("a", make_values(20))
+        self.assertEqual((len(cache), cache.n_bytes), (1, 168))
+
+        cache.put("b", make_values(100))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.n_bytes), (0, 0))
+
+    def test_simulation_key_quantizes_parameters(self):
+        key = simulations.simulation_key(1, False, [0.37, 1e-5, 2e-8])
+        self.assertEqual(key, (1, False, 0.37, 1e-5, 2e-8))
+        # Slider positions that only differ by floating point noise share a key
+        self.assertEqual(simulations.simulation_key(1, False, [0.1 + 0.2 + 0.07, 10 ** -5, 2e-8 * (1 + 1e-12)]), key)
+        self.assertNotEqual(simulations.simulation_key(1, False, [0.371, 1e-5, 2e-8]), key)
+        self.assertNotEqual(simulations.simulation_key(1, True, [0.37, 1e-5, 2e-8]), key)
+        self.assertEqual(simulations.quantize(123456789), 123457000.0)
+
+
+class Test_Simulation_Manager(unittest.TestCase):
+
+    def test_latest_run_starts_after_all_superseded_ones(self):
+        events = []
+
+        async def simulate(name):
+            events.append(f"start {name}")
+            try:
+                await asyncio.sleep(0.2)
+            except asyncio.CancelledError:
+                # Like run_cadet, killing the process takes a while
+                await asyncio.sleep(0.1)
+                events.append(f"killed {name}")
+                raise
+            events.append(f"done {name}")
+
+        async def submit_runs():
+            manager = simulations.SimulationManager()
+            manager.submit(simulate, "a")
+            await asyncio.sleep(0.05)
+            # b only waits for a when it is superseded by c
+            manager.submit(simulate, "b")
+            await asyncio.sleep(0.01)
+            latest = manager.submit(simulate, "c")
+            await latest
+            self.assertFalse(manager.busy)
+
+        asyncio.run(submit_runs())
+        self.assertEqual(events, ["start a", "killed a", "start c", "done c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import git
+import jupytext
+import nbformat
+
+from workshop_git_tools.staging import commit_changes, git_blob_sha, normalize_cell_ids, normalize_execution
+
+
+class Test_Staging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.repo = git.Repo.init(self.root, initial_branch="dev")
+        with self.repo.config_writer() as config:
+            config.set_value("user", "name", "test")
+            config.set_value("user", "email", "test@example.com")
+        (self.root / "lesson.md").write_text("# Lesson\n")
+        (self.root / "data.csv").write_text("1,2\n")
+        self.repo.git.add(".")
+        self.repo.git.commit("-m", "Initial commit")
+        self.repo.git.checkout("-b", "solution")
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmp_dir.cleanup()
+
+    def build(self, content):
+        self.repo.git.restore("--source", "dev", ".")
+        (self.root / "lesson.md").unlink()
+        (self.root / "lesson.ipynb").write_text(content)
+        return commit_changes(self.repo, "dev", ["lesson.ipynb"], ["lesson.md"], message="Update solution")
+
+    def test_commit_changes(self):
+        self.assertEqual(self.build("{}\n"), ["lesson.ipynb", "lesson.md"])
+        head = self.repo.head.commit
+        self.assertEqual(head.message, "Update solution")
+        self.assertEqual(sorted(blob.path for blob in head.tree.traverse()), ["data.csv", "lesson.ipynb"])
+        self.assertEqual(head.tree["lesson.ipynb"].hexsha, git_blob_sha(b"{}\n"))
+
+        # Unchanged content is not committed again
+        self.assertEqual(self.build("{}\n"), [])
+        self.assertEqual(self.repo.head.commit, head)
+
+        # Changes of the source branch are taken over without touching the built files
+        self.repo.git.checkout("dev")
+        (self.root / "data.csv").write_text("3,4\n")
+        self.repo.git.commit("-am", "Change data")
+        self.repo.git.checkout("solution")
+        self.assertEqual(self.build("{}\n"), ["data.csv"])
+        self.assertEqual(self.repo.head.commit.parents, (head,))
+        self.assertEqual(self.repo.git.status("--porcelain"), "")
+
+    def test_normalize_execution(self):
+        notebook = nbformat.v4.new_notebook()
+        cell = nbformat.v4.new_code_cell("x", execution_count=7, outputs=[
+            nbformat.v4.new_output("execute_result", {"text/plain": "1"}, execution_count=7)])
+        cell.metadata["execution"] = {"iopub.status.idle": "2024-01-01T00:00:00Z"}
+        cell.metadata["tags"] = ["solution"]
+        notebook.cells = [nbformat.v4.new_code_cell("y"), cell]
+
+        normalize_execution(notebook)
+        self.assertIsNone(notebook.cells[0].execution_count)
+        self.assertEqual(cell.execution_count, 1)
+        self.assertEqual(cell.outputs[0].execution_count, 1)
+        self.assertEqual(cell.metadata, {"tags": ["solution"]})
+
+    def test_normalize_cell_ids(self):
+        text = "# Title\n\n```python\nx = 1\n```\n\n```python\nx = 1\n```\n"
+        first = normalize_cell_ids(jupytext.reads(text, fmt="md"))
+        second = normalize_cell_ids(jupytext.reads(text, fmt="md"))
+        ids = [cell.id for cell in first.cells]
+        self.assertEqual(ids, [cell.id for cell in second.cells])
+        self.assertEqual(len(set(ids)), 3)
+        nbformat.validate(first)
+
+
+if __name__ == '__main__':
+    unittest.main()
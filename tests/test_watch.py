@@ -0,0 +1,106 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import git
+import nbformat
+
+from workshop_git_tools.kernel_pool import KernelPool
+from workshop_git_tools.watch import InotifyWatcher, PollingWatcher, PreviewBuilder, collect_changes
+
+
+MYST_NOTEBOOK = """---
+jupytext:
+  text_representation:
+    extension: .md
+    format_name: myst
+kernelspec:
+  display_name: Python 3
+  language: python
+  name: python3
+---
+
+# {title}
+
+```{{code-cell}} ipython3
+{code}
+```
+"""
+
+
+class Test_Watch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name).resolve()
+        self.repo = git.Repo.init(self.root, initial_branch="dev")
+        (self.root / ".nbtoolbelt.json").write_text('{"nbpunch": {"tags": ["solution"]}}')
+        (self.root / "data").mkdir()
+        (self.root / "data" / "values.csv").write_text("1,2\n")
+        (self.root / "reader.md").write_text(
+            MYST_NOTEBOOK.format(title="Reader", code='values = open("data/values.csv").read()'))
+        (self.root / "other.md").write_text(MYST_NOTEBOOK.format(title="Other", code="x = 1"))
+        self.repo.git.add(".")
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmp_dir.cleanup()
+
+    def modify_later(self, path, text, delay=0.1):
+        timer = threading.Timer(delay, path.write_text, (text,))
+        timer.start()
+        return timer
+
+    def check_watcher(self, watcher):
+        values = self.root / "data" / "values.csv"
+        try:
+            self.assertEqual(watcher.wait(timeout=0.05), set())
+            self.modify_later(values, "3,4\n")
+            timer = self.modify_later(values, "5,6,7\n", delay=0.25)
+            self.assertEqual(collect_changes(watcher, debounce=0.6, timeout=5), {values})
+            timer.join()
+            self.assertEqual(watcher.wait(timeout=0.05), set())
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self):
+        self.check_watcher(PollingWatcher([self.root / "data" / "values.csv", self.root / "other.md"],
+                                          interval=0.02))
+
+    def test_inotify_watcher(self):
+        try:
+            watcher = InotifyWatcher([self.root / "data" / "values.csv", self.root / "other.md"])
+        except (OSError, AttributeError):
+            self.skipTest("inotify is not available")
+        self.check_watcher(watcher)
+
+    def test_preview_builder(self):
+        preview_dir = self.root / "_preview"
+        builder = PreviewBuilder(self.root, preview_dir)
+        self.assertEqual(len(builder.build(sorted(builder.notebook_sources.values()))), 2)
+        self.assertTrue((preview_dir / "teaching" / "reader.ipynb").exists())
+
+        (self.root / "other.md").write_text(MYST_NOTEBOOK.format(title="Other", code="x = 2"))
+        self.assertEqual(builder.update([self.root / "other.md"]), [preview_dir / "solution" / "other.ipynb"])
+        notebook = nbformat.read(preview_dir / "solution" / "other.ipynb", as_version=4)
+        self.assertEqual(notebook.cells[-1].source, "x = 2")
+
+        self.assertEqual(builder.update([self.root / "data" / "values.csv"]),
+                         [preview_dir / "solution" / "reader.ipynb"])
+
+    def test_previews_run_concurrently(self):
+        code = 'import time\nopen("executed.txt", "a").write("s")\ntime.sleep(2)\nopen("executed.txt", "a").write("e")'
+        for name in ("reader", "other"):
+            (self.root / f"{name}.md").write_text(MYST_NOTEBOOK.format(title=name, code=code))
+
+        with KernelPool(n_kernels=2, warmup_modules=()) as pool:
+            builder = PreviewBuilder(self.root, self.root / "_preview", kernel_pool=pool)
+            builder.build(sorted(builder.notebook_sources.values()))
+
+        # Both previews started before either of them finished
+        self.assertEqual((self.root / "executed.txt").read_text(), "ssee")
+
+
+if __name__ == '__main__':
+    unittest.main()
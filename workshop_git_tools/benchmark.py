@@ -0,0 +1,298 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import git
+
+if __package__ in (None, ""):
+    # Allow running this file as a script (``python workshop_git_tools/benchmark.py``)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from workshop_git_tools.executors import BACKENDS, make_backend
+from workshop_git_tools.process_repo import create_branches
+
+
+MYST_HEADER = """---
+jupytext:
+  text_representation:
+    extension: .md
+    format_name: myst
+    format_version: 0.13
+    jupytext_version: 1.14.5
+kernelspec:
+  display_name: Python 3
+  language: python
+  name: python3
+---
+"""
+
+NBTOOLBELT_CONFIG = {"nbpunch": {"tags": ["solution"], "punch_punched_result_name": ""},
+                     "nbrun": {"run_result_name": ""}}
+
+
+def synthetic_notebook(notebook_index, n_cells=20, cell_lines=5, tag_density=0.3, rng=None):
+    """Create the MyST text of a synthetic workshop notebook.
+
+    Markdown and code cells alternate. Code cells are tagged as solution with probability
+    tag_density and only do cheap arithmetic, so executing them is fast.
+
+    Parameters
+    ----------
+    notebook_index : int
+        Number of the notebook, used in titles and variable names.
+    n_cells : int, optional
+        Number of cells.
+    cell_lines : int, optional
+        Number of lines per cell.
+    tag_density : float, optional
+        Fraction of code cells tagged as solution.
+    rng : random.Random, optional
+        Random number generator for the tags.
+
+    Returns
+    -------
+    str
+    """
+    rng = rng or random.Random(0)
+    parts = [MYST_HEADER, f"# Notebook {notebook_index}\n"]
+    for cell_index in range(n_cells):
+        if cell_index % 2 == 0:
+            lines = [f"Explanation {line} of step {cell_index} in notebook {notebook_index}."
+                     for line in range(cell_lines)]
+            parts.append("\n".join(lines) + "\n")
+            continue
+        lines = [f"x_{cell_index}_{line} = {notebook_index} * {line} + {cell_index}" for line in range(cell_lines - 1)]
+        lines.append(f"print(x_{cell_index}_0)")
+        tags = ":tags: [solution]\n\n" if rng.random() < tag_density else ""
+        parts.append("```{code-cell} ipython3\n" + tags + "\n".join(lines) + "\n```\n")
+    return "\n".join(parts)
+
+
+def create_synthetic_workshop(repo_dir, n_notebooks=20, n_cells=20, cell_lines=5, tag_density=0.3, seed=0,
+                              notebooks_per_chapter=5):
+    """Create a git repository that looks like a workshop, with dev, solution and teaching branches.
+
+    Parameters
+    ----------
+    repo_dir : str | Path
+        Directory to create the repository in. Must not exist or be empty.
+    n_notebooks : int, optional
+        Number of MyST notebooks.
+    n_cells : int, optional
+        Number of cells per notebook.
+    cell_lines : int, optional
+        Number of lines per cell.
+    tag_density : float, optional
+        Fraction of code cells tagged as solution.
+    seed : int, optional
+        Seed for the tags, so the same parameters create the same repository.
+    notebooks_per_chapter : int, optional
+        Number of notebooks per chapter directory.
+
+    Returns
+    -------
+    git.Repo
+    """
+    repo_dir = Path(repo_dir)
+    repo_dir.mkdir(parents=True, exist_ok=True)
+    repo = git.Repo.init(repo_dir, initial_branch="dev")
+    with repo.config_writer() as config:
+        config.set_value("user", "name", "benchmark")
+        config.set_value("user", "email", "benchmark@example.com")
+
+    (repo_dir / "README.md").write_text("# Synthetic workshop\n", encoding="utf-8")
+    (repo_dir / ".nbtoolbelt.json").write_text(json.dumps(NBTOOLBELT_CONFIG, indent=1), encoding="utf-8")
+    rng = random.Random(seed)
+    for notebook_index in range(n_notebooks):
+        chapter_dir = repo_dir / f"{notebook_index // notebooks_per_chapter:02d} Chapter"
+        chapter_dir.mkdir(exist_ok=True)
+        (chapter_dir / f"{notebook_index:03d}_notebook.md").write_text(
+            synthetic_notebook(notebook_index, n_cells, cell_lines, tag_density, rng), encoding="utf-8")
+
+    repo.git.add(".")
+    repo.git.commit("-m", "Create synthetic workshop")
+    repo.git.branch("solution")
+    repo.git.branch("teaching")
+    return repo
+
+
+def tool_revision():
+    """Return the commit of workshop_git_tools the benchmark runs, with a marker for local changes.
+
+    Returns
+    -------
+    str
+    """
+    try:
+        repo = git.Repo(Path(__file__).resolve().parent, search_parent_directories=True)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+        return "unknown"
+    revision = repo.head.commit.hexsha[:12]
+    if repo.is_dirty(path=Path(__file__).resolve().parent):
+        revision += "-dirty"
+    return revision
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous_dir = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous_dir)
+
+
+def run_benchmark(repo, backend_name, n_cores=2, run=False, repeat=1):
+    """Build the solution and teaching branches of a synthetic workshop with one backend.
+
+    Before every repetition the branches are reset, so every repetition converts, punches,
+    (optionally) executes and commits all notebooks. The build cache is disabled.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        Repository created by ``create_synthetic_workshop``.
+    backend_name : str
+        One of the keys of ``BACKENDS``.
+    n_cores : int, optional
+        Number of cores used by the backend and for running notebooks.
+    run : bool, optional
+        Also execute the solution notebooks.
+    repeat : int, optional
+        Number of repetitions.
+
+    Returns
+    -------
+    dict
+        Median wall time, throughput in notebooks per second and stage totals of the median run.
+    """
+    repo_dir = Path(repo.working_tree_dir)
+    base_commit = repo.commit("dev").hexsha
+    n_notebooks = len(list(repo_dir.glob("*/*.md")))
+
+    runs = []
+    for _ in range(repeat):
+        for branch in ("solution", "teaching"):
+            repo.git.branch("-f", branch, base_commit)
+        with tempfile.TemporaryDirectory() as tmp_dir, working_directory(repo_dir):
+            report_path = Path(tmp_dir) / "report.json"
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                create_branches(run=run, commit=True, n_cores=n_cores, use_cache=False,
+                                backend=make_backend(backend_name, n_cores), report_path=report_path)
+            wall_seconds = time.perf_counter() - start
+            runs.append((wall_seconds, json.loads(report_path.read_text())["stages"]))
+
+    runs.sort(key=lambda wall_and_stages: wall_and_stages[0])
+    wall_seconds = statistics.median(wall for wall, _ in runs)
+    stages = runs[len(runs) // 2][1]
+    return {
+        "backend": backend_name,
+        "wall_seconds": round(wall_seconds, 4),
+        "min_wall_seconds": round(runs[0][0], 4),
+        "notebooks_per_second": round(n_notebooks / wall_seconds, 3),
+        "stages": {stage: round(total["wall_seconds"], 4) for stage, total in stages.items()},
+    }
+
+
+def compare_results(result, previous_results, threshold=1.2):
+    """Compare a benchmark result with the latest earlier result of the same configuration.
+
+    Parameters
+    ----------
+    result : dict
+        Result of the current commit, as written by ``main``.
+    previous_results : list of dict
+        Earlier results.
+    threshold : float, optional
+        Slow-down factor above which a backend is reported as regression.
+
+    Returns
+    -------
+    list of str
+        One line per backend.
+    """
+    earlier = [previous for previous in previous_results if previous["config"] == result["config"]]
+    if not earlier:
+        return ["No earlier result with the same configuration."]
+    reference = earlier[-1]
+    reference_backends = {entry["backend"]: entry for entry in reference["backends"]}
+
+    lines = []
+    for entry in result["backends"]:
+        if entry["backend"] not in reference_backends:
+            continue
+        ratio = entry["wall_seconds"] / reference_backends[entry["backend"]]["wall_seconds"]
+        status = "REGRESSION" if ratio > threshold else "ok"
+        lines.append(f"{entry['backend']:<12} {ratio:6.2f}x vs {reference['revision']}  {status}")
+    return lines
+
+
+def main(argv=None):
+    """Benchmark the branch generation pipeline on a synthetic workshop.
+
+    Results are appended to a json lines file, together with the revision of the tools and the
+    machine, and compared with the latest earlier result of the same configuration.
+
+    Returns
+    -------
+    None
+    """
+    parser = argparse.ArgumentParser(description='Benchmark create_branches on a synthetic workshop.')
+    parser.add_argument('--notebooks', type=int, default=20, help='Number of notebooks.')
+    parser.add_argument('--cells', type=int, default=20, help='Number of cells per notebook.')
+    parser.add_argument('--cell_lines', type=int, default=5, help='Number of lines per cell.')
+    parser.add_argument('--tag_density', type=float, default=0.3, help='Fraction of code cells tagged solution.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the solution tags.')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS),
+                        help='Backends to benchmark.')
+    parser.add_argument('--n_cores', type=int, default=2, help='Number of cores to use.')
+    parser.add_argument('--run', action='store_true', help='Also execute the solution notebooks.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per backend, the median is kept.')
+    parser.add_argument('--output', default='benchmark_results.jsonl', help='File to append the results to.')
+    args = parser.parse_args(argv)
+
+    config = {"notebooks": args.notebooks, "cells": args.cells, "cell_lines": args.cell_lines,
+              "tag_density": args.tag_density, "seed": args.seed, "n_cores": args.n_cores, "run": args.run}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = create_synthetic_workshop(Path(tmp_dir) / "workshop", args.notebooks, args.cells, args.cell_lines,
+                                         args.tag_density, args.seed)
+        backends = []
+        for backend_name in args.backends:
+            backends.append(run_benchmark(repo, backend_name, args.n_cores, args.run, args.repeat))
+            print(f"{backend_name:<12} {backends[-1]['wall_seconds']:8.2f} s "
+                  f"{backends[-1]['notebooks_per_second']:8.2f} notebooks/s")
+        repo.close()
+
+    result = {
+        "revision": tool_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpu_count": os.cpu_count()},
+        "config": config,
+        "backends": backends,
+    }
+
+    output_path = Path(args.output)
+    previous_results = []
+    if output_path.exists():
+        previous_results = [json.loads(line) for line in output_path.read_text().splitlines() if line.strip()]
+    for line in compare_results(result, previous_results):
+        print(line)
+    with open(output_path, "a", encoding="utf-8") as file_handle:
+        file_handle.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
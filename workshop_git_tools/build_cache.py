@@ -0,0 +1,251 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+from pathlib import Path
+
+
+TOOL_PACKAGES = ("jupytext", "nbtoolbelt")
+
+# Number of artifacts that are downloaded from a remote cache at the same time
+REMOTE_THREADS = 8
+
+
+def tool_versions(packages=TOOL_PACKAGES):
+    """Return the installed versions of the tools that produce build artifacts.
+
+    Parameters
+    ----------
+    packages : iterable of str, optional
+        Distribution names to look up.
+
+    Returns
+    -------
+    dict
+        Mapping of package name to version string ("missing" if not installed).
+    """
+    versions = {}
+    for package in packages:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = "missing"
+    return versions
+
+
+def hash_file(file_path, hasher=None):
+    """Return the sha256 hexdigest of a file's content.
+
+    Parameters
+    ----------
+    file_path : str | Path
+        Path to the file to hash.
+    hasher : hashlib hash object, optional
+        Existing hash object to update instead of creating a new one.
+
+    Returns
+    -------
+    str
+        Hexdigest of the hash.
+    """
+    if hasher is None:
+        hasher = hashlib.sha256()
+    with open(file_path, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(1 << 16), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class BuildCache:
+    """Persistent, content-addressed cache of notebook build artifacts.
+
+    Artifacts are stored under a key that combines the source file content, the build variant
+    (e.g. ``solution``, ``solution-run`` or ``teaching``), the versions of jupytext and nbtoolbelt
+    and the content of the ``.nbtoolbelt.json`` config, and for executed notebooks the content of
+    the files they read, and the content of the ``environment.yml`` the notebooks are executed
+    in. Any change to one of these invalidates the cached artifact.
+
+    Keys only depend on file contents, not on paths or machines, so artifacts can be shared.
+    With a remote tier, e.g. a shared directory or an HTTP store (see ``remote_cache``),
+    artifacts missing locally are pulled from it and new artifacts are pushed to it. A remote
+    that cannot be reached is reported once and then ignored, the build continues locally.
+
+    Parameters
+    ----------
+    cache_dir : str | Path
+        Directory in which the artifacts are stored. Created if it does not exist.
+    nbtoolbelt_config_path : str | Path, optional
+        Path to the .nbtoolbelt.json config file that influences punching and execution.
+    environment_file_path : str | Path, optional
+        Path to the conda environment file the notebooks are executed in.
+    remote : DirectoryStore | HttpStore, optional
+        Remote tier shared with other developers and CI jobs.
+    """
+
+    def __init__(self, cache_dir, nbtoolbelt_config_path=None, environment_file_path=None, remote=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.environment_hash = self._hash_environment(nbtoolbelt_config_path, environment_file_path)
+        self.remote = remote
+
+    @classmethod
+    def for_repo(cls, repo, remote=None):
+        """Create the cache for a repository.
+
+        The cache lives in the common git directory, so it is ignored by git, survives branch
+        switches and ``git clean``, and is shared by all worktrees of the repository.
+
+        Parameters
+        ----------
+        repo : git.Repo
+            GitPython Repo object.
+        remote : DirectoryStore | HttpStore, optional
+            Remote tier, see ``remote_cache.create_remote_store``.
+
+        Returns
+        -------
+        BuildCache
+        """
+        repo_root = Path(repo.working_tree_dir)
+        return cls(Path(repo.common_dir) / "workshop_cache", repo_root / ".nbtoolbelt.json",
+                   repo_root / "environment.yml", remote)
+
+    @staticmethod
+    def _hash_environment(nbtoolbelt_config_path, environment_file_path=None):
+        hasher = hashlib.sha256()
+        for package, version in sorted(tool_versions().items()):
+            hasher.update(f"{package}=={version}\n".encode())
+        for config_path in (nbtoolbelt_config_path, environment_file_path):
+            if config_path is not None and os.path.exists(config_path):
+                hash_file(config_path, hasher)
+        return hasher.hexdigest()
+
+    def _remote_failed(self, error):
+        print(f"Remote cache {self.remote!r} is not available, continuing without it: {error}")
+        self.remote = None
+
+    def key(self, source_path, variant, inputs_digest=None):
+        """Compute the cache key of a source file for a build variant.
+
+        Parameters
+        ----------
+        source_path : str | Path
+            Path to the source (MyST) file.
+        variant : str
+            Name of the build variant, e.g. "solution", "solution-run" or "teaching".
+        inputs_digest : str, optional
+            Digest of the files the notebook reads when executed, see
+            ``DependencyGraph.inputs_digest``.
+
+        Returns
+        -------
+        str
+            Hexdigest identifying the artifact.
+        """
+        hasher = hashlib.sha256()
+        hasher.update(f"{variant}\n{self.environment_hash}\n".encode())
+        if inputs_digest is not None:
+            hasher.update(f"{inputs_digest}\n".encode())
+        return hash_file(source_path, hasher)
+
+    def _artifact_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.ipynb"
+
+    def __contains__(self, key):
+        return self._artifact_path(key).exists()
+
+    def pull(self, keys):
+        """Download the artifacts of keys that are missing locally from the remote tier.
+
+        Parameters
+        ----------
+        keys : iterable of str
+            Cache keys as returned by ``key``.
+
+        Returns
+        -------
+        int
+            Number of artifacts downloaded.
+        """
+        remote = self.remote
+        missing = sorted({key for key in keys if key not in self})
+        if remote is None or not missing:
+            return 0
+
+        def pull_artifact(key):
+            return remote.fetch(key, self._artifact_path(key))
+
+        try:
+            with ThreadPoolExecutor(max_workers=REMOTE_THREADS) as executor:
+                return sum(executor.map(pull_artifact, missing))
+        except OSError as error:
+            self._remote_failed(error)
+            return sum(key in self for key in missing)
+
+    def fetch(self, key, destination_path):
+        """Copy a cached artifact to destination_path.
+
+        Parameters
+        ----------
+        key : str
+            Cache key as returned by ``key``.
+        destination_path : str | Path
+            Path to write the artifact to.
+
+        Returns
+        -------
+        bool
+            True if the artifact was found and copied, False otherwise.
+        """
+        artifact_path = self._artifact_path(key)
+        if not artifact_path.exists():
+            return False
+        shutil.copyfile(artifact_path, destination_path)
+        return True
+
+    def store(self, key, artifact_path):
+        """Store a build artifact under key.
+
+        The file is written to a temporary file first and then moved into place, so concurrent
+        workers never observe a partially written artifact. It is pushed to the remote tier too.
+
+        Parameters
+        ----------
+        key : str
+            Cache key as returned by ``key``.
+        artifact_path : str | Path
+            Path to the artifact to store.
+
+        Returns
+        -------
+        None
+        """
+        target_path = self._artifact_path(key)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=target_path.parent, suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            shutil.copyfile(artifact_path, tmp_path)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        remote = self.remote
+        if remote is not None:
+            try:
+                remote.store(key, target_path)
+            except OSError as error:
+                self._remote_failed(error)
+
+    def clear(self):
+        """Remove all cached artifacts.
+
+        Returns
+        -------
+        None
+        """
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+# Executed in the kernel after a cell to store the user namespace. A snapshot is only kept if
+# every variable can be pickled, otherwise resuming from it would silently lose state. Pickling
+# is aborted as soon as the snapshot grows beyond max_bytes.
+SNAPSHOT_CODE = """
+class _CappedFile:
+    def __init__(self, file_handle, max_bytes):
+        self.file_handle = file_handle
+        self.n_bytes_left = max_bytes
+
+    def write(self, data):
+        self.n_bytes_left -= len(data)
+        if self.n_bytes_left < 0:
+            raise OverflowError("namespace snapshot too large")
+        return self.file_handle.write(data)
+
+try:
+    import dill as _dill
+    _ip = get_ipython()
+    _ns = {{_k: _v for _k, _v in _ip.user_ns.items() if _k not in _ip.user_ns_hidden and not _k.startswith("_")}}
+    with open({path!r}, "wb") as _f:
+        _dill.dump(_ns, _CappedFile(_f, {max_bytes}))
+except Exception:
+    import os as _os
+    if _os.path.exists({path!r}):
+        _os.remove({path!r})
+finally:
+    _ns = None
+"""
+
+RESTORE_CODE = """
+import dill as _dill
+with open({path!r}, "rb") as _f:
+    get_ipython().user_ns.update(_dill.load(_f))
+get_ipython().execution_count = {execution_count}
+"""
+
+
+def cell_chain_keys(notebook, root_key):
+    """Compute the chain of cache keys of the code cells of a notebook.
+
+    The key of a code cell hashes the key of the previous code cell and the cell's own source,
+    so it identifies the cell together with everything executed before it.
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Notebook to compute the keys for.
+    root_key : str
+        Key of the (empty) state before the first cell, e.g. identifying the environment.
+
+    Returns
+    -------
+    list of (int, str)
+        Index in notebook.cells and key of every code cell.
+    """
+    keys = []
+    key = root_key
+    for index, cell in enumerate(notebook.cells):
+        if cell.cell_type != "code":
+            continue
+        key = hashlib.sha256(f"{key}\n{cell.source}".encode()).hexdigest()
+        keys.append((index, key))
+    return keys
+
+
+class CellCache:
+    """Cache of cell outputs and kernel namespace snapshots, keyed on chains of cell sources.
+
+    For every executed code cell the outputs are stored, and, if the namespace can be pickled
+    with dill, a snapshot of the user namespace after the cell. When a notebook is executed
+    again, the outputs of the longest unchanged prefix are restored and execution resumes after
+    the last snapshot within that prefix.
+
+    Only the user namespace is restored, side effects of earlier cells such as files written
+    to disk are not. Snapshots are therefore only used for cells whose prefix is unchanged.
+
+    Pickling the namespace after every cell can take longer than the cells themselves, so
+    snapshots can be limited to every snapshot_every-th code cell and to namespaces that pickle
+    to at most snapshot_max_mb. Without a snapshot, more cells are executed again on resume.
+
+    Parameters
+    ----------
+    cache_dir : str | Path
+        Directory in which outputs and snapshots are stored. Created if it does not exist.
+    snapshot_every : int, optional
+        Take a snapshot after every snapshot_every-th code cell. 0 disables snapshots.
+    snapshot_max_mb : float, optional
+        Maximum size of a snapshot in MB. Larger namespaces are not snapshotted.
+    """
+
+    def __init__(self, cache_dir, snapshot_every=1, snapshot_max_mb=256):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        self.snapshot_max_mb = snapshot_max_mb
+
+    @classmethod
+    def for_repo(cls, repo, **kwargs):
+        """Create the cell cache for a repository, next to the build cache.
+
+        Parameters
+        ----------
+        repo : git.Repo
+            GitPython Repo object.
+        **kwargs
+            Snapshot limits, see CellCache.
+
+        Returns
+        -------
+        CellCache
+        """
+        return cls(Path(repo.common_dir) / "workshop_cache" / "cells", **kwargs)
+
+    def _path(self, key, suffix):
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def load_outputs(self, key):
+        """Load the stored outputs of a cell.
+
+        Parameters
+        ----------
+        key : str
+            Chain key of the cell.
+
+        Returns
+        -------
+        dict | None
+            Stored ``outputs``, ``execution_count`` and ``metadata``, or None if not cached.
+        """
+        path = self._path(key, ".json")
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as file_handle:
+            return json.load(file_handle)
+
+    def store_outputs(self, key, cell):
+        """Store the outputs of an executed cell.
+
+        Parameters
+        ----------
+        key : str
+            Chain key of the cell.
+        cell : nbformat.NotebookNode
+            Executed code cell.
+
+        Returns
+        -------
+        None
+        """
+        path = self._path(key, ".json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"outputs": cell.outputs, "execution_count": cell.execution_count, "metadata": cell.metadata}
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file_handle:
+            json.dump(entry, file_handle)
+        os.replace(tmp_path, path)
+
+    def snapshot_path(self, key):
+        """Return the path of the namespace snapshot after a cell.
+
+        Parameters
+        ----------
+        key : str
+            Chain key of the cell.
+
+        Returns
+        -------
+        Path
+        """
+        path = self._path(key, ".pkl")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def snapshot_code(self, key, position):
+        """Return the code that stores the namespace after a cell in the kernel.
+
+        Parameters
+        ----------
+        key : str
+            Chain key of the cell.
+        position : int
+            Position of the cell among the code cells of the notebook, starting at 0.
+
+        Returns
+        -------
+        str | None
+            Code to execute in the kernel, or None if no snapshot is taken after the cell.
+        """
+        if self.snapshot_every < 1 or (position + 1) % self.snapshot_every != 0:
+            return None
+        return SNAPSHOT_CODE.format(path=str(self.snapshot_path(key)),
+                                    max_bytes=int(self.snapshot_max_mb * 1024 ** 2))
+
+    def has_snapshot(self, key):
+        """Check whether a namespace snapshot exists after a cell.
+
+        Parameters
+        ----------
+        key : str
+            Chain key of the cell.
+
+        Returns
+        -------
+        bool
+        """
+        return self._path(key, ".pkl").exists()
+
+    def prune_snapshots(self, notebook_id, keys):
+        """Delete the snapshots of earlier runs of a notebook that are not part of keys.
+
+        Snapshots can be large, so only the ones of the latest run of every notebook are kept.
+        Outputs are small and kept for all runs.
+
+        Parameters
+        ----------
+        notebook_id : str
+            Identifier of the notebook, e.g. its path relative to the repo.
+        keys : list of str
+            Chain keys of the latest run.
+
+        Returns
+        -------
+        None
+        """
+        manifest_path = self.cache_dir / "manifests" / (hashlib.sha256(notebook_id.encode()).hexdigest() + ".json")
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        if manifest_path.exists():
+            with open(manifest_path, encoding="utf-8") as file_handle:
+                previous_keys = json.load(file_handle)
+            for key in set(previous_keys) - set(keys):
+                snapshot_path = self._path(key, ".pkl")
+                if snapshot_path.exists():
+                    os.remove(snapshot_path)
+        with open(manifest_path, "w", encoding="utf-8") as file_handle:
+            json.dump(list(keys), file_handle)
@@ -0,0 +1,266 @@
+import ast
+import hashlib
+import re
+from pathlib import Path
+
+import jupytext
+
+from workshop_git_tools.build_cache import hash_file
+
+
+# Fallback for code that can not be parsed, e.g. because of IPython syntax
+STRING_LITERAL = re.compile(r"""(['"])([^'"\n]+)\1""")
+
+
+def _strip_ipython_syntax(code):
+    """Blank out magics and shell escapes, which are not valid Python."""
+    lines = []
+    for line in code.splitlines():
+        stripped = line.lstrip()
+        lines.append("" if stripped.startswith(("%", "!", "?")) else line)
+    return "\n".join(lines)
+
+
+def scan_code(code):
+    """Find the string literals and imported modules of a piece of Python code.
+
+    Parameters
+    ----------
+    code : str
+        Python code, possibly containing IPython magics.
+
+    Returns
+    -------
+    strings : set of str
+        String literals, candidates for file paths.
+    imports : set of tuple
+        Imported modules as (level, module, names), with level > 0 for relative imports.
+    """
+    strings = set()
+    imports = set()
+    try:
+        tree = ast.parse(_strip_ipython_syntax(code))
+    except SyntaxError:
+        return {match.group(2) for match in STRING_LITERAL.finditer(code)}, imports
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.add(node.value)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.add((0, alias.name, ()))
+        elif isinstance(node, ast.ImportFrom):
+            imports.add((node.level, node.module or "", tuple(alias.name for alias in node.names)))
+    return strings, imports
+
+
+def read_code(file_path):
+    """Return the code of a notebook (all code cells) or Python module.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path to a MyST, ipynb or py file.
+
+    Returns
+    -------
+    str
+    """
+    if file_path.suffix == ".py":
+        return file_path.read_text(encoding="utf-8")
+    notebook = jupytext.read(file_path)
+    return "\n".join(cell.source for cell in notebook.cells if cell.cell_type == "code")
+
+
+class DependencyGraph:
+    """Files a notebook reads when it is executed, found by static scans of its code.
+
+    A notebook depends on
+
+    - files named by string literals in its code, e.g. ``pd.read_excel("data/x.xlsx")`` or
+      ``np.loadtxt('./experiments/a.csv')``, resolved relative to the notebook's directory,
+    - local modules it imports, e.g. ``from resources.gui import Gui``, and
+    - transitively, everything these modules import or read.
+
+    Only files inside the repository count as dependencies, installed packages are covered by
+    the environment. The scan is static, so paths built at runtime are missed.
+
+    Parameters
+    ----------
+    repo_root : str | Path
+        Root directory of the repository.
+    """
+
+    def __init__(self, repo_root):
+        self.repo_root = Path(repo_root).resolve()
+        self._direct = {}
+        self._digests = {}
+
+    def _in_repo(self, path):
+        try:
+            relative_path = path.relative_to(self.repo_root)
+        except ValueError:
+            return False
+        return ".git" not in relative_path.parts
+
+    def _resolve_file(self, candidate, base_dirs):
+        if not candidate or len(candidate) > 255 or "\n" in candidate:
+            return None
+        for base_dir in base_dirs:
+            try:
+                path = (base_dir / candidate).resolve()
+                if self._in_repo(path) and path.is_file():
+                    return path
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def _resolve_module(self, module, base_dir):
+        """Return the files of module (and of its parent packages) found below base_dir."""
+        files = []
+        package_dir = base_dir
+        parts = module.split(".") if module else []
+        for i, part in enumerate(parts):
+            package_dir = package_dir / part
+            init_file = package_dir / "__init__.py"
+            module_file = package_dir.with_suffix(".py")
+            if init_file.is_file():
+                files.append(init_file)
+            elif i == len(parts) - 1 and module_file.is_file():
+                files.append(module_file)
+            else:
+                return []
+        return files
+
+    def _import_dependencies(self, imports, file_path, run_dir):
+        dependencies = set()
+        for level, module, names in imports:
+            if level > 0:
+                base_dirs = [file_path.parent.parents[level - 2] if level > 1 else file_path.parent]
+            else:
+                base_dirs = [run_dir]
+            for base_dir in base_dirs:
+                module_files = self._resolve_module(module, base_dir)
+                if module and not module_files:
+                    continue
+                dependencies.update(module_files)
+                # ``from package import module`` imports submodules
+                module_dir = base_dir.joinpath(*module.split(".")) if module else base_dir
+                for name in names:
+                    dependencies.update(self._resolve_module(name, module_dir))
+        return {path.resolve() for path in dependencies if self._in_repo(path.resolve())}
+
+    def direct_dependencies(self, file_path, run_dir=None):
+        """Find the files a notebook or module reads or imports directly.
+
+        Parameters
+        ----------
+        file_path : str | Path
+            Path to a MyST, ipynb or py file.
+        run_dir : str | Path, optional
+            Working directory when the code is executed. Defaults to the file's directory.
+
+        Returns
+        -------
+        set of Path
+            Absolute paths of the dependencies.
+        """
+        file_path = Path(file_path).resolve()
+        run_dir = Path(run_dir).resolve() if run_dir is not None else file_path.parent
+        if (file_path, run_dir) not in self._direct:
+            strings, imports = scan_code(read_code(file_path))
+            base_dirs = [run_dir] if run_dir == file_path.parent else [run_dir, file_path.parent]
+            dependencies = {self._resolve_file(string, base_dirs) for string in strings} - {None}
+            dependencies |= self._import_dependencies(imports, file_path, run_dir)
+            dependencies.discard(file_path)
+            self._direct[(file_path, run_dir)] = dependencies
+        return self._direct[(file_path, run_dir)]
+
+    def invalidate(self, changed_files):
+        """Forget the scans and hashes of changed files, so they are read again.
+
+        Parameters
+        ----------
+        changed_files : iterable of str | Path
+            Changed files, absolute or relative to the repository root.
+
+        Returns
+        -------
+        None
+        """
+        changed_files = {(self.repo_root / changed_file).resolve() for changed_file in changed_files}
+        self._direct = {key: dependencies for key, dependencies in self._direct.items()
+                        if key[0] not in changed_files}
+        self._digests = {dependency: digest for dependency, digest in self._digests.items()
+                         if self.repo_root / dependency not in changed_files}
+
+    def dependencies(self, notebook_path):
+        """Find all files a notebook depends on, directly or transitively.
+
+        Parameters
+        ----------
+        notebook_path : str | Path
+            Path to a MyST or ipynb file.
+
+        Returns
+        -------
+        list of Path
+            Sorted paths of the dependencies, relative to the repository root.
+        """
+        notebook_path = Path(notebook_path).resolve()
+        run_dir = notebook_path.parent
+        found = set()
+        pending = [notebook_path]
+        while pending:
+            file_path = pending.pop()
+            for dependency in self.direct_dependencies(file_path, run_dir):
+                if dependency in found or dependency == notebook_path:
+                    continue
+                found.add(dependency)
+                if dependency.suffix == ".py":
+                    pending.append(dependency)
+        return sorted(path.relative_to(self.repo_root) for path in found)
+
+    def inputs_digest(self, notebook_path):
+        """Hash the paths and contents of all dependencies of a notebook.
+
+        Parameters
+        ----------
+        notebook_path : str | Path
+            Path to a MyST or ipynb file.
+
+        Returns
+        -------
+        str
+            Hexdigest that changes whenever a dependency is added, removed or modified.
+        """
+        hasher = hashlib.sha256()
+        for dependency in self.dependencies(notebook_path):
+            if dependency not in self._digests:
+                self._digests[dependency] = hash_file(self.repo_root / dependency)
+            hasher.update(f"{dependency.as_posix()}\n{self._digests[dependency]}\n".encode())
+        return hasher.hexdigest()
+
+    def affected_notebooks(self, notebook_paths, changed_files):
+        """Select the notebooks that depend on any of the changed files.
+
+        Parameters
+        ----------
+        notebook_paths : iterable of str | Path
+            Paths to MyST or ipynb files.
+        changed_files : iterable of str | Path
+            Changed files, absolute or relative to the repository root.
+
+        Returns
+        -------
+        list of Path
+            Notebooks that are changed themselves or depend on a changed file.
+        """
+        changed_files = {(self.repo_root / changed_file).resolve() for changed_file in changed_files}
+        affected = []
+        for notebook_path in notebook_paths:
+            notebook_path = (self.repo_root / notebook_path).resolve()
+            dependencies = {self.repo_root / dependency for dependency in self.dependencies(notebook_path)}
+            if notebook_path in changed_files or dependencies & changed_files:
+                affected.append(notebook_path)
+        return affected
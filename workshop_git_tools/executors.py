@@ -0,0 +1,286 @@
+import subprocess
+import time
+import traceback
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+import pathos
+from joblib import Parallel, delayed
+
+
+# Failures that may go away when the job is repeated, e.g. a crashed kernel or a busy file
+TRANSIENT_ERRORS = (OSError, subprocess.CalledProcessError)
+
+
+class ItemResult:
+    """Outcome of running a function on one item of an args list.
+
+    Parameters
+    ----------
+    label : str
+        Name of the item, used in reports.
+    value : object, optional
+        Return value of the function if it succeeded.
+    error : BaseException, optional
+        Exception of the last attempt if the function failed.
+    traceback : str, optional
+        Formatted traceback of error.
+    seconds : float, optional
+        Wall time of all attempts.
+    attempts : int, optional
+        Number of times the function was called.
+    """
+
+    def __init__(self, label, value=None, error=None, traceback=None, seconds=0.0, attempts=1):
+        self.label = label
+        self.value = value
+        self.error = error
+        self.traceback = traceback
+        self.seconds = seconds
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"failed ({type(self.error).__name__})"
+        return f"ItemResult({self.label!r}, {status}, {self.seconds:.2f} s, {self.attempts} attempts)"
+
+
+def format_failure_report(failures):
+    """Format a report of all failed items.
+
+    Parameters
+    ----------
+    failures : list of ItemResult
+        Failed items.
+
+    Returns
+    -------
+    str
+    """
+    lines = [f"{len(failures)} item(s) failed:"]
+    for failure in failures:
+        lines.append(f"- {failure.label} after {failure.attempts} attempt(s) and {failure.seconds:.1f} s: "
+                     f"{type(failure.error).__name__}: {failure.error}")
+    for failure in failures:
+        lines.append(f"\nTraceback of {failure.label}:\n{failure.traceback}")
+    return "\n".join(lines)
+
+
+class ExecutionError(RuntimeError):
+    """Raised after all items were processed if any of them failed.
+
+    Failures of nested runs, e.g. of the notebooks of a branch, are listed individually.
+
+    Parameters
+    ----------
+    failures : list of ItemResult
+        Failed items.
+    """
+
+    def __init__(self, failures):
+        self.failures = []
+        for failure in failures:
+            if isinstance(failure.error, ExecutionError):
+                for nested_failure in failure.error.failures:
+                    nested_failure.label = f"{failure.label}: {nested_failure.label}"
+                    self.failures.append(nested_failure)
+            else:
+                self.failures.append(failure)
+        super().__init__(format_failure_report(self.failures))
+
+
+class _Call:
+    """Picklable wrapper that times a function call and retries it on transient failures."""
+
+    def __init__(self, func, retries=0, retry_on=TRANSIENT_ERRORS):
+        self.func = func
+        self.retries = retries
+        self.retry_on = retry_on
+
+    def __call__(self, label, args):
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                value = self.func(*args)
+            except Exception as e:
+                if isinstance(e, self.retry_on) and attempts <= self.retries:
+                    continue
+                return ItemResult(label, error=e, traceback=traceback.format_exc(),
+                                  seconds=time.perf_counter() - start, attempts=attempts)
+            return ItemResult(label, value=value, seconds=time.perf_counter() - start, attempts=attempts)
+
+
+class ParallelizationBase:
+    """Base class of the backends that run a function over a list of args.
+
+    All backends run every item, even if some fail, and return the results in the order of the
+    args list.
+
+    Parameters
+    ----------
+    n_cores : int, optional
+        Number of items processed concurrently.
+    retries : int, optional
+        Number of times an item is repeated after a transient failure.
+    retry_on : tuple of type, optional
+        Exception types that are considered transient.
+    """
+
+    def __init__(self, n_cores=1, retries=0, retry_on=TRANSIENT_ERRORS):
+        self.n_cores = n_cores
+        self.retries = retries
+        self.retry_on = retry_on
+
+    @abstractmethod
+    def _map(self, call, labels, args_list):
+        """Apply call to all (label, args) pairs and return the ItemResults in order."""
+        return
+
+    def map(self, func, args_list, labels=None):
+        """Run a function over a list of input args and return the outcome of every item.
+
+        Parameters
+        ----------
+        func : callable
+            The function wrapping the shell command.
+        args_list : list | iterable
+            List of tuple of args to the func.
+        labels : list of str, optional
+            Names of the items used in reports. Defaults to the args.
+
+        Returns
+        -------
+        list of ItemResult
+        """
+        args_list = list(args_list)
+        if labels is None:
+            labels = [", ".join(str(arg) for arg in args) for args in args_list]
+        if len(args_list) == 0:
+            return []
+        return self._map(_Call(func, self.retries, self.retry_on), list(labels), args_list)
+
+    def run(self, func, args_list, labels=None):
+        """Run a function over a list of input args and return the output.
+
+        Parameters
+        ----------
+        func : callable
+            The function wrapping the shell command.
+        args_list : list | iterable
+            List of tuple of args to the func.
+        labels : list of str, optional
+            Names of the items used in the failure report. Defaults to the args.
+
+        Returns
+        -------
+        List of function returns
+
+        Raises
+        ------
+        ExecutionError
+            If any item failed, after all items were processed.
+        """
+        results = self.map(func, args_list, labels)
+        failures = [result for result in results if not result.ok]
+        if failures:
+            raise ExecutionError(failures)
+        return [result.value for result in results]
+
+
+class SequentialBackend(ParallelizationBase):
+    def _map(self, call, labels, args_list):
+        return [call(label, args) for label, args in zip(labels, args_list)]
+
+
+class ThreadBackend(ParallelizationBase):
+    """Backend for work that waits on subprocesses, kernels or I/O rather than the interpreter."""
+
+    def _map(self, call, labels, args_list):
+        with ThreadPoolExecutor(max_workers=self.n_cores) as executor:
+            return list(executor.map(call, labels, args_list))
+
+
+class JoblibBackend(ParallelizationBase):
+    def _map(self, call, labels, args_list):
+        return Parallel(n_jobs=self.n_cores)(delayed(call)(label, args) for label, args in zip(labels, args_list))
+
+
+class PathosBackend(ParallelizationBase):
+    """Process backend, for work that is bound by the interpreter."""
+
+    def _map(self, call, labels, args_list):
+        with pathos.pools.ProcessPool(ncpus=self.n_cores) as pool:
+            return pool.map(call, labels, args_list)
+
+
+def run_func_over_args_list(func, args_list, backend=None, n_cores=1, labels=None):
+    """Run a function over a list of input args and return the output.
+
+    Parameters
+    ----------
+    func : callable
+        The function wrapping the shell command.
+    args_list : list | iterable
+        List of tuple of args to the func.
+    backend : ParallelizationBase, optional
+        Backend for parallelization. Default is SequentialBackend for n_cores == 1 and
+        PathosBackend otherwise.
+    n_cores : int, optional
+        Number of cores to use for parallelization, if no backend is given.
+    labels : list of str, optional
+        Names of the items used in the failure report. Defaults to the args.
+
+    Returns
+    -------
+    List of function returns
+
+    Raises
+    ------
+    ExecutionError
+        If any item failed, after all items were processed.
+    """
+    args_list = list(args_list)
+    if len(args_list) == 0:
+        return []
+
+    if type(args_list[0]) not in (list, tuple):
+        args_list = [(x,) for x in args_list]
+
+    if backend is None:
+        backend = SequentialBackend() if n_cores == 1 else PathosBackend(n_cores=n_cores)
+
+    return backend.run(func, args_list, labels)
+
+
+BACKENDS = {
+    "sequential": SequentialBackend,
+    "thread": ThreadBackend,
+    "joblib": JoblibBackend,
+    "pathos": PathosBackend,
+}
+
+
+def make_backend(name, n_cores=1, **kwargs):
+    """Create a backend by name.
+
+    Parameters
+    ----------
+    name : str
+        One of the keys of ``BACKENDS``.
+    n_cores : int, optional
+        Number of items processed concurrently.
+    **kwargs
+        Further arguments of the backend, e.g. retries.
+
+    Returns
+    -------
+    ParallelizationBase
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose one of {', '.join(BACKENDS)}.")
+    return BACKENDS[name](n_cores=n_cores, **kwargs)
@@ -0,0 +1,135 @@
+import os
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+
+import git
+
+
+# Directories whose content is never a notebook source, even if it was committed by accident
+EXCLUDED_DIRS = (".ipynb_checkpoints", ".git")
+
+# Number of repositories and tree-ishes whose latest index is kept by ``FileIndex.for_repo``
+MAX_SHARED_INDEXES = 16
+
+
+class FileIndex:
+    """Files known to git, as an alternative to globbing the working tree.
+
+    By default the index lists the tracked and staged files of a repository (``git ls-files``),
+    minus the tracked files that match the ignore rules. With a tree-ish, e.g. a branch, it lists
+    the files committed in that tree (``git ls-tree``). Untracked scratch output, simulation
+    files and checkpoints are never listed, so discovery does not depend on what happens to lie
+    around in the working tree.
+
+    The listing is done once per instance. Use ``for_repo`` to share instances within a run.
+    It keeps only the latest index of the most recently used repositories and tree-ishes.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        GitPython Repo object.
+    treeish : str, optional
+        Commit, branch or tree to list. If None, the index of the repo is listed.
+    excluded_dirs : iterable of str, optional
+        Names of directories whose files are skipped.
+    """
+
+    # (working tree, tree-ish) -> (state, instance), most recently used last
+    _instances = OrderedDict()
+
+    def __init__(self, repo, treeish=None, excluded_dirs=EXCLUDED_DIRS):
+        self.repo = repo
+        self.treeish = treeish
+        self.excluded_dirs = set(excluded_dirs)
+        self._paths = None
+
+    @classmethod
+    def for_repo(cls, repo, treeish=None):
+        """Return a shared index of a repository, listed again only if its state changed.
+
+        The state is the commit a tree-ish resolves to, or the modification time of the
+        git index file.
+
+        Parameters
+        ----------
+        repo : git.Repo
+            GitPython Repo object.
+        treeish : str, optional
+            Commit, branch or tree to list. If None, the index of the repo is listed.
+
+        Returns
+        -------
+        FileIndex
+        """
+        if treeish is None:
+            index_path = Path(repo.git_dir) / "index"
+            state = index_path.stat().st_mtime_ns if index_path.exists() else None
+        else:
+            state = repo.rev_parse(treeish).hexsha
+        key = (os.path.realpath(repo.working_tree_dir), treeish)
+        shared = cls._instances.pop(key, None)
+        if shared is None or shared[0] != state:
+            shared = (state, cls(repo, treeish))
+        cls._instances[key] = shared
+        while len(cls._instances) > MAX_SHARED_INDEXES:
+            cls._instances.popitem(last=False)
+        return shared[1]
+
+    def _list(self):
+        if self.treeish is not None:
+            output = self.repo.git.ls_tree("-r", "-z", "--name-only", "--full-tree", self.treeish)
+            return {path for path in output.split("\0") if path}
+
+        output = self.repo.git.ls_files("-z", "--cached", "--full-name")
+        paths = {path for path in output.split("\0") if path}
+        ignored = self.repo.git.ls_files("-z", "--cached", "--ignored", "--exclude-standard", "--full-name")
+        return paths - set(ignored.split("\0"))
+
+    def paths(self):
+        """List all files of the index.
+
+        Returns
+        -------
+        list of PurePosixPath
+            Sorted paths relative to the repository root.
+        """
+        if self._paths is None:
+            self._paths = sorted(PurePosixPath(path) for path in self._list()
+                                 if not self.excluded_dirs.intersection(PurePosixPath(path).parts[:-1]))
+        return self._paths
+
+    def files(self, suffixes=None, root=None):
+        """List the files with one of the given suffixes.
+
+        Parameters
+        ----------
+        suffixes : iterable of str, optional
+            File suffixes including the dot, e.g. (".md", ".ipynb"). All files if None.
+        root : str | Path, optional
+            Directory to make the paths absolute with, e.g. a worktree of the repository.
+
+        Returns
+        -------
+        list of Path
+            Relative paths, or absolute paths below root.
+        """
+        suffixes = set(suffixes) if suffixes is not None else None
+        paths = [path for path in self.paths() if suffixes is None or path.suffix in suffixes]
+        if root is None:
+            return [Path(path) for path in paths]
+        return [Path(root) / path for path in paths]
+
+
+def file_index_for_path(path):
+    """Return the shared index of the tracked and staged files of the repository containing path.
+
+    Parameters
+    ----------
+    path : str | Path
+        Path inside a git repository.
+
+    Returns
+    -------
+    FileIndex
+    """
+    return FileIndex.for_repo(git.Repo(path, search_parent_directories=True))
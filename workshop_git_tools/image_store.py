@@ -0,0 +1,186 @@
+import argparse
+import base64
+import hashlib
+import os
+from pathlib import Path
+
+import nbformat
+
+
+# Directory of the image store, relative to the repository root
+IMAGE_ASSET_DIR = "_output_images"
+
+# Image mime types that are stored, with the file suffix and whether nbformat keeps them base64 encoded
+IMAGE_MIME_TYPES = {
+    "image/png": (".png", True),
+    "image/jpeg": (".jpg", True),
+    "image/gif": (".gif", True),
+    "image/svg+xml": (".svg", False),
+}
+
+# Output metadata key that holds the references to the store
+ASSET_METADATA_KEY = "image_assets"
+
+
+def _image_outputs(notebook):
+    for cell in notebook.cells:
+        if cell.cell_type != "code":
+            continue
+        for output in cell.get("outputs", []):
+            if output.output_type in ("display_data", "execute_result"):
+                yield output
+
+
+def _decode(data, is_base64):
+    if isinstance(data, list):
+        data = "".join(data)
+    return base64.b64decode(data) if is_base64 else data.encode("utf-8")
+
+
+def _encode(content, is_base64):
+    return base64.b64encode(content).decode("ascii") if is_base64 else content.decode("utf-8")
+
+
+def extract_images(notebook, notebook_dir, asset_dir):
+    """Move the image outputs of a notebook into a content-addressed store.
+
+    Every image is written to ``<asset_dir>/<sha256><suffix>``, so identical images of all
+    runs and notebooks are stored once. In the notebook, the image data is replaced by a
+    reference in the output metadata and, if the output has no html representation, by an
+    html ``<img>`` tag, so that Jupyter still shows the image. ``inline_images`` reverses this.
+
+    .. note:: **Modifies**: notebook
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Notebook to extract the images from.
+    notebook_dir : str | Path
+        Directory of the notebook file, references are relative to it.
+    asset_dir : str | Path
+        Directory of the image store.
+
+    Returns
+    -------
+    set of Path
+        Paths of the stored images the notebook references.
+    """
+    notebook_dir = Path(notebook_dir)
+    asset_dir = Path(asset_dir)
+    assets = set()
+    for output in _image_outputs(notebook):
+        references = {}
+        for mime_type, (suffix, is_base64) in IMAGE_MIME_TYPES.items():
+            if mime_type not in output.data:
+                continue
+            content = _decode(output.data.pop(mime_type), is_base64)
+            asset_path = asset_dir / f"{hashlib.sha256(content).hexdigest()}{suffix}"
+            if asset_path not in assets and not asset_path.exists():
+                asset_path.parent.mkdir(parents=True, exist_ok=True)
+                asset_path.write_bytes(content)
+            assets.add(asset_path)
+            references[mime_type] = Path(os.path.relpath(asset_path, notebook_dir)).as_posix()
+        if not references:
+            continue
+
+        output.metadata[ASSET_METADATA_KEY] = references
+        if "text/html" not in output.data:
+            output.data["text/html"] = f'<img src="{next(iter(references.values()))}"/>'
+            output.metadata[ASSET_METADATA_KEY]["text/html"] = None
+    return assets
+
+
+def inline_images(notebook, notebook_dir):
+    """Embed the images referenced by ``extract_images`` in the notebook again.
+
+    .. note:: **Modifies**: notebook
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Notebook with references to the image store.
+    notebook_dir : str | Path
+        Directory of the notebook file.
+
+    Returns
+    -------
+    nbformat.NotebookNode
+        The notebook.
+
+    Raises
+    ------
+    FileNotFoundError
+        If a referenced image is missing from the store.
+    """
+    notebook_dir = Path(notebook_dir)
+    for output in _image_outputs(notebook):
+        references = output.metadata.pop(ASSET_METADATA_KEY, None)
+        if not references:
+            continue
+        for mime_type, reference in references.items():
+            if reference is None:
+                # The html representation was added by extract_images
+                output.data.pop(mime_type, None)
+                continue
+            _, is_base64 = IMAGE_MIME_TYPES[mime_type]
+            output.data[mime_type] = _encode((notebook_dir / reference).read_bytes(), is_base64)
+    return notebook
+
+
+def extract_notebook_images(ipynb_file_path, asset_dir):
+    """Move the image outputs of an ipynb file into the image store, see ``extract_images``.
+
+    Parameters
+    ----------
+    ipynb_file_path : str | Path
+        path to ipynb file.
+    asset_dir : str | Path
+        Directory of the image store.
+
+    Returns
+    -------
+    set of Path
+        Paths of the stored images the notebook references.
+    """
+    ipynb_file_path = Path(ipynb_file_path)
+    notebook = nbformat.read(ipynb_file_path, as_version=nbformat.NO_CONVERT)
+    assets = extract_images(notebook, ipynb_file_path.parent, asset_dir)
+    if assets:
+        nbformat.write(notebook, ipynb_file_path)
+    return assets
+
+
+def load_notebook(ipynb_file_path):
+    """Read an ipynb file with all images of the image store embedded.
+
+    Parameters
+    ----------
+    ipynb_file_path : str | Path
+        path to ipynb file.
+
+    Returns
+    -------
+    nbformat.NotebookNode
+    """
+    ipynb_file_path = Path(ipynb_file_path)
+    notebook = nbformat.read(ipynb_file_path, as_version=nbformat.NO_CONVERT)
+    return inline_images(notebook, ipynb_file_path.parent)
+
+
+def main(argv=None):
+    """Embed the images of the image store in ipynb files, e.g. before sharing them.
+
+    Returns
+    -------
+    None
+    """
+    parser = argparse.ArgumentParser(description='Embed images of the image store in notebooks again.')
+    parser.add_argument('notebooks', nargs='+', help='ipynb files to update in place.')
+    args = parser.parse_args(argv)
+
+    for ipynb_file_path in args.notebooks:
+        nbformat.write(load_notebook(ipynb_file_path), ipynb_file_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from workshop_git_tools.limits import LimitWatchdog
+
+
+_local = threading.local()
+
+
+class Measurement:
+    """Resources used by one stage of a build, e.g. running one notebook.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the stage, e.g. "convert", "run" or "commit".
+    item : str, optional
+        Item the stage processed, e.g. the notebook path.
+    wall_seconds : float, optional
+        Elapsed time.
+    cpu_seconds : float, optional
+        CPU time spent in this process (thread) and in child processes.
+    peak_rss : int, optional
+        Largest resident set size of the child processes (or worker process) in bytes.
+    ok : bool, optional
+        False if the stage raised an exception.
+    """
+
+    def __init__(self, stage, item=None, wall_seconds=0.0, cpu_seconds=0.0, peak_rss=0, ok=True):
+        self.stage = stage
+        self.item = item
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.peak_rss = peak_rss
+        self.ok = ok
+        self.child_cpu_seconds = 0.0
+
+    def add_child_usage(self, cpu_seconds, peak_rss):
+        self.child_cpu_seconds += cpu_seconds
+        self.peak_rss = max(self.peak_rss, peak_rss)
+
+    def to_dict(self):
+        return {
+            "stage": self.stage,
+            "item": self.item,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "peak_rss_mb": round(self.peak_rss / 2 ** 20, 1),
+            "ok": self.ok,
+        }
+
+
+def own_peak_rss():
+    """Return the peak resident set size of the current process in bytes (0 if unknown)."""
+    if resource is None:
+        return 0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+@contextmanager
+def measure(stage, item=None):
+    """Measure the wall time and CPU time of a block of code.
+
+    CPU time is counted for the calling thread, plus the usage of child processes reported
+    with ``record_child_usage`` while the block runs. Measurements can be nested.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the stage.
+    item : str, optional
+        Item the stage processes.
+
+    Yields
+    ------
+    Measurement
+        Filled in when the block exits.
+    """
+    measurement = Measurement(stage, item)
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(measurement)
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield measurement
+    except BaseException:
+        measurement.ok = False
+        raise
+    finally:
+        stack.pop()
+        measurement.wall_seconds = time.perf_counter() - start_wall
+        measurement.cpu_seconds = time.thread_time() - start_cpu + measurement.child_cpu_seconds
+        if stack:
+            # The thread's own CPU time is measured by the outer measurement anyway
+            stack[-1].add_child_usage(measurement.child_cpu_seconds, measurement.peak_rss)
+
+
+def record_child_usage(cpu_seconds, peak_rss):
+    """Add the usage of a child process to the innermost measurement of the calling thread.
+
+    Parameters
+    ----------
+    cpu_seconds : float
+        User and system CPU time of the child.
+    peak_rss : int
+        Peak resident set size of the child in bytes.
+
+    Returns
+    -------
+    None
+    """
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].add_child_usage(cpu_seconds, peak_rss)
+
+
+def run_measured(command, limits=None):
+    """Run a shell command like ``subprocess.run(command, shell=True, check=True)``.
+
+    Where available, the CPU time and peak RSS of the command and the processes it waited for
+    are taken from ``os.wait4`` and recorded with ``record_child_usage``.
+
+    Parameters
+    ----------
+    command : str
+        The shell command to run.
+    limits : dict, optional
+        Wall-clock and memory limits of the command and all its child processes, see
+        ``limits.load_limits``. Not limited if None.
+
+    Returns
+    -------
+    subprocess.CompletedProcess
+
+    Raises
+    ------
+    subprocess.CalledProcessError
+        If the command failed.
+    ResourceLimitExceeded
+        If the command was killed because it exceeded its limits.
+    """
+    # Own session, so the whole process tree can be killed if it exceeds its limits
+    process = subprocess.Popen(command, shell=True, start_new_session=limits is not None)
+    with LimitWatchdog(process.pid, limits or {}) as watchdog:
+        try:
+            if hasattr(os, "wait4"):
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+                record_child_usage(usage.ru_utime + usage.ru_stime, peak_rss)
+            else:
+                process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+    if watchdog.exceeded is not None:
+        raise watchdog.exceeded
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return subprocess.CompletedProcess(command, process.returncode)
+
+
+class BuildReport:
+    """Collects the measurements of all stages of a build.
+
+    Measurements taken in worker processes can be added with ``add``. Adding is thread-safe.
+    """
+
+    def __init__(self):
+        self.measurements = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def add(self, measurement):
+        """Add a finished measurement.
+
+        Parameters
+        ----------
+        measurement : Measurement
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            self.measurements.append(measurement)
+
+    @contextmanager
+    def stage(self, stage, item=None):
+        """Measure a block of code and add the measurement to the report, see ``measure``.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage.
+        item : str, optional
+            Item the stage processes.
+
+        Yields
+        ------
+        Measurement
+        """
+        with measure(stage, item) as measurement:
+            try:
+                yield measurement
+            finally:
+                self.add(measurement)
+
+    def totals(self):
+        """Sum up the measurements per stage.
+
+        Returns
+        -------
+        dict
+            Mapping of stage to count, summed wall and CPU time, largest peak RSS and failures.
+        """
+        totals = {}
+        for measurement in self.measurements:
+            total = totals.setdefault(measurement.stage, {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                          "peak_rss_mb": 0.0, "failed": 0})
+            total["count"] += 1
+            total["wall_seconds"] += measurement.wall_seconds
+            total["cpu_seconds"] += measurement.cpu_seconds
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], round(measurement.peak_rss / 2 ** 20, 1))
+            total["failed"] += not measurement.ok
+        return totals
+
+    def to_dict(self):
+        return {
+            "wall_seconds": round(time.perf_counter() - self._start, 4),
+            "stages": self.totals(),
+            "measurements": [measurement.to_dict() for measurement in self.measurements],
+        }
+
+    def write(self, report_path):
+        """Write the report as json.
+
+        Parameters
+        ----------
+        report_path : str | Path
+            Path of the json file.
+
+        Returns
+        -------
+        None
+        """
+        with open(report_path, "w", encoding="utf-8") as file_handle:
+            json.dump(self.to_dict(), file_handle, indent=1)
+
+    def summary(self, n_slowest=5):
+        """Format a table of the stage totals and the slowest items.
+
+        Stages run concurrently, so the summed wall times can exceed the total.
+
+        Parameters
+        ----------
+        n_slowest : int, optional
+            Number of slowest items to list.
+
+        Returns
+        -------
+        str
+        """
+        lines = [f"{'stage':<12} {'count':>5} {'wall [s]':>9} {'cpu [s]':>9} {'peak RSS [MB]':>14} {'failed':>6}"]
+        for stage, total in self.totals().items():
+            lines.append(f"{stage:<12} {total['count']:>5} {total['wall_seconds']:>9.2f} "
+                         f"{total['cpu_seconds']:>9.2f} {total['peak_rss_mb']:>14.1f} {total['failed']:>6}")
+        lines.append(f"{'total':<12} {'':>5} {time.perf_counter() - self._start:>9.2f}")
+
+        slowest = sorted((measurement for measurement in self.measurements if measurement.item is not None),
+                         key=lambda measurement: -measurement.wall_seconds)[:n_slowest]
+        if slowest:
+            lines.append("")
+            lines.append("Slowest items:")
+            for measurement in slowest:
+                lines.append(f"{measurement.wall_seconds:>9.2f} s  {measurement.stage:<8} {measurement.item}")
+        return "\n".join(lines)
@@ -0,0 +1,404 @@
+import queue
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import nbformat
+from jupyter_client.asynchronous import AsyncKernelClient
+from jupyter_client.manager import KernelManager
+from jupyter_core.utils import run_sync
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+from nbclient import NotebookClient
+from nbclient.exceptions import CellExecutionError
+from nbtoolbelt.cleaning import clean_code_metadata, clean_code_output, truncate_output_streams
+
+from workshop_git_tools.cell_cache import RESTORE_CODE, cell_chain_keys
+from workshop_git_tools.executors import ThreadBackend
+from workshop_git_tools.instrumentation import record_child_usage
+from workshop_git_tools.limits import LimitWatchdog
+from workshop_git_tools.nbtoolbelt_config import DEFAULT_RUN_CONFIG, load_tool_config
+
+
+# Heavy imports shared by the workshop notebooks, loaded once when a kernel is started
+WARMUP_MODULES = (
+    "numpy",
+    "scipy",
+    "pandas",
+    "matplotlib",
+    "matplotlib.pyplot",
+    "cadet",
+    "CADETProcess",
+)
+
+WARMUP_CODE = """
+import importlib as _importlib
+import sys as _sys
+for _module in {modules!r}:
+    try:
+        _importlib.import_module(_module)
+    except ImportError:
+        pass
+_sys._workshop_warm_modules = set(_sys.modules)
+_module = None
+del _importlib, _sys, _module
+"""
+
+# Clears everything a notebook left behind, except for the modules imported during warmup
+RESET_CODE = """
+get_ipython().run_line_magic("reset", "-f")
+import os as _os
+import sys as _sys
+for _name in set(_sys.modules) - _sys._workshop_warm_modules:
+    del _sys.modules[_name]
+_name = None
+if "matplotlib.pyplot" in _sys.modules:
+    _sys.modules["matplotlib.pyplot"].close("all")
+    _sys.modules["matplotlib"].rcdefaults()
+_os.chdir({path!r})
+get_ipython().history_manager.reset(new_session=True)
+get_ipython().execution_count = 1
+del _os, _sys, _name
+"""
+
+
+def load_run_config(nbtoolbelt_config_path):
+    """Load the run settings from a .nbtoolbelt.json config file.
+
+    Parameters
+    ----------
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+
+    Returns
+    -------
+    dict
+        Run settings.
+    """
+    return load_tool_config(nbtoolbelt_config_path, "nbrun", DEFAULT_RUN_CONFIG)
+
+
+class KernelPool:
+    """Pool of pre-warmed Jupyter kernels to execute notebooks with.
+
+    Starting a kernel and importing CADET-Process, matplotlib and pandas takes longer than
+    running most of the workshop notebooks. The pool starts n_kernels kernels once, imports the
+    heavy modules in each of them and then reuses the kernels for many notebooks. Between two
+    notebooks, the user namespace is reset, all modules imported by the previous notebook are
+    dropped, figures are closed and the working directory is changed to the next notebook.
+
+    Parameters
+    ----------
+    n_kernels : int, optional
+        Number of kernels, i.e. notebooks executed concurrently.
+    kernel_name : str, optional
+        Name of the kernel spec to start.
+    warmup_modules : iterable of str, optional
+        Modules imported in every kernel on startup. Missing modules are skipped.
+    cell_cache : CellCache, optional
+        Cache of cell outputs and namespace snapshots. If given, notebooks executed with a
+        notebook_key only re-execute the cells from the first changed one on.
+    """
+
+    def __init__(self, n_kernels=1, kernel_name="python3", warmup_modules=WARMUP_MODULES, cell_cache=None):
+        self.n_kernels = n_kernels
+        self.kernel_name = kernel_name
+        self.warmup_modules = tuple(warmup_modules)
+        self.cell_cache = cell_cache
+        self._kernel_managers = []
+        self._idle = queue.Queue()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    @staticmethod
+    def _execute_silently(kernel_client, code):
+        reply = run_sync(kernel_client.execute_interactive)(code, store_history=False, silent=True, timeout=None,
+                                                            output_hook=lambda msg: None)
+        return reply["content"]["status"] == "ok"
+
+    @staticmethod
+    def _notebook_client_kc(kernel_manager):
+        """Create an asynchronous client for nbclient.
+
+        With the blocking client of a KernelManager, nbclient waits for output messages of a
+        dead kernel forever, instead of raising DeadKernelError.
+        """
+        kernel_client = AsyncKernelClient(parent=kernel_manager, connection_file=kernel_manager.connection_file,
+                                          **kernel_manager.get_connection_info(session=True))
+        kernel_client.start_channels()
+        run_sync(kernel_client.wait_for_ready)(timeout=60)
+        return kernel_client
+
+    def _execute(self, kernel_manager, code):
+        kernel_client = kernel_manager.client()
+        kernel_client.start_channels()
+        try:
+            kernel_client.wait_for_ready(timeout=60)
+            reply = kernel_client.execute_interactive(code, store_history=False, silent=True, timeout=60,
+                                                      output_hook=lambda msg: None)
+        finally:
+            kernel_client.stop_channels()
+        if reply["content"]["status"] != "ok":
+            raise RuntimeError(f"Kernel setup failed: {reply['content'].get('evalue')}")
+
+    def _start_kernel(self):
+        kernel_manager = KernelManager(kernel_name=self.kernel_name)
+        # Like nbclient, keep the IPython history in memory
+        kernel_manager.start_kernel(extra_arguments=["--HistoryManager.hist_file=:memory:"])
+        self._execute(kernel_manager, WARMUP_CODE.format(modules=self.warmup_modules))
+        return kernel_manager
+
+    def start(self):
+        """Start and warm up all kernels concurrently.
+
+        Returns
+        -------
+        None
+        """
+        with ThreadPoolExecutor(max_workers=self.n_kernels) as executor:
+            kernel_managers = list(executor.map(lambda _: self._start_kernel(), range(self.n_kernels)))
+        for kernel_manager in kernel_managers:
+            self._kernel_managers.append(kernel_manager)
+            self._idle.put(kernel_manager)
+
+    def shutdown(self):
+        """Shut down all kernels.
+
+        Returns
+        -------
+        None
+        """
+        for kernel_manager in self._kernel_managers:
+            if kernel_manager.has_kernel:
+                kernel_manager.shutdown_kernel(now=True)
+        self._kernel_managers = []
+        self._idle = queue.Queue()
+
+    @staticmethod
+    def _kernel_process(kernel_manager):
+        pid = getattr(kernel_manager.provisioner, "pid", None)
+        if psutil is None or pid is None:
+            return None
+        try:
+            return psutil.Process(pid)
+        except psutil.Error:
+            return None
+
+    def _acquire(self):
+        kernel_manager = self._idle.get()
+        if not kernel_manager.is_alive():
+            # A previous notebook killed the kernel, replace it with a fresh one
+            self._kernel_managers.remove(kernel_manager)
+            kernel_manager = self._start_kernel()
+            self._kernel_managers.append(kernel_manager)
+        return kernel_manager
+
+    def _restore_cached_prefix(self, client, notebook, chain_keys):
+        """Restore the outputs of the unchanged prefix and the namespace of its last snapshot.
+
+        Returns the index of the first cell to execute.
+        """
+        n_cached = 0
+        n_restorable = 0
+        entries = []
+        for position, (index, key) in enumerate(chain_keys):
+            entry = self.cell_cache.load_outputs(key)
+            if entry is None:
+                break
+            entries.append(entry)
+            n_cached = position + 1
+            if self.cell_cache.has_snapshot(key):
+                n_restorable = n_cached
+
+        if n_cached == len(chain_keys):
+            # Nothing changed, no cell needs to be executed
+            n_restorable = n_cached
+        elif n_restorable > 0:
+            execution_counts = [entry["execution_count"] for entry in entries[:n_restorable]
+                                if entry["execution_count"] is not None]
+            restore_code = RESTORE_CODE.format(path=str(self.cell_cache.snapshot_path(chain_keys[n_restorable - 1][1])),
+                                               execution_count=max(execution_counts, default=0) + 1)
+            if not self._execute_silently(client.kc, restore_code):
+                return 0
+
+        for (index, key), entry in zip(chain_keys[:n_restorable], entries):
+            cell = notebook.cells[index]
+            cell.outputs = [nbformat.from_dict(output) for output in entry["outputs"]]
+            cell.execution_count = entry["execution_count"]
+            cell.metadata = nbformat.from_dict(entry["metadata"])
+
+        if n_restorable == len(chain_keys):
+            return len(notebook.cells)
+        return chain_keys[n_restorable][0]
+
+    def _execute_notebook(self, client, notebook, notebook_key=None, inputs_key=""):
+        """Execute the cells of a notebook, resuming from the cell cache if possible."""
+        use_cell_cache = self.cell_cache is not None and notebook_key is not None
+        chain_keys = cell_chain_keys(notebook, f"{notebook_key}\n{inputs_key}") if use_cell_cache else []
+        cell_keys = {index: (position, key) for position, (index, key) in enumerate(chain_keys)}
+
+        client.kc = self._notebook_client_kc(client.km)
+        with client.setup_kernel():
+            info_msg = client.wait_for_reply(client.kc.kernel_info())
+            if info_msg is not None and "language_info" in info_msg["content"]:
+                notebook.metadata["language_info"] = info_msg["content"]["language_info"]
+
+            start_index = self._restore_cached_prefix(client, notebook, chain_keys) if use_cell_cache else 0
+
+            for index in range(start_index, len(notebook.cells)):
+                cell = notebook.cells[index]
+                client.execute_cell(cell, index)
+                if index in cell_keys:
+                    position, key = cell_keys[index]
+                    self.cell_cache.store_outputs(key, cell)
+                    snapshot_code = self.cell_cache.snapshot_code(key, position)
+                    if snapshot_code is not None:
+                        self._execute_silently(client.kc, snapshot_code)
+
+            client.set_widgets_metadata()
+
+        if use_cell_cache:
+            self.cell_cache.prune_snapshots(notebook_key, [key for _, key in chain_keys])
+
+    def run_notebook(self, ipynb_file_path, nbtoolbelt_config_path, notebook_key=None, inputs_key="", run_path=None,
+                     limits=None):
+        """Execute a notebook on a warm kernel, like nbtb run.
+
+        The notebook is cleaned, executed and written according to the ``nbrun`` settings of
+        the config file.
+
+        Parameters
+        ----------
+        ipynb_file_path : str
+            path to ipynb file as posix.
+        nbtoolbelt_config_path : str
+            path to .nbtoolbelt.json config file
+        notebook_key : str, optional
+            Stable identifier of the notebook and its environment, e.g. its path relative to the
+            repo. Required to use the cell cache.
+        inputs_key : str, optional
+            Digest of the files the notebook reads. Cached cells are not reused if it changes.
+        run_path : str, optional
+            Working directory of the notebook. Defaults to the ``run_path`` setting or the
+            directory of the notebook.
+        limits : dict, optional
+            Wall-clock and memory limits of the kernel and its child processes while it executes
+            the notebook, see ``limits.load_limits``. A kernel that exceeds them is killed and
+            replaced by a fresh one for the next notebook.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ResourceLimitExceeded
+            If the kernel was killed because it exceeded the limits.
+        """
+        run_config = load_run_config(nbtoolbelt_config_path)
+        ipynb_file_path = Path(ipynb_file_path)
+        notebook = nbformat.read(ipynb_file_path, as_version=4)
+
+        if run_config["clean_before"]:
+            clean_code_output(notebook)
+            clean_code_metadata(notebook, run_config["clean_before_metadata"])
+
+        if run_config["append_cell"]:
+            notebook.cells.append(nbformat.v4.new_code_cell(run_config["appended_cell"]))
+
+        run_path = run_path or run_config["run_path"] or ipynb_file_path.resolve().parent.as_posix()
+        timeout = run_config["timeout"] if run_config["timeout"] >= 0 else None
+
+        kernel_manager = self._acquire()
+        kernel_process = self._kernel_process(kernel_manager)
+        try:
+            start_cpu = sum(kernel_process.cpu_times()[:2]) if kernel_process is not None else 0.0
+            self._execute(kernel_manager, RESET_CODE.format(path=run_path))
+            client = NotebookClient(
+                notebook,
+                km=kernel_manager,
+                timeout=timeout,
+                allow_errors=run_config["allow_errors"],
+                interrupt_on_timeout=run_config["interrupt_on_timeout"],
+                record_timing=run_config["record_timing"],
+            )
+            error = None
+            with LimitWatchdog(getattr(kernel_manager.provisioner, "pid", None), limits or {}) as watchdog:
+                try:
+                    self._execute_notebook(client, notebook, notebook_key, inputs_key)
+                except (CellExecutionError, TimeoutError) as e:
+                    print(f"{type(e).__name__} in {ipynb_file_path.name}: {e}")
+                except Exception as e:
+                    # Raised below, once the watchdog has finished killing the kernel
+                    error = e
+                finally:
+                    if client.kc is not None:
+                        client.kc.stop_channels()
+            if watchdog.exceeded is not None:
+                raise watchdog.exceeded from error
+            if error is not None:
+                raise error
+            if kernel_process is not None:
+                # The kernel is reused, so its current RSS is used instead of its lifetime peak
+                try:
+                    record_child_usage(sum(kernel_process.cpu_times()[:2]) - start_cpu,
+                                       kernel_process.memory_info().rss)
+                except psutil.Error:
+                    pass
+        finally:
+            self._idle.put(kernel_manager)
+
+        if run_config["clean_after"]:
+            clean_code_metadata(notebook, run_config["clean_after_metadata"])
+
+        if run_config["streams_head"] >= 0:
+            truncate_output_streams(notebook, Namespace(**run_config))
+
+        result_path = ipynb_file_path.with_name(ipynb_file_path.stem + run_config["run_result_name"]
+                                                + ipynb_file_path.suffix)
+        nbformat.write(notebook, result_path)
+
+    def run_notebooks(self, ipynb_file_paths, nbtoolbelt_config_path, notebook_keys=None, inputs_keys=None,
+                      run_paths=None):
+        """Execute notebooks concurrently, one per kernel of the pool.
+
+        Parameters
+        ----------
+        ipynb_file_paths : list of str
+            paths to ipynb files as posix.
+        nbtoolbelt_config_path : str
+            path to .nbtoolbelt.json config file
+        notebook_keys : list of str, optional
+            Stable identifiers of the notebooks, see ``run_notebook``.
+        inputs_keys : list of str, optional
+            Digests of the files the notebooks read, see ``run_notebook``.
+        run_paths : list of str, optional
+            Working directories of the notebooks, see ``run_notebook``.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ExecutionError
+            If any notebook could not be executed, after all notebooks were processed.
+        """
+        n_notebooks = len(ipynb_file_paths)
+        notebook_keys = notebook_keys if notebook_keys is not None else [None] * n_notebooks
+        inputs_keys = inputs_keys if inputs_keys is not None else [""] * n_notebooks
+        run_paths = run_paths if run_paths is not None else [None] * n_notebooks
+
+        ThreadBackend(n_cores=self.n_kernels).run(
+            self.run_notebook,
+            list(zip(ipynb_file_paths, [nbtoolbelt_config_path] * n_notebooks, notebook_keys, inputs_keys,
+                     run_paths)),
+            labels=[str(ipynb_file_path) for ipynb_file_path in ipynb_file_paths])
@@ -0,0 +1,253 @@
+import copy
+import fnmatch
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from workshop_git_tools.nbtoolbelt_config import read_config_file
+
+
+# Limits of a notebook job, -1 disables a limit
+DEFAULT_LIMITS = {
+    "timeout": -1,
+    "memory_mb": -1,
+}
+
+# Suffix of the sidecar file with the limits of a single notebook, e.g. "lesson.limits.json"
+SIDECAR_SUFFIX = ".limits.json"
+
+# Seconds between two checks of a running job
+POLL_INTERVAL = 0.2
+
+# Seconds processes get to exit after SIGTERM before they are killed
+TERMINATE_GRACE_PERIOD = 3.0
+
+
+def load_limits(nbtoolbelt_config_path, notebook_path):
+    """Load the resource limits of a notebook job.
+
+    The limits are read from the ``limits`` section of the .nbtoolbelt.json config file, which
+    nbtoolbelt ignores. Its ``notebooks`` entry maps glob patterns of notebook paths, relative
+    to the config file, to limits for these notebooks. A sidecar file next to the notebook, e.g.
+    ``lesson.limits.json`` for ``lesson.ipynb``, takes precedence over the config file::
+
+        "limits": {
+            "timeout": 600,
+            "memory_mb": 4096,
+            "notebooks": {"04 Chromatography/*": {"timeout": 1800}}
+        }
+
+    Parameters
+    ----------
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+    notebook_path : str | Path
+        path to the notebook (or its source).
+
+    Returns
+    -------
+    dict
+        Wall-clock limit in seconds ("timeout") and memory limit of the process tree in
+        megabytes ("memory_mb"), -1 if not limited.
+    """
+    notebook_path = Path(notebook_path)
+    limits = copy.deepcopy(DEFAULT_LIMITS)
+    config = read_config_file(nbtoolbelt_config_path).get("limits", {})
+    limits.update({key: value for key, value in config.items() if key in DEFAULT_LIMITS})
+
+    try:
+        relative_path = notebook_path.resolve().relative_to(Path(nbtoolbelt_config_path).resolve().parent)
+    except ValueError:
+        relative_path = notebook_path
+    for pattern, notebook_limits in config.get("notebooks", {}).items():
+        if fnmatch.fnmatch(relative_path.as_posix(), pattern):
+            limits.update(notebook_limits)
+
+    sidecar_path = notebook_path.with_name(notebook_path.stem + SIDECAR_SUFFIX)
+    if sidecar_path.exists():
+        with open(sidecar_path, encoding="utf-8") as sidecar_file:
+            limits.update(json.load(sidecar_file))
+    return limits
+
+
+class ResourceLimitExceeded(RuntimeError):
+    """Raised when a job was killed because it exceeded its wall-clock or memory limit.
+
+    Parameters
+    ----------
+    kind : str
+        "timeout" or "memory_mb".
+    limit : float
+        The limit.
+    usage : float
+        Elapsed seconds or memory of the process tree in megabytes when the job was killed.
+    processes : list of str
+        Descriptions of the killed processes.
+    """
+
+    def __init__(self, kind, limit, usage, processes=()):
+        self.kind = kind
+        self.limit = limit
+        self.usage = usage
+        self.processes = list(processes)
+        if kind == "timeout":
+            message = f"Exceeded the time limit of {limit} s after {usage:.1f} s."
+        else:
+            message = f"Exceeded the memory limit of {limit} MB with {usage:.0f} MB."
+        if self.processes:
+            message += " Killed " + ", ".join(self.processes) + "."
+        super().__init__(message)
+
+
+def _process_tree(pid):
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def _describe(process):
+    try:
+        return f"{process.pid} {process.name()} ({process.memory_info().rss / 2 ** 20:.0f} MB)"
+    except psutil.Error:
+        return str(process.pid)
+
+
+def _exited(process):
+    try:
+        return process.status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+    except psutil.Error:
+        return False
+
+
+def _wait_until_exited(processes, timeout):
+    # Unlike psutil.wait_procs, this does not reap child processes of this process, whose exit
+    # status belongs to the code that started them
+    deadline = time.monotonic() + timeout
+    alive = [process for process in processes if not _exited(process)]
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.05)
+        alive = [process for process in alive if not _exited(process)]
+    return alive
+
+
+def kill_process_tree(pid, grace_period=TERMINATE_GRACE_PERIOD):
+    """Terminate a process and all its descendants, and kill the ones that do not exit in time.
+
+    Without psutil, only the process group of pid is signalled, which covers the children of
+    processes started in a new session.
+
+    Parameters
+    ----------
+    pid : int
+        Process id of the root of the tree.
+    grace_period : float, optional
+        Seconds the processes get to exit after SIGTERM.
+
+    Returns
+    -------
+    list of str
+        Descriptions of the processes that were signalled.
+    """
+    if psutil is None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return []
+        return [str(pid)]
+
+    processes = _process_tree(pid)
+    descriptions = [_describe(process) for process in processes]
+    for process in processes:
+        try:
+            process.terminate()
+        except psutil.Error:
+            pass
+    for process in _wait_until_exited(processes, grace_period):
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    return descriptions
+
+
+def tree_memory_mb(pid):
+    """Return the summed resident set size of a process and its descendants in megabytes."""
+    rss = 0
+    for process in _process_tree(pid):
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss / 2 ** 20
+
+
+class LimitWatchdog:
+    """Kills a process tree from a background thread once it exceeds its limits.
+
+    Memory is only limited if psutil is installed. After the block, ``exceeded`` holds the
+    ResourceLimitExceeded if the tree was killed.
+
+    Parameters
+    ----------
+    pid : int | None
+        Process id of the root of the tree, e.g. a shell command or a kernel. Nothing is
+        watched if None.
+    limits : dict
+        Limits as returned by ``load_limits``.
+    poll_interval : float, optional
+        Seconds between two checks.
+    """
+
+    def __init__(self, pid, limits, poll_interval=POLL_INTERVAL):
+        self.pid = pid
+        self.timeout = limits.get("timeout", -1)
+        self.memory_mb = limits.get("memory_mb", -1) if psutil is not None else -1
+        self.poll_interval = poll_interval
+        self.exceeded = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self.pid is not None and (self.timeout >= 0 or self.memory_mb >= 0)
+
+    def __enter__(self):
+        if self.active:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self):
+        start = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            elapsed = time.monotonic() - start
+            exceeded = None
+            if 0 <= self.timeout < elapsed:
+                exceeded = ("timeout", self.timeout, elapsed)
+            elif self.memory_mb >= 0:
+                memory_mb = tree_memory_mb(self.pid)
+                if memory_mb > self.memory_mb:
+                    exceeded = ("memory_mb", self.memory_mb, memory_mb)
+            if exceeded is not None:
+                self.exceeded = ResourceLimitExceeded(*exceeded, processes=kill_process_tree(self.pid))
+                return
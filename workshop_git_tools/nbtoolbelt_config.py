@@ -0,0 +1,100 @@
+import copy
+import json
+from functools import lru_cache
+from pathlib import Path
+
+
+# Defaults of the ``nbpunch`` tool as shipped with nbtoolbelt (src/nbtoolbelt/data/nbtoolbelt.json)
+DEFAULT_PUNCH_CONFIG = {
+    "tags": [],
+    "punched": True,
+    "chads": False,
+    "fill": False,
+    "filling": {
+        "markdown": "\n<div class='alert alert-warning' role='alert'>Replace this line by your text.</div>\n",
+        "code": "\n# ===== =====> Replace this line by your code. <===== ===== #\n",
+        "raw": "\n% ===== =====> Replace this line by your content. <===== =====\n",
+    },
+    "punch_source": "",
+    "punch_punched_result_name": "-punched",
+    "run": False,
+    "validate": False,
+    "write_files": True,
+}
+
+# Defaults of the ``nbrun`` tool as shipped with nbtoolbelt (src/nbtoolbelt/data/nbtoolbelt.json)
+DEFAULT_RUN_CONFIG = {
+    "kernel_name": "",
+    "run_path": "",
+    "timeout": -1,
+    "interrupt_on_timeout": True,
+    "allow_errors": True,
+    "record_timing": True,
+    "clean_before": True,
+    "clean_before_metadata": ["ExecuteTime", "execution"],
+    "clean_after": True,
+    "clean_after_metadata": ["collapsed", "scrolled"],
+    "streams_head": -1,
+    "streams_truncate_message": "*** Output truncated ***",
+    "append_cell": False,
+    "appended_cell": "# Automatically added code cell: lists all global names defined by this notebook.\n%whos",
+    "run_result_name": "-run",
+    "validate": False,
+    "write_files": True,
+}
+
+
+@lru_cache(maxsize=None)
+def _read_config_file(nbtoolbelt_config_path, modification_time):
+    if modification_time is None:
+        return {}
+    with open(nbtoolbelt_config_path, encoding="utf-8") as config_file:
+        return json.load(config_file)
+
+
+def read_config_file(nbtoolbelt_config_path):
+    """Read a .nbtoolbelt.json config file, or return an empty config if it does not exist.
+
+    The file is only read again if it was modified. Do not modify the returned dict.
+
+    Parameters
+    ----------
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+
+    Returns
+    -------
+    dict
+        All sections of the config file.
+    """
+    config_path = Path(nbtoolbelt_config_path)
+    modification_time = config_path.stat().st_mtime_ns if config_path.exists() else None
+    return _read_config_file(str(config_path), modification_time)
+
+
+def load_tool_config(nbtoolbelt_config_path, tool, defaults):
+    """Load the settings of an nbtoolbelt tool from a .nbtoolbelt.json config file.
+
+    Like nbtoolbelt, the global ``nbtoolbelt`` section is applied on top of the defaults first
+    and the tool specific section (e.g. ``nbpunch``) on top of that. The file is only read again
+    if it was modified.
+
+    Parameters
+    ----------
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+    tool : str
+        Name of the tool section, e.g. "nbpunch" or "nbrun".
+    defaults : dict
+        Default settings of the tool.
+
+    Returns
+    -------
+    dict
+        Tool settings.
+    """
+    config_all = read_config_file(nbtoolbelt_config_path)
+    tool_config = copy.deepcopy(defaults)
+    tool_config.update(config_all.get("nbtoolbelt", {}))
+    tool_config.update(config_all.get(tool, {}))
+    return tool_config
@@ -0,0 +1,290 @@
+import ast
+import glob
+import importlib.util
+import os
+from pathlib import Path
+
+import nbformat
+
+try:
+    from IPython.core.inputtransformer2 import TransformerManager
+except ImportError:
+    TransformerManager = None
+
+from workshop_git_tools.dependency_graph import _strip_ipython_syntax
+from workshop_git_tools.executors import run_func_over_args_list
+
+
+# Calls whose first argument is a file the notebook reads, e.g. ``pd.read_excel("data/x.xlsx")``
+READ_CALLS = frozenset((
+    "read_csv", "read_excel", "read_table", "read_json", "read_hdf", "read_parquet", "read_pickle",
+    "read_fwf", "ExcelFile", "loadtxt", "genfromtxt", "load", "imread", "open", "File", "glob", "iglob",
+))
+
+# Exceptions that mark an import as optional if they are caught around it
+IMPORT_ERRORS = frozenset(("ImportError", "ModuleNotFoundError", "Exception", "BaseException"))
+
+# Cells with this tag are expected to fail, nbclient continues after them
+RAISES_EXCEPTION_TAG = "raises-exception"
+
+# Lines that install packages while the notebook runs, so its imports cannot be checked before
+INSTALL_COMMANDS = ("pip install", "conda install", "mamba install")
+
+
+class Problem:
+    """A defect of a notebook found before it is executed.
+
+    Parameters
+    ----------
+    kind : str
+        "syntax", "file" or "import".
+    cell : int
+        Index of the cell in the notebook.
+    line : int | None
+        Line in the cell, starting at 1.
+    message : str
+        Description of the defect.
+    """
+
+    def __init__(self, kind, cell, line, message):
+        self.kind = kind
+        self.cell = cell
+        self.line = line
+        self.message = message
+
+    def __repr__(self):
+        return f"Problem({self.kind!r}, {self.cell!r}, {self.line!r}, {self.message!r})"
+
+    def __str__(self):
+        location = f"cell {self.cell}" + (f", line {self.line}" if self.line is not None else "")
+        return f"{location}: {self.kind}: {self.message}"
+
+
+class PreflightError(RuntimeError):
+    """Raised if any notebook has problems, with a report covering all notebooks.
+
+    Parameters
+    ----------
+    problems : dict
+        Mapping of notebook name to its list of Problem.
+    """
+
+    def __init__(self, problems):
+        self.problems = problems
+        n_problems = sum(len(notebook_problems) for notebook_problems in problems.values())
+        lines = [f"Pre-flight check found {n_problems} problem(s) in {len(problems)} notebook(s):"]
+        for notebook, notebook_problems in problems.items():
+            lines.append(f"{notebook}:")
+            lines.extend(f"  - {problem}" for problem in notebook_problems)
+        super().__init__("\n".join(lines))
+
+
+def parse_cell(source):
+    """Parse the code of a cell, including IPython magics and top-level await.
+
+    Parameters
+    ----------
+    source : str
+        Source of a code cell.
+
+    Returns
+    -------
+    ast.Module
+
+    Raises
+    ------
+    SyntaxError
+        If the cell is not valid Python.
+    """
+    if TransformerManager is not None:
+        code = TransformerManager().transform_cell(source)
+    elif source.lstrip().startswith("%%"):
+        # The body of a cell magic is not Python
+        code = ""
+    else:
+        code = _strip_ipython_syntax(source)
+    return compile(code, "<cell>", "exec", flags=ast.PyCF_ONLY_AST | ast.PyCF_ALLOW_TOP_LEVEL_AWAIT,
+                   dont_inherit=True)
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def _reads_file(node):
+    """Return the path literal a call reads, or None."""
+    if _call_name(node) not in READ_CALLS or not node.args:
+        return None
+    path = node.args[0]
+    if not isinstance(path, ast.Constant) or not isinstance(path.value, str) or "://" in path.value:
+        return None
+    if _call_name(node) == "open":
+        mode = node.args[1] if len(node.args) > 1 else next(
+            (keyword.value for keyword in node.keywords if keyword.arg == "mode"), None)
+        if isinstance(mode, ast.Constant) and isinstance(mode.value, str) and set(mode.value) & set("wax+"):
+            return None
+    return path.value
+
+
+def _catches_import_errors(node):
+    for handler in node.handlers:
+        if handler.type is None:
+            return True
+        names = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+        if any(isinstance(name, ast.Name) and name.id in IMPORT_ERRORS for name in names):
+            return True
+    return False
+
+
+def _required_imports(tree):
+    """Yield the imports of a module that are not guarded by ``try: ... except ImportError``."""
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Try) and _catches_import_errors(node):
+            pending.extend(node.handlers + node.orelse + node.finalbody)
+            continue
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield node.lineno, alias.name
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            yield node.lineno, node.module
+        pending.extend(ast.iter_child_nodes(node))
+
+
+def _module_found(module, notebook_dir):
+    top_level = module.split(".")[0]
+    if (notebook_dir / f"{top_level}.py").is_file() or (notebook_dir / top_level).is_dir():
+        return True
+    try:
+        return importlib.util.find_spec(top_level) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def check_notebook(notebook, notebook_dir):
+    """Check a notebook for defects that would make its execution fail.
+
+    - Every code cell must be valid Python, IPython magics are allowed.
+    - Files read with a path literal, e.g. ``pd.read_excel("experimental_data/x.xlsx")`` or
+      ``glob.glob("experiments/*/*.csv")``, must exist relative to the notebook directory.
+    - Imported modules must be installed or next to the notebook. Imports guarded by
+      ``try: ... except ImportError`` are optional and not checked, neither are the imports of
+      notebooks that install packages while they run.
+
+    Cells tagged ``raises-exception`` are skipped. Imports are looked up in the current
+    environment, which is the environment of the kernel for the default python3 kernel.
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode | str
+        Notebook, or its content in ipynb format.
+    notebook_dir : str | Path
+        Directory of the notebook, the working directory of its kernel.
+
+    Returns
+    -------
+    list of Problem
+        Empty if the notebook passed all checks.
+    """
+    if isinstance(notebook, str):
+        notebook = nbformat.reads(notebook, as_version=4)
+    notebook_dir = Path(notebook_dir)
+
+    code_cells = [(index, cell) for index, cell in enumerate(notebook.cells) if cell.cell_type == "code"
+                  and RAISES_EXCEPTION_TAG not in cell.metadata.get("tags", [])]
+    installs_packages = any(command in cell.source for _, cell in code_cells for command in INSTALL_COMMANDS)
+
+    problems = []
+    missing_modules = set()
+    for index, cell in code_cells:
+        try:
+            tree = parse_cell(cell.source)
+        except SyntaxError as error:
+            problems.append(Problem("syntax", index, error.lineno, error.msg))
+            continue
+
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call):
+                continue
+            path = _reads_file(node)
+            if path is None:
+                continue
+            full_path = os.path.join(notebook_dir, path)
+            if glob.has_magic(path) and _call_name(node) in ("glob", "iglob"):
+                found = bool(glob.glob(full_path))
+            else:
+                found = os.path.exists(full_path)
+            if not found:
+                problems.append(Problem("file", index, node.lineno, f"{path} not found"))
+
+        if installs_packages:
+            continue
+        for lineno, module in sorted(_required_imports(tree)):
+            top_level = module.split(".")[0]
+            # Every missing module is reported once, at its first import
+            if top_level not in missing_modules and not _module_found(module, notebook_dir):
+                missing_modules.add(top_level)
+                problems.append(Problem("import", index, lineno, f"No module named {top_level!r}"))
+    return sorted(problems, key=lambda problem: (problem.cell, problem.line or 0))
+
+
+def check_notebook_batch(notebooks):
+    """Check a list of notebooks, in-process. See ``check_notebook``.
+
+    Parameters
+    ----------
+    notebooks : list of tuple
+        Path of the notebook as posix and its content in ipynb format.
+
+    Returns
+    -------
+    list of list of Problem
+    """
+    return [check_notebook(content, Path(ipynb_path).parent) for ipynb_path, content in notebooks]
+
+
+def check_notebooks(notebooks, n_cores=1, backend=None):
+    """Check all notebooks in parallel and fail with a report of every problem found.
+
+    Parameters
+    ----------
+    notebooks : dict
+        Mapping of notebook name to (path of the notebook, content in ipynb format).
+    n_cores : int, optional
+        Number of cpu cores to use for parallelization
+    backend : ParallelizationBase, optional
+        Backend to run the batches with.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    PreflightError
+        If any notebook has problems.
+    """
+    if len(notebooks) == 0:
+        return
+    names = list(notebooks)
+    n_batches = min(len(names), int(n_cores or os.cpu_count()))
+    batches = [names[i::n_batches] for i in range(n_batches)]
+    batch_results = run_func_over_args_list(
+        func=check_notebook_batch,
+        args_list=[([(Path(notebooks[name][0]).as_posix(), notebooks[name][1]) for name in batch],)
+                   for batch in batches],
+        backend=backend,
+        n_cores=n_cores)
+
+    problems = {}
+    for batch, batch_result in zip(batches, batch_results):
+        for name, notebook_problems in zip(batch, batch_result):
+            if notebook_problems:
+                problems[name] = notebook_problems
+    if problems:
+        raise PreflightError({name: problems[name] for name in names if name in problems})
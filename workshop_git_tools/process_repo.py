@@ -1,13 +1,38 @@
 import argparse
 import os
 import shutil
-from abc import abstractmethod
+import sys
+import tempfile
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-import subprocess
 import git
-
-from joblib import Parallel, delayed
-import pathos
+import jupytext
+from jupytext.config import load_jupytext_config
+
+
+if __package__ in (None, ""):
+    # Allow running this file as a script (``python workshop_git_tools/process_repo.py``)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from workshop_git_tools.build_cache import BuildCache
+from workshop_git_tools.cell_cache import CellCache
+from workshop_git_tools.dependency_graph import DependencyGraph
+from workshop_git_tools.executors import (  # noqa: F401, re-exported for backwards compatibility
+    BACKENDS, ExecutionError, JoblibBackend, ParallelizationBase, PathosBackend, SequentialBackend, ThreadBackend,
+    make_backend, run_func_over_args_list
+)
+from workshop_git_tools.file_index import FileIndex, file_index_for_path
+from workshop_git_tools.image_store import IMAGE_ASSET_DIR, extract_notebook_images
+from workshop_git_tools.instrumentation import BuildReport, measure, own_peak_rss, run_measured
+from workshop_git_tools.kernel_pool import KernelPool
+from workshop_git_tools.limits import load_limits
+from workshop_git_tools.preflight import check_notebooks
+from workshop_git_tools.punch import (
+    load_punch_config, punch_notebook_content, punch_notebook_file, supports_native_punch
+)
+from workshop_git_tools.remote_cache import create_remote_store
+from workshop_git_tools.scheduler import RuntimeHistory, balance, parse_shard, run_scheduled, shard_items
+from workshop_git_tools.staging import commit_changes, normalize_cell_ids, normalize_notebook_file
 
 
 def on_error(func, path, exc_info):
@@ -32,94 +57,385 @@ def on_error(func, path, exc_info):
         raise
 
 
-class ParallelizationBase:
-    def __init__(self, n_cores=1):
-        self.n_cores = n_cores
+def run_command(command, limits=None):
+    """Run a shell command and return its output.
 
-    @abstractmethod
-    def run(self, func, args_list):
-        """Run a function over a list of input args and return the output.
+    Parameters
+    ----------
+    command : str
+        The shell command to run.
+    limits : dict, optional
+        Wall-clock and memory limits of the command, see ``limits.load_limits``.
 
-        Parameters
-        ----------
-        func : callable
-            The function wrapping the shell command.
-        args_list : list | iterable
-            List of args to the func.
+    Returns
+    -------
+    None
+    """
+    return run_measured(command, limits)
 
-        Returns
-        -------
-        List of function returns
-        """
-        return
 
+BRANCH_VARIANTS = {"solution": "solution", "teaching": "teaching"}
 
-class SequentialBackend(ParallelizationBase):
-    def run(self, func, args_list):
-        results = []
-        for args in args_list:
-            results.append(func(*args))
-        return results
 
+@contextmanager
+def branch_worktree(repo, branch):
+    """Check out a branch in a temporary git worktree and remove the worktree afterwards.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        GitPython Repo object.
+    branch : str
+        Name of the branch to check out.
+
+    Yields
+    ------
+    git.Repo
+        GitPython Repo object of the worktree.
+    """
+    worktree_dir = tempfile.mkdtemp(prefix=f"workshop-{branch}-")
+    repo.git.worktree("add", worktree_dir, branch)
+    try:
+        yield git.Repo(worktree_dir)
+    finally:
+        repo.git.worktree("remove", "--force", worktree_dir)
+        if os.path.exists(worktree_dir):
+            shutil.rmtree(worktree_dir, onerror=on_error)
 
-class JoblibBackend(ParallelizationBase):
-    def run(self, func, args_list):
-        Parallel(n_jobs=self.n_cores)(delayed(func)(*args) for args in args_list)
 
+def create_branches(branches=("solution", "teaching"), run=False, commit=False, push=False, n_cores=1,
+                    on_fail_restore_dev=False, use_cache=True, warm_kernels=0, shard=None, retries=0,
+                    report_path=None, backend=None, extract_images=False, remote_cache=None, preflight=True):
+    """Create the solution and teaching files from dev in a single run.
 
-class PathosBackend(ParallelizationBase):
-    def run(self, func, args_list):
-        with pathos.pools.ProcessPool(ncpus=self.n_cores) as pool:
-            # *zip(*args_list) because for multiple args, pathos expects (func, args1_list, args2_list)
-            results = pool.map(func, *zip(*args_list))
-        return results
+    Every branch is built in its own temporary git worktree, so the working tree of the repo is
+    never touched, and the branches are built concurrently. Every source is converted only once.
+    The converted notebook is written unchanged (and optionally executed) to the solution branch
+    and punched to the teaching branch.
 
+    Executed notebooks are only rebuilt if their source or one of the files they read changed,
+    as found by ``DependencyGraph``, e.g. data files and local modules.
 
-def run_func_over_args_list(func, args_list, backend=None, n_cores=1):
-    """Run a function over a list of input args and return the output.
+    The runtime of every job is recorded in a history file. Jobs are dispatched longest-first,
+    and with shard="i/n" only the i-th of n runtime-balanced shares of the notebooks is built,
+    e.g. to fill the build cache from several CI machines.
+
+    Every stage is measured in a ``BuildReport``, per notebook for conversion, punching and
+    execution.
 
     Parameters
     ----------
-    func : callable
-        The function wrapping the shell command.
-    args_list : list | iterable
-        List of tuple of args to the func.
-    backend : ParallelizationBase, optional
-        Backend for parallelization. Default is SequentialBackend
+    branches : iterable of str, optional
+        Branches to create, any of "solution" and "teaching".
+    run : bool, optional
+        Run nbtb on the solution notebooks.
+    commit : bool, optional
+        Commit changes.
+    push : bool, optional
+        Push changes to remote.
     n_cores : int, optional
-        Number of cores to use for parallelization
+        Number of cpu cores to use for parallelization
+    on_fail_restore_dev : bool, optional
+        Kept for backwards compatibility. The working tree is never modified, so there is nothing to restore.
+    use_cache : bool, optional
+        Reuse build artifacts of unchanged sources from the build cache.
+    warm_kernels : int, optional
+        Execute the solution notebooks on a pool of this many pre-warmed kernels instead of
+        calling nbtb run per notebook. 0 disables the pool.
+    shard : str, optional
+        Only build the notebooks of shard "i/n". Sharded builds cannot be committed.
+    retries : int, optional
+        Number of times a run or punch job is repeated after a transient failure.
+    report_path : str, optional
+        Write the wall time, CPU time and peak RSS of every stage to this json file.
+        A summary table is printed either way.
+    backend : ParallelizationBase, optional
+        Backend for the in-process conversion work. Default depends on n_cores, see
+        ``run_func_over_args_list``.
+    extract_images : bool, optional
+        Move the image outputs of the notebooks into a content-addressed store in the branch,
+        see ``image_store.extract_images``.
+    remote_cache : str, optional
+        Shared directory or http(s) url of a remote build cache, see
+        ``remote_cache.create_remote_store``. Cached artifacts are pulled from it before the
+        build and new artifacts are pushed to it. Defaults to the WORKSHOP_REMOTE_CACHE
+        environment variable.
+    preflight : bool, optional
+        Check the notebooks that are executed for syntax errors, missing files and missing
+        modules before any of them runs, see ``preflight.check_notebook``.
 
     Returns
     -------
-    List of function returns
+    None
+
+    Raises
+    ------
+    PreflightError
+        If the pre-flight check found problems. Nothing is executed or committed.
     """
-    if type(args_list[0]) not in (list, tuple):
-        args_list = [(x,) for x in args_list]
+    if shard is not None and (commit or push):
+        raise ValueError("A sharded build only covers part of the notebooks and cannot be committed.")
 
-    if backend is None and n_cores == 1:
-        backend = SequentialBackend()
-    else:
-        backend = PathosBackend(n_cores=n_cores)
+    repo = git.Repo(search_parent_directories=True)
+    current_branch = repo.active_branch.name
 
-    return backend.run(func, args_list)
+    if current_branch != "dev":
+        print("Not on dev branch. Skipping create_branches script.")
+        return
 
+    variants = {branch: BRANCH_VARIANTS[branch] for branch in branches}
+    if run and "solution" in variants:
+        variants["solution"] = "solution-run"
 
-def run_command(command):
-    """Run a shell command and return its output.
+    report = BuildReport()
+    history = RuntimeHistory.for_repo(repo)
+
+    with ExitStack() as stack:
+        # Remove worktrees left behind by interrupted runs
+        with report.stage("worktree"):
+            repo.git.worktree("prune")
+            worktrees = {branch: stack.enter_context(branch_worktree(repo, branch)) for branch in variants}
+
+        # Reset to `dev`
+        for branch, worktree in worktrees.items():
+            with report.stage("restore", branch):
+                worktree.git.restore("--source", "dev", ".")
+
+        # All worktrees now hold the sources of dev, read them from the first one
+        source_worktree = next(iter(worktrees.values()))
+        source_root = Path(source_worktree.working_tree_dir)
+        nbtoolbelt_config_path = f"{source_root}/.nbtoolbelt.json"
+
+        # Find all myst and ipynb files committed to dev
+        with report.stage("collect"):
+            file_index = FileIndex.for_repo(repo, "dev")
+            notebook_sources = {ipynb_file.relative_to(source_root): source_file.relative_to(source_root)
+                                for ipynb_file, source_file
+                                in collect_notebook_sources(source_root, file_index).items()}
+
+        if shard is not None:
+            estimates = {ipynb_file.as_posix(): estimate_notebook_runtime(history, ipynb_file,
+                                                                          notebook_sources[ipynb_file], variants)
+                         for ipynb_file in notebook_sources}
+            selected = set(shard_items(estimates, estimates, *parse_shard(shard)))
+            notebook_sources = {ipynb_file: source_file for ipynb_file, source_file in notebook_sources.items()
+                                if ipynb_file.as_posix() in selected}
+            print(f"Shard {shard} builds {len(notebook_sources)} notebooks.")
+
+        # Executed notebooks also depend on the data files and local modules they read
+        inputs_digests = {}
+        if variants.get("solution") == "solution-run":
+            with report.stage("scan"):
+                dependency_graph = DependencyGraph(source_root)
+                inputs_digests = {ipynb_file: dependency_graph.inputs_digest(source_root / source_file)
+                                  for ipynb_file, source_file in notebook_sources.items()}
+
+        # Look up the artifacts of all variants and convert every source that misses one exactly once
+        with report.stage("hash"):
+            cache = BuildCache.for_repo(source_worktree, create_remote_store(remote_cache)) if use_cache else None
+            cache_keys = {branch: {ipynb_file: cache.key(source_root / source_file, variant,
+                                                         inputs_digests.get(ipynb_file) if variant.endswith("-run")
+                                                         else None)
+                                   if cache else None
+                                   for ipynb_file, source_file in notebook_sources.items()}
+                          for branch, variant in variants.items()}
+
+        # Download the artifacts other developers and CI jobs already built
+        if cache is not None and cache.remote is not None:
+            remote = cache.remote
+            with report.stage("pull"):
+                pulled = cache.pull(key for keys in cache_keys.values() for key in keys.values())
+            print(f"Pulled {pulled} artifacts from remote cache {remote!r}.")
+
+        missing = [ipynb_file for ipynb_file in notebook_sources
+                   if cache is None or any(keys[ipynb_file] not in cache for keys in cache_keys.values())]
+        print(f"Building {len(missing)} of {len(notebook_sources)} notebooks, "
+              f"{len(notebook_sources) - len(missing)} are restored from cache.")
+
+        contents = build_notebook_variants(source_root, [notebook_sources[ipynb_file] for ipynb_file in missing],
+                                           list(variants), nbtoolbelt_config_path, n_cores, history, report,
+                                           backend)
+        contents = dict(zip(missing, contents))
+
+        # Fail fast, before minutes of execution are spent on the notebooks that are fine
+        if preflight and variants.get("solution") == "solution-run":
+            executed = [ipynb_file for ipynb_file in missing
+                        if cache is None or cache_keys["solution"][ipynb_file] not in cache]
+            with report.stage("preflight"):
+                check_notebooks({ipynb_file.as_posix(): (source_root / ipynb_file, contents[ipynb_file]["solution"])
+                                 for ipynb_file in executed}, n_cores, backend)
+
+        # Build all branches concurrently. Every branch is completed, even if another one fails.
+        try:
+            ThreadBackend(n_cores=len(worktrees)).run(
+                build_branch,
+                [(worktree, branch, notebook_sources, cache, cache_keys[branch],
+                  {ipynb_file: content[branch] for ipynb_file, content in contents.items()},
+                  run, commit, push, n_cores, warm_kernels, history, retries, inputs_digests, report,
+                  extract_images)
+                 for branch, worktree in worktrees.items()],
+                labels=list(worktrees))
+        finally:
+            print(report.summary())
+            if report_path is not None:
+                report.write(report_path)
+            # The runtimes of the completed jobs are kept, even if another job failed
+            history.save()
+
+
+def estimate_notebook_runtime(history, ipynb_file, source_file, variants):
+    """Estimate the time it takes to build a notebook for all variants.
 
     Parameters
     ----------
-    command : str
-        The shell command to run.
+    history : RuntimeHistory
+        History of earlier job runtimes.
+    ipynb_file : Path
+        Relative path of the notebook.
+    source_file : Path
+        Relative path of its source.
+    variants : dict
+        Mapping of branch to build variant.
 
     Returns
     -------
-    None
+    float
+        Estimated runtime in seconds.
     """
-    return subprocess.run(command, shell=True, check=True)
+    estimate = history.estimate("convert", source_file.as_posix())
+    if variants.get("solution") == "solution-run":
+        estimate += history.estimate("run", ipynb_file.as_posix())
+    if "teaching" in variants:
+        estimate += history.estimate("punch", ipynb_file.as_posix())
+    return estimate
+
 
+def build_branch(worktree, branch, notebook_sources, cache, cache_keys, contents, run=False, commit=False,
+                 push=False, n_cores=1, warm_kernels=0, history=None, retries=0, inputs_digests=None,
+                 report=None, extract_images=False):
+    """Write, process, commit and push the notebooks of one branch in its worktree.
 
-def create_solution(run=False, commit=False, push=False, n_cores=1, on_fail_restore_dev=False):
+    Parameters
+    ----------
+    worktree : git.Repo
+        GitPython Repo object of the worktree in which the branch is checked out.
+    branch : str
+        Name of the branch, "solution" or "teaching".
+    notebook_sources : dict
+        Mapping of relative ipynb Path to relative source Path.
+    cache : BuildCache | None
+        Build cache to restore from and store to.
+    cache_keys : dict
+        Mapping of relative ipynb Path to cache key (None without cache).
+    contents : dict
+        Mapping of relative ipynb Path to the freshly built notebook in ipynb format.
+    run : bool, optional
+        Run nbtb on the solution notebooks.
+    commit : bool, optional
+        Commit changes.
+    push : bool, optional
+        Push changes to remote.
+    n_cores : int, optional
+        Number of cpu cores to use for parallelization
+    warm_kernels : int, optional
+        Execute the solution notebooks on a pool of this many pre-warmed kernels. 0 disables the pool.
+    history : RuntimeHistory, optional
+        History to schedule the run and punch jobs with and to record their runtimes in.
+    retries : int, optional
+        Number of times a run or punch job is repeated after a transient failure.
+    inputs_digests : dict, optional
+        Mapping of relative ipynb Path to the digest of the files the notebook reads.
+    report : BuildReport, optional
+        Report to measure the stages in.
+    extract_images : bool, optional
+        Move the image outputs of the notebooks into the image store of the branch.
+
+    Returns
+    -------
+    None
+    """
+    inputs_digests = inputs_digests or {}
+    report = report or BuildReport()
+    worktree_root = Path(worktree.working_tree_dir)
+    nbtoolbelt_config_path = f"{worktree_root}/.nbtoolbelt.json"
+
+    with report.stage("write", branch):
+        # Remove all myst files except for the README
+        for source_file in notebook_sources.values():
+            if source_file.suffix == ".md":
+                os.remove(worktree_root / source_file)
+
+        pending = write_branch_notebooks(worktree_root, cache, cache_keys, contents)
+
+    if branch == "solution" and run and pending:
+        ipynb_file_paths = [(worktree_root / ipynb_file).as_posix() for ipynb_file in pending]
+        items = [ipynb_file.as_posix() for ipynb_file in pending]
+        if warm_kernels:
+            # Run each ipynb file on a warm kernel, resuming from the first changed cell
+            cell_cache = CellCache.for_repo(worktree) if cache is not None else None
+            notebook_keys = [f"{cache.environment_hash}:{ipynb_file.as_posix()}" if cache is not None else None
+                             for ipynb_file in pending]
+            with KernelPool(n_kernels=warm_kernels, cell_cache=cell_cache) as kernel_pool:
+                run_scheduled(func=kernel_pool.run_notebook,
+                              args_list=[(ipynb_file_path, nbtoolbelt_config_path, notebook_key,
+                                          inputs_digests.get(ipynb_file, ""), None,
+                                          load_limits(nbtoolbelt_config_path, ipynb_file_path))
+                                         for ipynb_file_path, notebook_key, ipynb_file
+                                         in zip(ipynb_file_paths, notebook_keys, pending)],
+                              items=items, kind="run", history=history, n_workers=warm_kernels, retries=retries,
+                              report=report)
+        else:
+            # Run nbtb run for each ipynb file, longest first
+            run_scheduled(func=run_notebook,
+                          args_list=[(ipynb_file_path, nbtoolbelt_config_path,
+                                      load_limits(nbtoolbelt_config_path, ipynb_file_path))
+                                     for ipynb_file_path in ipynb_file_paths],
+                          items=items, kind="run", history=history, n_workers=n_cores or os.cpu_count(),
+                          retries=retries, report=report)
+
+    if branch == "teaching" and pending and not supports_native_punch(load_punch_config(nbtoolbelt_config_path)):
+        # Run nbtb punch for each ipynb file the native punch engine could not handle
+        run_scheduled(func=punch_notebook,
+                      args_list=[((worktree_root / ipynb_file).as_posix(), nbtoolbelt_config_path)
+                                 for ipynb_file in pending],
+                      items=[ipynb_file.as_posix() for ipynb_file in pending], kind="punch", history=history,
+                      n_workers=n_cores or os.cpu_count(), retries=retries, report=report)
+
+    if branch == "solution" and run and pending:
+        # Drop execution timestamps and renumber execution counts, so unchanged results are committed unchanged
+        with report.stage("normalize", branch):
+            for ipynb_file in pending:
+                normalize_notebook_file(worktree_root / ipynb_file)
+
+    with report.stage("store", branch):
+        store_cached_notebooks(cache, {worktree_root / ipynb_file: key for ipynb_file, key in pending.items()})
+
+    # The cache keeps the notebooks with embedded images, so the store is rebuilt from all notebooks
+    image_assets = set()
+    if extract_images:
+        with report.stage("images", branch):
+            for ipynb_file in notebook_sources:
+                image_assets |= extract_notebook_images(worktree_root / ipynb_file, worktree_root / IMAGE_ASSET_DIR)
+
+    if commit:
+        # Commit the files that differ from the branch tip
+        with report.stage("commit", branch):
+            changed = commit_changes(worktree, "dev",
+                                     built_files=[ipynb_file.as_posix() for ipynb_file in notebook_sources]
+                                     + [asset.relative_to(worktree_root).as_posix() for asset in image_assets],
+                                     removed_files=[source_file.as_posix() for source_file in notebook_sources.values()
+                                                    if source_file.suffix == ".md"],
+                                     message=f"Update {branch}")
+            if not changed:
+                print(f"No changes on {branch}, nothing to commit.")
+
+    if push:
+        # Push files to remote
+        with report.stage("push", branch):
+            worktree.git.push("--force-with-lease", "--set-upstream", "origin", branch)
+
+
+def create_solution(run=False, commit=False, push=False, n_cores=1, on_fail_restore_dev=False, use_cache=True):
     """Create solution files.
 
     Parameters
@@ -134,194 +450,318 @@ def create_solution(run=False, commit=False, push=False, n_cores=1, on_fail_rest
         Number of cpu cores to use for parallelization
     on_fail_restore_dev : bool, optional
         Reset the repo to dev on failure.
+    use_cache : bool, optional
+        Reuse build artifacts of unchanged sources from the build cache.
 
     Returns
     -------
     None
     """
-    repo = git.Repo(search_parent_directories=True)
-    current_branch = repo.active_branch.name
-    repo_root = Path(repo.working_tree_dir)  # Gets the root directory of the repo
+    create_branches(("solution",), run, commit, push, n_cores, on_fail_restore_dev, use_cache)
 
-    if current_branch != "dev":
-        print("Not on dev branch. Skipping create_solution script.")
-        return
 
-    try:
-        # Stash everything
-        run_command("git stash")
+def create_teaching(commit=False, push=False, n_cores=1, on_fail_restore_dev=False, use_cache=True):
+    """Create teaching files.
 
-        # Checkout the 'solution' branch
-        repo.git.checkout("solution")
+    Parameters
+    ----------
+    commit : bool, optional
+        Commit changes.
+    push : bool, optional
+        Push changes to remote.
+    n_cores : int, optional
+        Number of cpu cores to use for parallelization
+    on_fail_restore_dev : bool, optional
+        Reset the repo to dev on failure.
+    use_cache : bool, optional
+        Reuse build artifacts of unchanged sources from the build cache.
 
-        # Reset to `dev`
-        run_command("git restore --source dev .")
+    Returns
+    -------
+    None
+    """
+    create_branches(("teaching",), False, commit, push, n_cores, on_fail_restore_dev, use_cache)
 
-        # Find all myst files recursively
-        myst_files = list(repo_root.glob("**/*.md"))
 
-        # Run jupytext for each myst file
-        run_func_over_args_list(func=convert_myst_to_ipynb,
-                                args_list=[myst_file.as_posix() for myst_file in myst_files],
-                                n_cores=n_cores)
+def collect_notebook_sources(repo_root, file_index=None):
+    """Map every notebook that is built to the file it is built from.
 
-        # Remove all myst files except for the README
-        for myst_file in myst_files:
-            if "README" in myst_file.as_posix():
-                continue
-            os.remove(myst_file)
+    Notebooks converted from MyST files map to their .md source, notebooks that already exist
+    as .ipynb map to themselves. README files are never converted. Only files known to git are
+    considered, so untracked scratch files and checkpoints are never converted.
 
-        # Find all ipynb files recursively
-        ipynb_files = list(repo_root.glob("**/*.ipynb"))
+    Parameters
+    ----------
+    repo_root : Path
+        Root directory of the repository (or of a worktree holding the indexed files).
+    file_index : FileIndex, optional
+        Index to take the files from. Defaults to the tracked and staged files of the repository
+        at repo_root.
 
-        # Run nbtb run for each ipynb file
-        if run:
-            nbtoolbelt_config_path = f"{repo_root}/.nbtoolbelt.json"
-            run_func_over_args_list(func=run_notebook,
-                                    args_list=[(ipynb_file.as_posix(), nbtoolbelt_config_path)
-                                               for ipynb_file in ipynb_files],
-                                    n_cores=n_cores)
+    Returns
+    -------
+    dict
+        Mapping of ipynb Path to source Path.
+    """
+    if file_index is None:
+        file_index = file_index_for_path(repo_root)
+    source_files = file_index.files(suffixes=(".md", ".ipynb"))
 
-        if commit:
-            # Commit all changes to ipynb files
-            repo.git.add(".")  # Less error-prone than working with path lists
-            run_command('git commit -m "Update solution"')
+    notebook_sources = {}
+    for myst_file in source_files:
+        if myst_file.suffix != ".md" or "README" in myst_file.as_posix():
+            continue
+        notebook_sources[repo_root / myst_file.with_suffix(".ipynb")] = repo_root / myst_file
 
-        if push:
-            # Push files to remote
-            run_command("git push --force-with-lease --set-upstream origin solution")
+    for ipynb_file in source_files:
+        if ipynb_file.suffix == ".ipynb":
+            notebook_sources.setdefault(repo_root / ipynb_file, repo_root / ipynb_file)
 
-        # Switch back to dev
-        repo.git.checkout("dev")
+    return notebook_sources
 
-        run_command("git clean -fd")
 
-        try:
-            repo.git.stash("pop")
-        except git.GitCommandError as e:
-            print(e)
+def write_branch_notebooks(repo_root, cache, cache_keys, contents):
+    """Write the notebooks of one branch, restoring cached artifacts where possible.
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        if on_fail_restore_dev:
-            # Restore branch to previous state
-            run_command("git restore --staged .")
-            run_command("git restore .")
+    Parameters
+    ----------
+    repo_root : Path
+        Root directory of the repository.
+    cache : BuildCache | None
+        Build cache to restore from.
+    cache_keys : dict
+        Mapping of relative ipynb Path to cache key (None without cache).
+    contents : dict
+        Mapping of relative ipynb Path to the freshly built notebook in ipynb format.
 
-            # Switch back to dev
-            repo.git.checkout("dev")
+    Returns
+    -------
+    dict
+        Mapping of relative ipynb Path to cache key for all notebooks that were not restored.
+    """
+    pending = {}
+    for ipynb_file, key in cache_keys.items():
+        if cache is not None and cache.fetch(key, repo_root / ipynb_file):
+            continue
+        with open(repo_root / ipynb_file, "w", encoding="utf-8") as nb_file:
+            nb_file.write(contents[ipynb_file])
+        pending[ipynb_file] = key
+    return pending
 
-            try:
-                repo.git.stash("pop")
-            except git.GitCommandError as e:
-                print(e)
 
-        raise
+def store_cached_notebooks(cache, pending):
+    """Store freshly built notebooks in the build cache.
 
+    Parameters
+    ----------
+    cache : BuildCache | None
+        Build cache to store to. Nothing is stored if None.
+    pending : dict
+        Mapping of ipynb Path to cache key of the notebooks built in this run.
+
+    Returns
+    -------
+    None
+    """
+    if cache is None:
+        return
+
+    for ipynb_file, key in pending.items():
+        cache.store(key, ipynb_file)
 
-def create_teaching(commit=False, push=False, n_cores=1, on_fail_restore_dev=False):
-    """Create teaching files.
+
+JUPYTEXT_EXTENSIONS = {"ipynb": ".ipynb", "md:myst": ".md"}
+
+
+def convert_notebook_batch(file_paths, to_format):
+    """Convert a list of files with jupytext, in-process.
+
+    Equivalent to calling ``jupytext --to <to_format>`` on each file, including the lookup of
+    jupytext configuration files, but without starting a new shell and interpreter per file.
+    The output is written next to the input file.
 
     Parameters
     ----------
-    commit : bool, optional
-        Commit changes.
-    push : bool, optional
-        Push changes to remote.
-    n_cores : int, optional
-        Number of cpu cores to use for parallelization
-    on_fail_restore_dev : bool, optional
-        Reset the repo to dev on failure.
+    file_paths : list of str
+        paths to files to convert as posix.
+    to_format : str
+        jupytext format to convert to, e.g. "ipynb" or "md:myst".
 
     Returns
     -------
-    None
+    list of str
+        paths to the converted files as posix.
     """
-    repo = git.Repo(search_parent_directories=True)
-    current_branch = repo.active_branch.name
-    repo_root = Path(repo.working_tree_dir)  # Gets the root directory of the repo
+    output_paths = []
+    for file_path in file_paths:
+        config = load_jupytext_config(os.path.abspath(file_path))
+        notebook = jupytext.read(file_path, config=config)
+        output_path = Path(file_path).with_suffix(JUPYTEXT_EXTENSIONS[to_format]).as_posix()
+        jupytext.write(notebook, output_path, fmt=to_format, config=config)
+        output_paths.append(output_path)
+    return output_paths
 
-    if current_branch != "dev":
-        print("Not on dev branch. Skipping create_solution script.")
-        return
 
-    try:
-        # Stash everything
-        run_command("git stash")
+def convert_notebooks(file_paths, to_format="ipynb", n_cores=1):
+    """Convert files with jupytext, split into one batch per worker.
 
-        # Checkout the 'teaching' branch
-        repo.git.checkout("teaching")
+    Parameters
+    ----------
+    file_paths : list of str | Path
+        paths to files to convert.
+    to_format : str, optional
+        jupytext format to convert to, e.g. "ipynb" or "md:myst".
+    n_cores : int, optional
+        Number of cpu cores to use for parallelization
 
-        # Reset to `dev`
-        run_command("git restore --source dev .")
+    Returns
+    -------
+    list of str
+        paths to the converted files as posix.
+    """
+    file_paths = [Path(file_path).as_posix() for file_path in file_paths]
+    if len(file_paths) == 0:
+        return []
 
-        # Find all myst files recursively
-        myst_files = list(repo_root.glob("**/*.md"))
+    n_batches = min(len(file_paths), int(n_cores or os.cpu_count()))
+    batches = [file_paths[i::n_batches] for i in range(n_batches)]
+    batch_results = run_func_over_args_list(func=convert_notebook_batch,
+                                            args_list=[(batch, to_format) for batch in batches],
+                                            n_cores=n_cores)
+    return [output_path for batch_result in batch_results for output_path in batch_result]
 
-        # Run jupytext for each myst file
-        run_func_over_args_list(func=convert_myst_to_ipynb,
-                                args_list=[myst_file.as_posix() for myst_file in myst_files],
-                                n_cores=n_cores)
 
-        # Remove all md files except for the README file
-        for myst_file in myst_files:
-            if "README" in myst_file.as_posix():
-                continue
-            os.remove(myst_file)
+def read_notebook_source(source_path):
+    """Return the notebook built from a source file in ipynb format.
 
-        # Find all ipynb files recursively
-        ipynb_files = list(repo_root.glob("**/*.ipynb"))
+    MyST files are converted with jupytext (like ``jupytext --to ipynb``), with cell ids derived
+    from the cell contents instead of random ones. ipynb files are returned as they are.
 
-        # Run nbtb punch for each ipynb file
-        nbtoolbelt_config_path = f"{repo_root}/.nbtoolbelt.json"
-        run_func_over_args_list(func=punch_notebook,
-                                args_list=[(ipynb_file.as_posix(), nbtoolbelt_config_path) for ipynb_file in
-                                           ipynb_files],
-                                n_cores=n_cores)
+    Parameters
+    ----------
+    source_path : str | Path
+        path to myst or ipynb file.
 
-        if commit:
-            # Commit all changes to myst files (our source of truth)
-            repo.git.add(".")  # Less error-prone than working with path lists
-            run_command('git commit -m "Update teaching"')
+    Returns
+    -------
+    str
+        Notebook in ipynb format.
+    """
+    source_path = Path(source_path)
+    if source_path.suffix == ".ipynb":
+        return source_path.read_text(encoding="utf-8")
 
-        if push:
-            # Push files to remote
-            run_command("git push --force-with-lease --set-upstream origin teaching")
+    config = load_jupytext_config(os.path.abspath(source_path))
+    notebook = normalize_cell_ids(jupytext.read(source_path, config=config))
+    content = jupytext.writes(notebook, fmt="ipynb", config=config)
+    if not content.endswith("\n"):
+        content += "\n"
+    return content
 
-        # Clean up
-        for ipynb_file in ipynb_files:
-            os.remove(ipynb_file)
 
-        # Switch back to dev
-        repo.git.checkout("dev")
+def build_notebook_variant_batch(source_paths, branches, nbtoolbelt_config_path):
+    """Build the notebooks of all branches for a list of sources, in-process.
 
-        run_command("git clean -fd")
+    Each source is read and converted once, and the result is fanned out to the branches:
+    the solution notebook is the converted notebook, the teaching notebook is punched in memory.
+    If the punch settings are not supported natively, the teaching notebook is left unpunched
+    for ``nbtb punch``.
 
-        try:
-            repo.git.stash("pop")
-        except git.GitCommandError as e:
-            print(e)
+    Parameters
+    ----------
+    source_paths : list of str
+        paths to myst or ipynb files as posix.
+    branches : list of str
+        Branches to build notebooks for, any of "solution" and "teaching".
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        if on_fail_restore_dev:
-            # Restore branch to previous state
-            run_command("git restore --staged .")
-            run_command("git restore .")
+    Returns
+    -------
+    list of tuple
+        For each source, a mapping of branch to notebook in ipynb format and the Measurement
+        of building them.
+    """
+    punch_config = load_punch_config(nbtoolbelt_config_path)
+    native_punch = supports_native_punch(punch_config)
+
+    results = []
+    for source_path in source_paths:
+        with measure("convert", source_path) as measurement:
+            content = read_notebook_source(source_path)
+            variants = {}
+            for branch in branches:
+                if branch == "teaching" and native_punch:
+                    variants[branch] = punch_notebook_content(content, punch_config)
+                else:
+                    variants[branch] = content
+        # Conversions run in worker processes, whose peak memory is the best available estimate
+        measurement.peak_rss = own_peak_rss()
+        results.append((variants, measurement))
+    return results
+
+
+def build_notebook_variants(repo_root, source_files, branches, nbtoolbelt_config_path, n_cores=1, history=None,
+                            report=None, backend=None):
+    """Build the notebooks of all branches, split into one batch per worker.
+
+    With a runtime history, the batches are balanced by the recorded conversion times.
 
-            # Switch back to dev
-            repo.git.checkout("dev")
+    Parameters
+    ----------
+    repo_root : Path
+        Root directory of the repository.
+    source_files : list of Path
+        paths to myst or ipynb files, relative to repo_root.
+    branches : list of str
+        Branches to build notebooks for, any of "solution" and "teaching".
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+    n_cores : int, optional
+        Number of cpu cores to use for parallelization
+    history : RuntimeHistory, optional
+        History to balance the batches with and to record the conversion times in.
+    report : BuildReport, optional
+        Report to add the measurement of every conversion to.
+    backend : ParallelizationBase, optional
+        Backend to run the batches with.
 
-            try:
-                repo.git.stash("pop")
-            except git.GitCommandError as e:
-                print(e)
+    Returns
+    -------
+    list of dict
+        For each source, a mapping of branch to notebook in ipynb format.
+    """
+    if len(source_files) == 0:
+        return []
 
-        raise
+    n_batches = min(len(source_files), int(n_cores or os.cpu_count()))
+    if history is None:
+        batches = [list(range(len(source_files)))[i::n_batches] for i in range(n_batches)]
+    else:
+        estimates = {i: history.estimate("convert", source_file.as_posix())
+                     for i, source_file in enumerate(source_files)}
+        batches = balance(estimates, estimates, n_batches)
+    batch_results = run_func_over_args_list(
+        func=build_notebook_variant_batch,
+        args_list=[([(repo_root / source_files[i]).as_posix() for i in batch], list(branches), nbtoolbelt_config_path)
+                   for batch in batches],
+        backend=backend,
+        n_cores=n_cores)
+
+    results = [None] * len(source_files)
+    for batch, batch_result in zip(batches, batch_results):
+        for i, (variants, measurement) in zip(batch, batch_result):
+            results[i] = variants
+            measurement.item = source_files[i].as_posix()
+            if history is not None:
+                history.record("convert", measurement.item, measurement.wall_seconds)
+            if report is not None:
+                report.add(measurement)
+    return results
 
 
 def convert_myst_to_ipynb(myst_file_path):
-    """Run jupytext with --to ipynb flag on myst_file_path. Will skip README files.
+    """Convert myst_file_path to ipynb (like ``jupytext --to ipynb``). Will skip README files.
 
     Parameters
     ----------
@@ -334,11 +774,14 @@ def convert_myst_to_ipynb(myst_file_path):
     """
     if "README" in myst_file_path:
         return
-    return run_command(f'jupytext --to ipynb "{myst_file_path}"')
+    convert_notebook_batch([myst_file_path], "ipynb")
 
 
 def punch_notebook(ipynb_file_path, nbtoolbelt_config_path):
-    """Execute nbtb punch on ipynb_file_path.
+    """Punch ipynb_file_path like nbtb punch.
+
+    Tag based punching is done in-process with nbformat, everything else falls back to
+    executing nbtb punch.
 
     Parameters
     ----------
@@ -352,10 +795,13 @@ def punch_notebook(ipynb_file_path, nbtoolbelt_config_path):
     -------
     None
     """
-    return run_command(f'nbtb punch --config {nbtoolbelt_config_path} "{ipynb_file_path}"')
+    punch_config = load_punch_config(str(nbtoolbelt_config_path))
+    if not supports_native_punch(punch_config):
+        return run_command(f'nbtb punch --config {nbtoolbelt_config_path} "{ipynb_file_path}"')
+    punch_notebook_file(ipynb_file_path, punch_config)
 
 
-def run_notebook(ipynb_file_path, nbtoolbelt_config_path):
+def run_notebook(ipynb_file_path, nbtoolbelt_config_path, limits=None):
     """Execute nbtb run on ipynb_file_path.
 
     Parameters
@@ -366,11 +812,14 @@ def run_notebook(ipynb_file_path, nbtoolbelt_config_path):
     nbtoolbelt_config_path : str
         path to .nbtoolbelt.json config file
 
+    limits : dict, optional
+        Wall-clock and memory limits of nbtb and the kernel, see ``limits.load_limits``.
+
     Returns
     -------
     None
     """
-    return run_command(f'nbtb run --config {nbtoolbelt_config_path} "{ipynb_file_path}"')
+    return run_command(f'nbtb run --config {nbtoolbelt_config_path} "{ipynb_file_path}"', limits)
 
 
 def convert_ipynb_to_myst_md(ipynb_file_path):
@@ -385,20 +834,33 @@ def convert_ipynb_to_myst_md(ipynb_file_path):
     -------
     None
     """
-    return run_command(f'jupytext --to md:myst "{ipynb_file_path}"')
+    convert_notebook_batch([ipynb_file_path], "md:myst")
+
 
+def setup_teaching_copy(new_repo_dir="CADET-Workshop-teaching", worktree=False):
+    """Create or refresh a copy of this repo with the teaching branch checked out.
 
-def setup_teaching_copy(new_repo_dir="CADET-Workshop-teaching"):
-    """Create a copy of this directory and check out the teaching branch in it
+    The copy is created next to this repo. An existing copy of this repo is refreshed in place:
+    the teaching branch is fetched and checked out with ``--force`` and untracked files are
+    removed, like a hard reset, so git only rewrites the files that differ. Anything else in
+    new_repo_dir is deleted first.
+
+    A new copy is a single-branch clone whose objects are hardlinked from this repo, or, with
+    worktree=True, a worktree of this repo that shares its object database. The worktree
+    checks out the teaching commit detached, so the teaching branch can still be checked out
+    by ``create_branches``.
 
     Parameters
     ----------
     new_repo_dir : str
         Name for the new repo folder.
+    worktree : bool, optional
+        Create the copy as a worktree instead of a clone.
 
     Returns
     -------
-
+    git.Repo
+        The teaching copy.
     """
 
     repo = git.Repo(search_parent_directories=True)
@@ -406,19 +868,50 @@ def setup_teaching_copy(new_repo_dir="CADET-Workshop-teaching"):
     # Get the root directory of this repo
     repo_root = Path(repo.working_tree_dir)
 
-    # Get the directory in which this repo lives
-    parent_dir = os.path.split(repo_root)[0]
+    # The copy lives in the directory in which this repo lives
+    new_repo_path = repo_root.parent / new_repo_dir
 
-    os.chdir(parent_dir)
+    new_repo = _open_teaching_copy(repo, new_repo_path, worktree)
+    if new_repo is not None:
+        if worktree:
+            new_repo.git.checkout("--force", "--detach", "teaching")
+        else:
+            new_repo.git.fetch("origin", "teaching")
+            new_repo.git.checkout("--force", "-B", "teaching", "FETCH_HEAD")
+        new_repo.git.clean("-fd")
+        return new_repo
 
     # Clean up folder if it exists
-    if os.path.exists(new_repo_dir):
-        delete_dir_contents(new_repo_dir)
+    if new_repo_path.exists():
+        delete_dir_contents(new_repo_path)
 
-    # Clone from this repo to new repo
-    new_repo = git.Repo.clone_from(repo_root, new_repo_dir)
+    if worktree:
+        repo.git.worktree("prune")
+        repo.git.worktree("add", "--detach", str(new_repo_path), "teaching")
+        return git.Repo(new_repo_path)
 
-    new_repo.git.checkout("teaching")
+    # Cloning from a local path hardlinks the object files instead of copying them
+    return git.Repo.clone_from(repo_root, new_repo_path, local=True, branch="teaching", single_branch=True)
+
+
+def _open_teaching_copy(repo, new_repo_path, worktree):
+    """Open an existing teaching copy of repo, or return None if there is none to refresh."""
+    try:
+        new_repo = git.Repo(new_repo_path)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+        return None
+    if Path(new_repo.working_tree_dir).resolve() != new_repo_path.resolve():
+        return None
+
+    shares_objects = Path(new_repo.common_dir).resolve() == Path(repo.common_dir).resolve()
+    if worktree:
+        return new_repo if shares_objects else None
+    if shares_objects or "origin" not in new_repo.remotes:
+        return None
+    origin = Path(new_repo.remotes.origin.url)
+    if not origin.is_absolute():
+        origin = new_repo_path / origin
+    return new_repo if origin.resolve() == Path(repo.working_tree_dir).resolve() else None
 
 
 def delete_dir_contents(dir_path):
@@ -433,8 +926,11 @@ def delete_dir_contents(dir_path):
     -------
     None
     """
-    for item in os.listdir(dir_path):
-        shutil.rmtree(item, onerror=on_error)
+    for item in Path(dir_path).iterdir():
+        if item.is_dir() and not item.is_symlink():
+            shutil.rmtree(item, onerror=on_error)
+        else:
+            item.unlink()
 
 
 def main(**kwargs):
@@ -445,12 +941,40 @@ def main(**kwargs):
     None
     """
     parser = argparse.ArgumentParser(description='Perform post-commit tasks.')
+    parser.add_argument('command', nargs='?', choices=['build', 'watch'], default='build',
+                        help='Build the branches once (default) or keep rebuilding previews of changed notebooks.')
     parser.add_argument('--run', action='store_true', help='Run nbtb on notebooks.')
     parser.add_argument('--commit', action='store_true', help='Commit changes.')
     parser.add_argument('--push', action='store_true', help='Push changes to remote.')
     parser.add_argument('--on_fail_restore_dev', action='store_true',
                         help='Reset to dev branch on error.')
-    parser.add_argument('--n_cores', help='Number of cores to use.')
+    parser.add_argument('--n_cores', type=int, help='Number of cores to use.')
+    parser.add_argument('--no_cache', dest='use_cache', action='store_false',
+                        help='Rebuild all notebooks instead of reusing cached artifacts.')
+    parser.add_argument('--warm_kernels', type=int, default=0,
+                        help='Run notebooks on a pool of this many pre-warmed kernels.')
+    parser.add_argument('--shard', default=None,
+                        help='Only build shard i/n of the notebooks, balanced by their recorded runtimes.')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Repeat notebook jobs that fail with a transient error this many times.')
+    parser.add_argument('--report', dest='report_path', default=None,
+                        help='Write a json report with the timing of every stage to this file.')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help='Backend for converting notebooks. Defaults to pathos if n_cores != 1.')
+    parser.add_argument('--extract_images', action='store_true',
+                        help=f'Move image outputs out of the notebooks into content-addressed files in '
+                             f'{IMAGE_ASSET_DIR}/ at the root of the solution and teaching branches, which are '
+                             f'committed together with the notebooks.')
+    parser.add_argument('--no_preflight', dest='preflight', action='store_false',
+                        help='Execute notebooks without checking them for syntax errors and missing files first.')
+    parser.add_argument('--remote_cache', default=None,
+                        help='Shared directory or http(s) url of a build cache to pull from and push to.')
+    parser.add_argument('--preview_dir', default=None,
+                        help='watch: directory of the previews. Defaults to _preview in the repository.')
+    parser.add_argument('--debounce', type=float, default=0.3,
+                        help='watch: seconds without further saves before a rebuild starts.')
+    parser.add_argument('--polling', action='store_true',
+                        help='watch: poll for changes instead of using inotify.')
 
     args = parser.parse_args()
 
@@ -460,10 +984,18 @@ def main(**kwargs):
             continue
         args.__setattr__(kwarg_key, kwarg_value)
 
-    args.run = False
+    if args.command == "watch":
+        # Imported here, the watch module builds on this one
+        from workshop_git_tools.watch import watch
+        watch(".", args.preview_dir, args.run, args.warm_kernels or 1, args.debounce, args.polling)
+        return
+
+    backend = make_backend(args.backend, args.n_cores or os.cpu_count()) if args.backend else None
 
-    create_solution(args.run, args.commit, args.push, args.n_cores, args.on_fail_restore_dev)
-    create_teaching(args.commit, args.push, args.n_cores, args.on_fail_restore_dev)
+    create_branches(("solution", "teaching"), args.run, args.commit, args.push, args.n_cores,
+                    args.on_fail_restore_dev, args.use_cache, args.warm_kernels, args.shard,
+                    args.retries, args.report_path, backend, args.extract_images, args.remote_cache,
+                    args.preflight)
 
 
 if __name__ == "__main__":
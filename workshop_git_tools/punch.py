@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import nbformat
+
+from workshop_git_tools.nbtoolbelt_config import DEFAULT_PUNCH_CONFIG, load_tool_config
+
+
+def load_punch_config(nbtoolbelt_config_path):
+    """Load the punch settings from a .nbtoolbelt.json config file.
+
+    Parameters
+    ----------
+    nbtoolbelt_config_path : str
+        path to .nbtoolbelt.json config file
+
+    Returns
+    -------
+    dict
+        Punch settings.
+    """
+    return load_tool_config(nbtoolbelt_config_path, "nbpunch", DEFAULT_PUNCH_CONFIG)
+
+
+def supports_native_punch(punch_config):
+    """Check whether the settings can be handled by ``punch_notebook_file``.
+
+    Only the tag based approach is implemented natively. Marker based punching, filling from a
+    source notebook, chads notebooks and running or validating notebooks are left to ``nbtb``.
+
+    Parameters
+    ----------
+    punch_config : dict
+        Punch settings as returned by ``load_punch_config``.
+
+    Returns
+    -------
+    bool
+    """
+    return (bool(punch_config["tags"])
+            and punch_config["punched"]
+            and not punch_config["chads"]
+            and not punch_config["punch_source"]
+            and not punch_config["run"]
+            and not punch_config["validate"]
+            and punch_config["write_files"])
+
+
+def punch_cells(notebook, tags, fill=False, filling=None):
+    """Clear all cells of a notebook that are tagged with one of tags.
+
+    Mirrors ``nbtoolbelt.punching.punch_via_tags``: the source of a tagged cell is emptied (or
+    replaced by the filling for its cell type), its outputs are removed and its execution count
+    is reset.
+
+    .. note:: **Modifies**: notebook
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Notebook to punch.
+    tags : list of str
+        Tags that trigger removal of the cell source.
+    fill : bool, optional
+        Fill punched holes with filling instead of leaving them empty.
+    filling : dict, optional
+        Replacement source per cell type, used if fill is True.
+
+    Returns
+    -------
+    int
+        Number of punched cells.
+    """
+    tags = set(tags)
+    n_holes = 0
+    for cell in notebook.cells:
+        if tags.intersection(cell.metadata.get("tags", [])):
+            cell.source = filling[cell.cell_type] if fill else []
+            if "outputs" in cell:
+                cell.outputs = []
+            if "execution_count" in cell:
+                cell.execution_count = None
+            n_holes += 1
+    return n_holes
+
+
+def punch_notebook_content(content, punch_config):
+    """Punch a notebook given as ipynb text.
+
+    Parameters
+    ----------
+    content : str
+        Notebook in ipynb format.
+    punch_config : dict
+        Punch settings as returned by ``load_punch_config``.
+
+    Returns
+    -------
+    str
+        Punched notebook in ipynb format, exactly as ``nbtb punch`` would write it.
+    """
+    notebook = nbformat.reads(content, as_version=4)
+    punch_cells(notebook, punch_config["tags"], punch_config["fill"], punch_config["filling"])
+
+    punched_content = nbformat.writes(notebook)
+    if not punched_content.endswith("\n"):
+        punched_content += "\n"
+    return punched_content
+
+
+def punch_notebook_file(ipynb_file_path, punch_config):
+    """Punch a notebook file in-process, producing the same file as ``nbtb punch``.
+
+    Parameters
+    ----------
+    ipynb_file_path : str
+        path to ipynb file as posix.
+    punch_config : dict
+        Punch settings as returned by ``load_punch_config``.
+
+    Returns
+    -------
+    None
+    """
+    ipynb_file_path = Path(ipynb_file_path)
+    punched_content = punch_notebook_content(ipynb_file_path.read_text(encoding="utf-8"), punch_config)
+
+    punched_path = ipynb_file_path.with_name(
+        ipynb_file_path.stem + punch_config["punch_punched_result_name"] + ipynb_file_path.suffix
+    )
+    with punched_path.open("w", encoding="utf-8") as nb_file:
+        nb_file.write(punched_content)
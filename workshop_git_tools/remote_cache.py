@@ -0,0 +1,232 @@
+import argparse
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+# Environment variable with the location of the remote cache, used if none is given explicitly
+REMOTE_CACHE_ENV = "WORKSHOP_REMOTE_CACHE"
+
+# Seconds to wait for a response of an HTTP store
+HTTP_TIMEOUT = 30
+
+# Keys are hex digests, anything else is rejected by the server
+KEY_CHARACTERS = frozenset("0123456789abcdef")
+
+
+def _write_atomic(target_path, write):
+    target_path = Path(target_path)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=target_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as tmp_file:
+            write(tmp_file)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class DirectoryStore:
+    """Remote cache tier in a shared directory, e.g. a network drive or a CI cache volume.
+
+    Parameters
+    ----------
+    path : str | Path
+        Directory of the store. Created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        return f"DirectoryStore({str(self.path)!r})"
+
+    def _artifact_path(self, key):
+        return self.path / key[:2] / f"{key}.ipynb"
+
+    def fetch(self, key, destination_path):
+        """Copy the artifact stored under key to destination_path.
+
+        Returns
+        -------
+        bool
+            True if the artifact was found and copied, False otherwise.
+        """
+        try:
+            with open(self._artifact_path(key), "rb") as artifact_file:
+                _write_atomic(destination_path, lambda tmp_file: shutil.copyfileobj(artifact_file, tmp_file))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, artifact_path):
+        """Store an artifact under key, without exposing partially written files."""
+        with open(artifact_path, "rb") as artifact_file:
+            _write_atomic(self._artifact_path(key), lambda tmp_file: shutil.copyfileobj(artifact_file, tmp_file))
+
+
+class HttpStore:
+    """Remote cache tier in an HTTP object store.
+
+    Artifacts are read with ``GET <url>/<key>`` and written with ``PUT <url>/<key>``, which
+    works with the server of ``create_server`` as well as with object stores that accept plain PUT requests, e.g.
+    a bucket behind a presigning proxy.
+
+    Parameters
+    ----------
+    url : str
+        Base url of the store.
+    timeout : float, optional
+        Seconds to wait for a response.
+    """
+
+    def __init__(self, url, timeout=HTTP_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"HttpStore({self.url!r})"
+
+    def fetch(self, key, destination_path):
+        """Download the artifact stored under key to destination_path.
+
+        Returns
+        -------
+        bool
+            True if the artifact was found and downloaded, False otherwise.
+        """
+        try:
+            with urllib.request.urlopen(f"{self.url}/{key}", timeout=self.timeout) as response:
+                _write_atomic(destination_path, lambda tmp_file: shutil.copyfileobj(response, tmp_file))
+        except urllib.error.HTTPError as error:
+            if error.code == 404:
+                return False
+            raise
+        return True
+
+    def store(self, key, artifact_path):
+        """Upload an artifact under key."""
+        with open(artifact_path, "rb") as artifact_file:
+            data = artifact_file.read()
+        request = urllib.request.Request(f"{self.url}/{key}", data=data, method="PUT",
+                                         headers={"Content-Type": "application/octet-stream"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def create_remote_store(location=None):
+    """Create the remote cache tier for a location.
+
+    Parameters
+    ----------
+    location : str, optional
+        http(s) url of an ``HttpStore`` or path of a ``DirectoryStore``. Defaults to the
+        WORKSHOP_REMOTE_CACHE environment variable.
+
+    Returns
+    -------
+    DirectoryStore | HttpStore | None
+        None if no location is configured.
+    """
+    if location is None:
+        location = os.environ.get(REMOTE_CACHE_ENV)
+    if not location:
+        return None
+    if location.startswith(("http://", "https://")):
+        return HttpStore(location)
+    return DirectoryStore(location)
+
+
+class _StoreRequestHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def _key(self):
+        key = self.path.strip("/")
+        if not key or not set(key) <= KEY_CHARACTERS:
+            self.send_error(400, "Invalid key")
+            return None
+        return key
+
+    def do_GET(self):
+        key = self._key()
+        if key is None:
+            return
+        artifact_path = self.store._artifact_path(key)
+        if not artifact_path.exists():
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(artifact_path.stat().st_size))
+        self.end_headers()
+        with open(artifact_path, "rb") as artifact_file:
+            shutil.copyfileobj(artifact_file, self.wfile)
+
+    def do_PUT(self):
+        key = self._key()
+        if key is None:
+            return
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        _write_atomic(self.store._artifact_path(key), lambda tmp_file: tmp_file.write(data))
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(directory, host="127.0.0.1", port=0):
+    """Create an HTTP server that stands in for a remote object store.
+
+    Artifacts are kept in a ``DirectoryStore`` in directory. Call ``serve_forever`` on the
+    returned server, the url is ``f"http://{host}:{server.server_port}"``.
+
+    Parameters
+    ----------
+    directory : str | Path
+        Directory of the stored artifacts.
+    host : str, optional
+        Interface to listen on.
+    port : int, optional
+        Port to listen on, 0 picks a free port.
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+    """
+    handler = type("StoreRequestHandler", (_StoreRequestHandler,), {"store": DirectoryStore(directory)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    """Serve a directory as remote build cache, e.g. for all developers of a team.
+
+    Returns
+    -------
+    None
+    """
+    parser = argparse.ArgumentParser(description='Serve a directory as remote build cache over HTTP.')
+    parser.add_argument('directory', help='Directory of the stored artifacts.')
+    parser.add_argument('--host', default="127.0.0.1", help='Interface to listen on.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    args = parser.parse_args(argv)
+
+    server = create_server(args.directory, args.host, args.port)
+    print(f"Serving the build cache in {args.directory} at http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
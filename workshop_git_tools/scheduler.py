@@ -0,0 +1,271 @@
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from workshop_git_tools.executors import ExecutionError, ThreadBackend
+
+
+# Weight of the latest measurement in the smoothed runtime of a job
+SMOOTHING = 0.5
+
+
+class RuntimeHistory:
+    """Runtimes of earlier convert, punch and run jobs, stored in a local json file.
+
+    Runtimes are recorded per job kind and item (e.g. the notebook path relative to the repo)
+    and smoothed over runs. Items that were never seen are estimated with the mean runtime of
+    their kind. Recording is thread-safe.
+
+    Parameters
+    ----------
+    history_path : str | Path
+        Path to the json file. It is created by ``save`` if it does not exist.
+    """
+
+    def __init__(self, history_path):
+        self.history_path = Path(history_path)
+        self._lock = threading.Lock()
+        if self.history_path.exists():
+            with open(self.history_path, encoding="utf-8") as file_handle:
+                self.runtimes = json.load(file_handle)
+        else:
+            self.runtimes = {}
+
+    @classmethod
+    def for_repo(cls, repo):
+        """Load the runtime history of a repository, stored next to the build cache.
+
+        Parameters
+        ----------
+        repo : git.Repo
+            GitPython Repo object.
+
+        Returns
+        -------
+        RuntimeHistory
+        """
+        return cls(Path(repo.common_dir) / "workshop_cache" / "runtime_history.json")
+
+    def estimate(self, kind, item):
+        """Estimate the runtime of a job.
+
+        Parameters
+        ----------
+        kind : str
+            Job kind, e.g. "convert", "punch" or "run".
+        item : str
+            Item the job processes.
+
+        Returns
+        -------
+        float
+            Estimated runtime in seconds. 0 if no job of this kind was recorded yet.
+        """
+        runtimes = self.runtimes.get(kind, {})
+        if item in runtimes:
+            return runtimes[item]
+        if runtimes:
+            return sum(runtimes.values()) / len(runtimes)
+        return 0.0
+
+    def record(self, kind, item, seconds):
+        """Record the runtime of a job.
+
+        Parameters
+        ----------
+        kind : str
+            Job kind, e.g. "convert", "punch" or "run".
+        item : str
+            Item the job processed.
+        seconds : float
+            Measured runtime.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            runtimes = self.runtimes.setdefault(kind, {})
+            if item in runtimes:
+                seconds = SMOOTHING * seconds + (1 - SMOOTHING) * runtimes[item]
+            runtimes[item] = seconds
+
+    def save(self):
+        """Write the history to its json file.
+
+        Returns
+        -------
+        None
+        """
+        self.history_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            file_descriptor, tmp_path = tempfile.mkstemp(dir=self.history_path.parent, suffix=".tmp")
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file_handle:
+                json.dump(self.runtimes, file_handle, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.history_path)
+
+
+def order_longest_first(items, estimates):
+    """Sort items by decreasing estimated runtime.
+
+    Ties are broken by item so that the order is the same on every machine.
+
+    Parameters
+    ----------
+    items : iterable of str
+        Items to sort.
+    estimates : dict
+        Mapping of item to estimated runtime.
+
+    Returns
+    -------
+    list of str
+    """
+    return sorted(items, key=lambda item: (-estimates[item], item))
+
+
+def balance(items, estimates, n_bins):
+    """Distribute items over bins with similar total runtime.
+
+    Uses the longest-processing-time-first heuristic: items are assigned longest-first, each to
+    the bin with the smallest total so far.
+
+    Parameters
+    ----------
+    items : iterable of str
+        Items to distribute.
+    estimates : dict
+        Mapping of item to estimated runtime.
+    n_bins : int
+        Number of bins.
+
+    Returns
+    -------
+    list of list of str
+        Items of every bin, longest first.
+    """
+    bins = [[] for _ in range(n_bins)]
+    totals = [0.0] * n_bins
+    for item in order_longest_first(items, estimates):
+        i_bin = min(range(n_bins), key=lambda i: (totals[i], len(bins[i]), i))
+        bins[i_bin].append(item)
+        totals[i_bin] += estimates[item]
+    return bins
+
+
+def parse_shard(shard):
+    """Parse a shard specification of the form "i/n", with 1 <= i <= n.
+
+    Parameters
+    ----------
+    shard : str
+        Shard specification.
+
+    Returns
+    -------
+    tuple of int
+        Shard index (starting at 1) and number of shards.
+    """
+    try:
+        shard_index, n_shards = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{shard}', expected 'i/n'.")
+    if not 1 <= shard_index <= n_shards:
+        raise ValueError(f"Invalid shard '{shard}', i must be between 1 and n.")
+    return shard_index, n_shards
+
+
+def shard_items(items, estimates, shard_index, n_shards):
+    """Select the items of one runtime-balanced shard.
+
+    Every machine computes the same split as long as it uses the same items and estimates,
+    e.g. a runtime history restored from a shared CI cache.
+
+    Parameters
+    ----------
+    items : iterable of str
+        All items.
+    estimates : dict
+        Mapping of item to estimated runtime.
+    shard_index : int
+        Index of the shard, starting at 1.
+    n_shards : int
+        Number of shards.
+
+    Returns
+    -------
+    list of str
+        Items of the shard.
+    """
+    return balance(items, estimates, n_shards)[shard_index - 1]
+
+
+def run_scheduled(func, args_list, items, kind, history, n_workers=1, retries=0, report=None):
+    """Run a function over a list of args, longest job first, and record the runtimes.
+
+    The jobs are dispatched to a pool of n_workers threads in order of decreasing estimated
+    runtime, so a long job does not start last and stretch the total wall time. This suits
+    jobs that spend their time in subprocesses or kernels.
+
+    Parameters
+    ----------
+    func : callable
+        Function to run.
+    args_list : list of tuple
+        Args of every job.
+    items : list of str
+        Item of every job, used to look up and record its runtime and in the failure report.
+    kind : str
+        Job kind, e.g. "punch" or "run".
+    history : RuntimeHistory | None
+        History to estimate and record runtimes with. Without history, jobs run in the given order.
+    n_workers : int, optional
+        Number of jobs running concurrently.
+    retries : int, optional
+        Number of times a job is repeated after a transient failure.
+    report : BuildReport, optional
+        Report to measure every job in, as stage kind.
+
+    Returns
+    -------
+    list
+        Function returns, in the order of args_list.
+
+    Raises
+    ------
+    ExecutionError
+        If any job failed, after all jobs were processed.
+    """
+    if history is None:
+        order = list(range(len(items)))
+    else:
+        estimates = {item: history.estimate(kind, item) for item in items}
+        positions = {item: position for position, item in enumerate(items)}
+        order = [positions[item] for item in order_longest_first(items, estimates)]
+
+    if report is not None:
+        def measured_func(item, *args):
+            with report.stage(kind, item):
+                return func(*args)
+
+        job_func = measured_func
+        job_args_list = [(items[position],) + tuple(args_list[position]) for position in order]
+    else:
+        job_func = func
+        job_args_list = [args_list[position] for position in order]
+
+    backend = ThreadBackend(n_cores=max(1, n_workers), retries=retries)
+    ordered_results = backend.map(job_func, job_args_list, labels=[items[position] for position in order])
+
+    results = [None] * len(items)
+    for position, result in zip(order, ordered_results):
+        results[position] = result
+        if history is not None and result.ok:
+            history.record(kind, result.label, result.seconds)
+
+    failures = [result for result in results if not result.ok]
+    if failures:
+        raise ExecutionError(failures)
+    return [result.value for result in results]
@@ -0,0 +1,229 @@
+import hashlib
+from io import BytesIO
+
+import nbformat
+from git.index.typ import BaseIndexEntry
+from git.objects import Commit
+from gitdb import IStream
+
+
+# Cell metadata that records when and where a cell was executed rather than what it produced
+VOLATILE_CELL_METADATA = ("execution", "ExecuteTime")
+
+# Mode of the files written by the build
+FILE_MODE = "100644"
+
+
+def normalize_cell_ids(notebook):
+    """Replace the cell ids of a notebook by ids derived from the cell contents.
+
+    jupytext draws random ids whenever it converts a MyST file, so every conversion would change
+    every cell. The derived ids only change if the cell type or source changes.
+
+    .. note:: **Modifies**: notebook
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Notebook in nbformat 4.5 or later.
+
+    Returns
+    -------
+    nbformat.NotebookNode
+        The notebook.
+    """
+    seen = set()
+    for index, cell in enumerate(notebook.cells):
+        cell_id = hashlib.sha1(f"{cell.cell_type}\n{cell.source}".encode()).hexdigest()[:8]
+        if cell_id in seen:
+            cell_id = f"{cell_id}-{index}"
+        seen.add(cell_id)
+        cell["id"] = cell_id
+    return notebook
+
+
+def normalize_execution(notebook):
+    """Remove the traces of an execution that differ between runs of the same notebook.
+
+    Execution timestamps are dropped from the cell metadata and the execution counts are
+    numbered consecutively, independent of what else the kernel executed before.
+
+    .. note:: **Modifies**: notebook
+
+    Parameters
+    ----------
+    notebook : nbformat.NotebookNode
+        Executed notebook.
+
+    Returns
+    -------
+    nbformat.NotebookNode
+        The notebook.
+    """
+    execution_count = 0
+    for cell in notebook.cells:
+        for key in VOLATILE_CELL_METADATA:
+            cell.metadata.pop(key, None)
+        if cell.cell_type != "code" or cell.get("execution_count") is None:
+            continue
+        execution_count += 1
+        cell.execution_count = execution_count
+        for output in cell.outputs:
+            if output.get("execution_count") is not None:
+                output.execution_count = execution_count
+    return notebook
+
+
+def normalize_notebook_file(ipynb_file_path):
+    """Normalize the execution traces of an ipynb file in place, see ``normalize_execution``.
+
+    The file is only rewritten if its content changes.
+
+    Parameters
+    ----------
+    ipynb_file_path : str | Path
+        path to ipynb file.
+
+    Returns
+    -------
+    bool
+        True if the file was rewritten.
+    """
+    with open(ipynb_file_path, encoding="utf-8") as nb_file:
+        content = nb_file.read()
+    notebook = normalize_execution(nbformat.reads(content, as_version=nbformat.NO_CONVERT))
+    normalized = nbformat.writes(notebook)
+    if not normalized.endswith("\n"):
+        normalized += "\n"
+    if normalized == content:
+        return False
+    with open(ipynb_file_path, "w", encoding="utf-8") as nb_file:
+        nb_file.write(normalized)
+    return True
+
+
+def git_blob_sha(content):
+    """Return the object id git assigns to a file with this content.
+
+    Parameters
+    ----------
+    content : bytes
+
+    Returns
+    -------
+    str
+        Hex sha1, like ``git hash-object``.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def tree_entries(repo, treeish):
+    """List the files of a tree with their mode and object id.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        GitPython Repo object.
+    treeish : str
+        Commit, branch or tree.
+
+    Returns
+    -------
+    dict
+        Mapping of posix path to (mode, hexsha).
+    """
+    entries = {}
+    for line in repo.git.ls_tree("-r", "-z", "--full-tree", treeish).split("\0"):
+        if not line:
+            continue
+        info, path = line.split("\t", 1)
+        mode, _, hexsha = info.split()
+        entries[path] = (mode, hexsha)
+    return entries
+
+
+def stage_changes(repo, source_treeish, built_files, removed_files=()):
+    """Stage the difference between the checked out branch and its new content.
+
+    The new content of the branch is the tree of source_treeish, without removed_files and with
+    the built files on top. Files taken from the source tree are compared by object id, so
+    they are never read. Only built files are hashed, and only changed files are written to the
+    object database and the index. Nothing else in the working tree is considered.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        GitPython Repo object of the worktree in which the branch is checked out.
+    source_treeish : str
+        Commit, branch or tree the branch content is built from, e.g. "dev".
+    built_files : iterable of str
+        posix paths relative to the repository root of the files written by the build.
+    removed_files : iterable of str, optional
+        posix paths of files of the source tree that are not part of the branch, e.g. the
+        MyST sources.
+
+    Returns
+    -------
+    list of str
+        Added, modified and deleted paths. Empty if the branch content did not change.
+    """
+    current = tree_entries(repo, "HEAD")
+    target = tree_entries(repo, source_treeish)
+    for path in removed_files:
+        target.pop(path, None)
+    built_contents = {}
+    for path in built_files:
+        with open(f"{repo.working_tree_dir}/{path}", "rb") as built_file:
+            built_contents[path] = built_file.read()
+        target[path] = (FILE_MODE, git_blob_sha(built_contents[path]))
+
+    changed = sorted(path for path, entry in target.items() if current.get(path) != entry)
+    deleted = sorted(path for path in current if path not in target)
+
+    # Only index entries are added. Adding paths would make GitPython change the working
+    # directory of the process, which is not safe while other branches are built in threads.
+    entries = []
+    for path in changed:
+        mode, hexsha = target[path]
+        if path in built_contents:
+            content = built_contents[path]
+            hexsha = repo.odb.store(IStream("blob", len(content), BytesIO(content))).hexsha.decode()
+        entries.append(BaseIndexEntry((int(mode, 8), bytes.fromhex(hexsha), 0, path)))
+
+    index = repo.index
+    if deleted:
+        index.remove(deleted, working_tree=False)
+        index = repo.index
+    if entries:
+        index.add(entries)
+    return sorted(changed + deleted)
+
+
+def commit_changes(repo, source_treeish, built_files, removed_files=(), message="Update"):
+    """Stage the changed files of a branch, see ``stage_changes``, and commit them.
+
+    Parameters
+    ----------
+    repo : git.Repo
+        GitPython Repo object of the worktree in which the branch is checked out.
+    source_treeish : str
+        Commit, branch or tree the branch content is built from, e.g. "dev".
+    built_files : iterable of str
+        posix paths relative to the repository root of the files written by the build.
+    removed_files : iterable of str, optional
+        posix paths of files of the source tree that are not part of the branch.
+    message : str, optional
+        Commit message.
+
+    Returns
+    -------
+    list of str
+        Committed paths. Nothing is committed if the list is empty.
+    """
+    changed = stage_changes(repo, source_treeish, built_files, removed_files)
+    if changed:
+        # IndexFile.commit shares a COMMIT_EDITMSG file between all worktrees, which breaks
+        # concurrent commits on different branches
+        tree = repo.index.write_tree()
+        Commit.create_from_tree(repo, tree, message, parent_commits=[repo.head.commit], head=True)
+    return changed
@@ -0,0 +1,384 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+import git
+
+from workshop_git_tools.cell_cache import CellCache
+from workshop_git_tools.dependency_graph import DependencyGraph
+from workshop_git_tools.file_index import FileIndex
+from workshop_git_tools.kernel_pool import KernelPool
+from workshop_git_tools.process_repo import build_notebook_variant_batch, collect_notebook_sources, punch_notebook
+from workshop_git_tools.punch import load_punch_config, supports_native_punch
+
+
+# Quiet period that ends a burst of saves
+DEBOUNCE_SECONDS = 0.3
+
+# Interval of the polling watcher
+POLL_INTERVAL = 0.5
+
+# Default directory of the preview notebooks, relative to the repository root, ignored by git
+PREVIEW_DIR = "_preview"
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Watches files by comparing their modification times and sizes at a fixed interval.
+
+    Parameters
+    ----------
+    paths : iterable of Path
+        Absolute paths of the files to watch.
+    interval : float, optional
+        Seconds between two scans.
+    """
+
+    def __init__(self, paths, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._state = {}
+        self.set_paths(paths)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def set_paths(self, paths):
+        """Replace the watched files, e.g. after files were added to the repository."""
+        state = {}
+        for path in map(Path, paths):
+            # Keep the known state, so changes made in the meantime are still reported
+            state[path] = self._state[path] if path in self._state else self._stat(path)
+        self._state = state
+
+    def wait(self, timeout=None):
+        """Wait until watched files change.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait. Waits indefinitely if None.
+
+        Returns
+        -------
+        set of Path
+            Changed, created or deleted files. Empty if the timeout passed without changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, state in self._state.items():
+                new_state = self._stat(path)
+                if new_state != state:
+                    self._state[path] = new_state
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+            delay = self.interval if deadline is None else min(self.interval, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watches files with Linux inotify, through ctypes.
+
+    The directories of the files are watched, so files that editors replace on save (write to
+    a temporary file and rename) are followed as well.
+
+    Parameters
+    ----------
+    paths : iterable of Path
+        Absolute paths of the files to watch.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available.
+    """
+
+    def __init__(self, paths):
+        library = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or library is None:
+            raise OSError("inotify is only available on Linux.")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        self._paths = set()
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        """Replace the watched files, e.g. after files were added to the repository."""
+        self._paths = {Path(path) for path in paths}
+        for directory in {path.parent for path in self._paths} - set(self._directories.values()):
+            watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if watch_descriptor < 0:
+                continue
+            self._directories[watch_descriptor] = directory
+
+    def _read_events(self):
+        changed = set()
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(buffer):
+            watch_descriptor, _, _, name_length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            directory = self._directories.get(watch_descriptor)
+            if directory is not None and name:
+                path = directory / os.fsdecode(name)
+                if path in self._paths:
+                    changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait until watched files change, see ``PollingWatcher.wait``."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            changed = self._read_events() if readable else set()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(paths, polling=False):
+    """Create an inotify watcher, or a polling watcher if inotify is not available.
+
+    Parameters
+    ----------
+    paths : iterable of Path
+        Absolute paths of the files to watch.
+    polling : bool, optional
+        Always poll, e.g. for network file systems that do not report changes.
+
+    Returns
+    -------
+    InotifyWatcher | PollingWatcher
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+def collect_changes(watcher, debounce=DEBOUNCE_SECONDS, timeout=None):
+    """Wait for a burst of changes and return it once the files have been quiet for a while.
+
+    Parameters
+    ----------
+    watcher : InotifyWatcher | PollingWatcher
+        Watcher to wait on.
+    debounce : float, optional
+        Seconds without further changes that end the burst.
+    timeout : float, optional
+        Maximum number of seconds to wait for the first change. Waits indefinitely if None.
+
+    Returns
+    -------
+    set of Path
+        All files changed during the burst.
+    """
+    changed = watcher.wait(timeout)
+    while changed:
+        more = watcher.wait(debounce)
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+class PreviewBuilder:
+    """Builds solution and teaching previews of the notebooks of a working tree.
+
+    Previews are written to ``<preview_dir>/solution`` and ``<preview_dir>/teaching``, with the
+    same relative paths as in the repository. Solution previews are executed in the directory
+    of their source, so relative data paths resolve.
+
+    Parameters
+    ----------
+    repo_root : str | Path
+        Root directory of the repository.
+    preview_dir : str | Path
+        Directory to write the previews to.
+    kernel_pool : KernelPool, optional
+        Started pool to execute the solution previews on, one preview per kernel at a time.
+        Previews are not executed if None.
+    """
+
+    def __init__(self, repo_root, preview_dir, kernel_pool=None):
+        self.repo = git.Repo(repo_root, search_parent_directories=True)
+        self.repo_root = Path(self.repo.working_tree_dir).resolve()
+        self.preview_dir = Path(preview_dir)
+        self.kernel_pool = kernel_pool
+        self.nbtoolbelt_config_path = (self.repo_root / ".nbtoolbelt.json").as_posix()
+        self.graph = DependencyGraph(self.repo_root)
+        self.notebook_sources = {}
+        self.refresh()
+
+    def refresh(self):
+        """List the notebooks and watched files again, e.g. after files were added."""
+        self.file_index = FileIndex.for_repo(self.repo)
+        self.notebook_sources = collect_notebook_sources(self.repo_root, self.file_index)
+
+    def watched_files(self):
+        """Return all tracked and staged files, sources as well as the files they read."""
+        return self.file_index.files(root=self.repo_root)
+
+    def build(self, source_files):
+        """Convert, punch and optionally execute the previews of the given sources.
+
+        Parameters
+        ----------
+        source_files : iterable of Path
+            Absolute paths of MyST or ipynb sources.
+
+        Returns
+        -------
+        list of Path
+            Paths of the written solution previews.
+        """
+        ipynb_files = {source_file: ipynb_file for ipynb_file, source_file in self.notebook_sources.items()}
+        source_files = [source_file for source_file in source_files if source_file in ipynb_files]
+        native_punch = supports_native_punch(load_punch_config(self.nbtoolbelt_config_path))
+
+        solution_paths = []
+        run_sources = []
+        for source_file, (variants, _) in zip(source_files, build_notebook_variant_batch(
+                [source_file.as_posix() for source_file in source_files], ["solution", "teaching"],
+                self.nbtoolbelt_config_path)):
+            relative_path = ipynb_files[source_file].relative_to(self.repo_root)
+            for branch, content in variants.items():
+                preview_path = self.preview_dir / branch / relative_path
+                preview_path.parent.mkdir(parents=True, exist_ok=True)
+                preview_path.write_text(content, encoding="utf-8")
+            if not native_punch:
+                punch_notebook((self.preview_dir / "teaching" / relative_path).as_posix(),
+                               self.nbtoolbelt_config_path)
+
+            solution_paths.append(self.preview_dir / "solution" / relative_path)
+            run_sources.append((source_file, relative_path))
+
+        if self.kernel_pool is not None and solution_paths:
+            # All previews are written first and then executed together, one per kernel of the pool
+            self.kernel_pool.run_notebooks(
+                [solution_path.as_posix() for solution_path in solution_paths], self.nbtoolbelt_config_path,
+                notebook_keys=[f"preview:{relative_path.as_posix()}" for _, relative_path in run_sources],
+                inputs_keys=[self.graph.inputs_digest(source_file) for source_file, _ in run_sources],
+                run_paths=[source_file.parent.as_posix() for source_file, _ in run_sources])
+        return solution_paths
+
+    def update(self, changed_files):
+        """Rebuild the previews of all notebooks affected by changed files.
+
+        Parameters
+        ----------
+        changed_files : iterable of Path
+            Absolute paths of changed files.
+
+        Returns
+        -------
+        list of Path
+            Paths of the written solution previews.
+        """
+        changed_files = {Path(changed_file).resolve() for changed_file in changed_files}
+        self.graph.invalidate(changed_files)
+        self.refresh()
+        affected = self.graph.affected_notebooks(sorted(set(self.notebook_sources.values())), changed_files)
+        return self.build([source_file for source_file in affected if source_file.exists()])
+
+
+def watch(repo_root=".", preview_dir=None, run=False, warm_kernels=1, debounce=DEBOUNCE_SECONDS, polling=False):
+    """Rebuild previews of the affected notebooks whenever tracked files change.
+
+    All previews are built once at the start. Afterwards, every burst of saves to MyST sources
+    or to the files they read (data, local modules) rebuilds only the notebooks that depend on
+    them. Executed previews run on warm kernels that are kept between events and resume from
+    the cell cache, so a single-cell edit only re-executes the cells from the edited one on.
+    Stop with Ctrl+C.
+
+    Parameters
+    ----------
+    repo_root : str | Path, optional
+        Directory inside the repository.
+    preview_dir : str | Path, optional
+        Directory to write the previews to. Defaults to ``_preview`` in the repository root.
+    run : bool, optional
+        Execute the solution previews.
+    warm_kernels : int, optional
+        Number of kernels kept warm for executing previews.
+    debounce : float, optional
+        Seconds without further saves before a rebuild starts.
+    polling : bool, optional
+        Poll for changes instead of using inotify.
+
+    Returns
+    -------
+    None
+    """
+    repo = git.Repo(repo_root, search_parent_directories=True)
+    repo_root = Path(repo.working_tree_dir).resolve()
+    preview_dir = Path(preview_dir) if preview_dir is not None else repo_root / PREVIEW_DIR
+
+    kernel_pool = KernelPool(n_kernels=warm_kernels, cell_cache=CellCache.for_repo(repo)) if run else None
+    if kernel_pool is not None:
+        kernel_pool.start()
+    try:
+        builder = PreviewBuilder(repo_root, preview_dir, kernel_pool)
+        start = time.perf_counter()
+        builder.build(sorted(set(builder.notebook_sources.values())))
+        print(f"Built {len(builder.notebook_sources)} previews in {preview_dir} "
+              f"in {time.perf_counter() - start:.1f} s. Watching for changes.")
+
+        watcher = create_watcher(builder.watched_files(), polling)
+        try:
+            while True:
+                changed = collect_changes(watcher, debounce)
+                start = time.perf_counter()
+                try:
+                    rebuilt = builder.update(changed)
+                except Exception as e:
+                    # Keep watching, the author is probably in the middle of an edit
+                    print(f"{type(e).__name__}: {e}")
+                    continue
+                finally:
+                    watcher.set_paths(builder.watched_files())
+                names = ", ".join(path.relative_to(preview_dir / "solution").as_posix() for path in rebuilt)
+                print(f"Rebuilt {len(rebuilt)} previews in {time.perf_counter() - start:.2f} s: {names or '-'}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+    finally:
+        if kernel_pool is not None:
+            kernel_pool.shutdown()